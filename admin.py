@@ -1,21 +1,86 @@
 # Author: Sergey Akulov
 # GitHub: https://github.com/serg-akulov
 
-import streamlit as st
+import json
+import os
+
 import pandas as pd
+import streamlit as st
+
 import database
-import config
-import os
+from config import DEFAULT_TENANT, settings
+
+PAGE_SIZE = 50
+LIST_TTL = 30
+DETAIL_TTL = 60
+
+STATUS_LABELS = {
+    "draft": "Черновик",
+    "new": "Новая заявка",
+    "submitted": "Новая заявка",
+    "in_work": "В работе",
+    "done": "Готово",
+    "canceled": "Отменено",
+}
+
+STATUS_CHOICES = ["draft", "new", "in_work", "done", "canceled"]
+
+LIST_COLUMNS = ["id", "created_at", "status", "branch", "full_name", "username", "summary"]
+
+
+# --- Кэш: читаем из БД только нужную страницу, а не всю таблицу ---
+@st.cache_data(ttl=LIST_TTL, show_spinner=False)
+def load_page(tenant: str, status: str | None, page: int) -> pd.DataFrame:
+    rows = database.list_orders(status, limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE, tenant=tenant)
+    df = pd.DataFrame(rows, columns=LIST_COLUMNS) if rows else pd.DataFrame(columns=LIST_COLUMNS)
+    df["status"] = df["status"].map(lambda s: STATUS_LABELS.get(s, s))
+    return df
+
+
+@st.cache_data(ttl=LIST_TTL, show_spinner=False)
+def load_count(tenant: str, status: str | None) -> int:
+    return database.count_orders(status, tenant=tenant)
+
+
+@st.cache_data(ttl=LIST_TTL, show_spinner=False)
+def load_stats(tenant: str) -> dict[str, int]:
+    return database.get_order_statistics(tenant)
+
+
+@st.cache_data(ttl=DETAIL_TTL, show_spinner=False)
+def load_order_details(tenant: str, order_id: int) -> dict:
+    order = database.get_order(order_id)
+    # Заявки другого бота не показываем.
+    if not order or order.get("tenant", DEFAULT_TENANT) != tenant:
+        return {"order": None, "files": [], "messages": []}
+    return {
+        "order": order,
+        "files": database.list_order_files(order_id),
+        "messages": database.list_order_messages(order_id, 30),
+    }
+
+
+@st.cache_data(ttl=DETAIL_TTL, show_spinner=False)
+def load_bot_config(tenant: str) -> dict[str, str]:
+    return database.get_bot_config(tenant)
+
+
+def invalidate_orders() -> None:
+    load_page.clear()
+    load_count.clear()
+    load_stats.clear()
+    load_order_details.clear()
+
 
 # Авторизация (простейшая)
 if 'auth' not in st.session_state:
     st.session_state.auth = False
 
 def login():
-    st.title("Вход в систему Metalok")
+    st.title("Вход в систему Chel3D")
     pwd = st.text_input("Пароль", type="password")
     if st.button("Войти"):
-        if pwd == config.ADMIN_PANEL_PASSWORD:
+        if pwd == settings.admin_panel_password:
             st.session_state.auth = True
             st.rerun()
         else:
@@ -28,32 +93,91 @@ if not st.session_state.auth:
 # --- Основной интерфейс ---
 st.title("🛠 Управление заказами")
 
+# Каждый бот (тенант) видит только свои заявки и настройки.
+tenants = list(settings.tenant_tokens) or [DEFAULT_TENANT]
+tenant = st.sidebar.selectbox("Бот", tenants) if len(tenants) > 1 else tenants[0]
+
 tab1, tab2 = st.tabs(["📋 Заказы", "⚙️ Настройки"])
 
 with tab1:
     st.header("Список заявок")
-    
-    conn = database.get_connection()
-    df = pd.read_sql("SELECT * FROM orders ORDER BY id DESC", conn)
-    conn.close()
-    
-    st.dataframe(df)
-    
-    st.write("Чтобы изменить статус заказа, используй Telegram (просто ответь клиенту) или правь базу через Adminer, если нужно сложное редактирование.")
+
+    stats = load_stats(tenant)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Всего", stats["total_orders"])
+    c2.metric("Новых", stats["new_orders"])
+    c3.metric("Активных", stats["active_orders"])
+
+    f1, f2, f3 = st.columns([2, 1, 1])
+    status = f1.selectbox(
+        "Статус",
+        [None] + STATUS_CHOICES,
+        format_func=lambda s: "Все статусы" if s is None else STATUS_LABELS.get(s, s),
+    )
+    total = load_count(tenant, status)
+    pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = int(f2.number_input("Страница", min_value=1, max_value=pages, value=1, step=1))
+    f3.write("")
+    if f3.button("🔄 Обновить"):
+        invalidate_orders()
+        st.rerun()
+
+    st.caption(f"Найдено: {total} · страница {page} из {pages}")
+    df = load_page(tenant, status, page)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    st.subheader("Карточка заявки")
+    ids = df["id"].tolist()
+    order_id = st.selectbox("Заявка", [None] + ids, format_func=lambda i: "—" if i is None else f"№{i}")
+    # Детали грузим только для выбранной заявки.
+    if order_id:
+        details = load_order_details(tenant, int(order_id))
+        order = details["order"]
+        if not order:
+            st.warning("Заявка не найдена")
+        else:
+            try:
+                payload = json.loads(order.get("order_payload") or "{}")
+            except (TypeError, ValueError):
+                payload = {}
+            st.json(payload)
+
+            current = order["status"] if order["status"] in STATUS_CHOICES else "new"
+            new_status = st.selectbox(
+                "Изменить статус",
+                STATUS_CHOICES,
+                index=STATUS_CHOICES.index(current),
+                format_func=lambda s: STATUS_LABELS.get(s, s),
+            )
+            if st.button("Сохранить статус") and new_status != order["status"]:
+                database.update_order_status(int(order_id), new_status)
+                invalidate_orders()
+                st.success("Статус обновлён")
+                st.rerun()
+
+            with st.expander(f"Файлы ({len(details['files'])})"):
+                for f in details["files"]:
+                    st.write(f"{f.get('original_name') or f.get('file_name') or 'Файл'} — {f.get('created_at')}")
+            with st.expander(f"Чат ({len(details['messages'])})"):
+                for m in details["messages"]:
+                    who = "Менеджер" if m.get("direction") == "out" else "Клиент"
+                    st.write(f"**{who}:** {m.get('message_text') or m.get('text') or ''}")
 
 with tab2:
     st.header("Настройки бота")
-    
-    welcome_old = database.get_setting("welcome_text")
+
+    welcome_old = load_bot_config(tenant).get("welcome_menu_msg", "")
     welcome_new = st.text_area("Приветственное сообщение", value=welcome_old)
-    
+
     if st.button("Сохранить настройки"):
-        database.update_setting("welcome_text", welcome_new)
+        if welcome_new != welcome_old:
+            database.set_bot_config("welcome_menu_msg", welcome_new, tenant)
+            load_bot_config.clear()
         st.success("Сохранено!")
-    
+
     st.divider()
     st.subheader("Управление процессом")
     if st.button("🔴 ПЕРЕЗАПУСТИТЬ БОТА (Restart Service)"):
         # Это сработает, если бот запущен через systemd с именем turner_bot
-        os.system("sudo systemctl restart turner_bot") 
-        st.warning("Команда на перезапуск отправлена.")
\ No newline at end of file
+        os.system("sudo systemctl restart turner_bot")
+        st.warning("Команда на перезапуск отправлена.")
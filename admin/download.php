@@ -26,7 +26,8 @@ try {
         PDO::ATTR_DEFAULT_FETCH_MODE => PDO::FETCH_ASSOC,
     ]);
 
-    $stmt = $pdo->prepare('SELECT * FROM order_files WHERE id=:id');
+    // Only the default bot's files: BOT_TOKEN cannot download another bot's file_id.
+    $stmt = $pdo->prepare("SELECT f.* FROM order_files f JOIN orders o ON o.id=f.order_id WHERE f.id=:id AND o.tenant='default'");
     $stmt->execute([':id' => $id]);
     $file = $stmt->fetch();
     if (!$file) {
@@ -57,19 +57,22 @@ if ($error) {
 }
 
 $statuses = ['new', 'filling', 'submitted', 'in_work', 'done', 'canceled'];
+// Эта панель обслуживает только основного бота (BOT_TOKEN); остальные боты — в CRM.
+$tenant = 'default';
 
 if (isset($_POST['save_config'])) {
-    $stmt = $pdo->prepare("INSERT INTO bot_config (config_key, config_value) VALUES (:k,:v) ON DUPLICATE KEY UPDATE config_value=VALUES(config_value)");
-    $stmt->execute([':k' => 'welcome_menu_msg', ':v' => $_POST['welcome_menu_msg'] ?? '']);
-    $stmt->execute([':k' => 'about_text', ':v' => $_POST['about_text'] ?? '']);
+    $stmt = $pdo->prepare("INSERT INTO bot_config (tenant, config_key, config_value) VALUES (:t,:k,:v) ON DUPLICATE KEY UPDATE config_value=VALUES(config_value)");
+    $stmt->execute([':t' => $tenant, ':k' => 'welcome_menu_msg', ':v' => $_POST['welcome_menu_msg'] ?? '']);
+    $stmt->execute([':t' => $tenant, ':k' => 'about_text', ':v' => $_POST['about_text'] ?? '']);
+    $pdo->exec('INSERT INTO bot_config_version (id, version) VALUES (1, 1) ON DUPLICATE KEY UPDATE version=version+1');
 }
 
 if (isset($_POST['set_status'])) {
     $status = $_POST['status'] ?? '';
     $orderId = (int)($_POST['order_id'] ?? 0);
     if (in_array($status, $statuses, true) && $orderId > 0) {
-        $stmt = $pdo->prepare('UPDATE orders SET status=:status WHERE id=:id');
-        $stmt->execute([':status' => $status, ':id' => $orderId]);
+        $stmt = $pdo->prepare('UPDATE orders SET status=:status WHERE id=:id AND tenant=:t');
+        $stmt->execute([':status' => $status, ':id' => $orderId, ':t' => $tenant]);
     }
 }
 
@@ -86,8 +89,8 @@ echo '<nav><a href="?tab=dashboard">Dashboard</a><a href="?tab=orders">Зака
 if ($tab === 'dashboard') {
     $totals = [];
     foreach ($statuses as $st) {
-        $stmt = $pdo->prepare('SELECT COUNT(*) cnt FROM orders WHERE status=:st');
-        $stmt->execute([':st' => $st]);
+        $stmt = $pdo->prepare('SELECT COUNT(*) cnt FROM orders WHERE tenant=:t AND status=:st');
+        $stmt->execute([':t' => $tenant, ':st' => $st]);
         $totals[$st] = (int)$stmt->fetch()['cnt'];
     }
     echo '<h2>Dashboard</h2>';
@@ -98,8 +101,8 @@ if ($tab === 'dashboard') {
 
 if ($tab === 'orders') {
     if ($orderId > 0) {
-        $stmt = $pdo->prepare('SELECT * FROM orders WHERE id=:id');
-        $stmt->execute([':id' => $orderId]);
+        $stmt = $pdo->prepare('SELECT * FROM orders WHERE id=:id AND tenant=:t');
+        $stmt->execute([':id' => $orderId, ':t' => $tenant]);
         $order = $stmt->fetch();
         if (!$order) {
             echo '<p>Заказ не найден</p>';
@@ -138,10 +141,11 @@ if ($tab === 'orders') {
     } else {
         $statusFilter = $_GET['status'] ?? '';
         if ($statusFilter && in_array($statusFilter, $statuses, true)) {
-            $stmt = $pdo->prepare('SELECT * FROM orders WHERE status=:st ORDER BY created_at DESC LIMIT 500');
-            $stmt->execute([':st' => $statusFilter]);
+            $stmt = $pdo->prepare('SELECT * FROM orders WHERE tenant=:t AND status=:st ORDER BY created_at DESC LIMIT 500');
+            $stmt->execute([':t' => $tenant, ':st' => $statusFilter]);
         } else {
-            $stmt = $pdo->query('SELECT * FROM orders ORDER BY created_at DESC LIMIT 500');
+            $stmt = $pdo->prepare('SELECT * FROM orders WHERE tenant=:t ORDER BY created_at DESC LIMIT 500');
+            $stmt->execute([':t' => $tenant]);
         }
         $orders = $stmt->fetchAll();
         echo '<h2>Заказы</h2>';
@@ -167,7 +171,9 @@ if ($tab === 'orders') {
 }
 
 if ($tab === 'config') {
-    $cfgRows = $pdo->query('SELECT config_key, config_value FROM bot_config')->fetchAll();
+    $cfgStmt = $pdo->prepare('SELECT config_key, config_value FROM bot_config WHERE tenant=:t');
+    $cfgStmt->execute([':t' => $tenant]);
+    $cfgRows = $cfgStmt->fetchAll();
     $cfg = [];
     foreach ($cfgRows as $r) $cfg[$r['config_key']] = $r['config_value'];
     echo '<h2>Настройки бота</h2>';
@@ -0,0 +1,51 @@
+"""Client for the bot's internal API (bot.py: start_internal_api).
+
+One AsyncClient lives for the whole app so calls reuse keep-alive
+connections instead of paying a TCP handshake each. With
+INTERNAL_API_SOCKET set (bot and backend on one host sharing the socket
+file) requests go over a Unix domain socket instead of TCP.
+"""
+import httpx
+
+from config import settings
+from logging_setup import correlation_id
+
+TIMEOUT_SECONDS = 20
+# Below aiohttp's 75 s keep-alive, so the bot never closes a connection we are about to reuse.
+KEEPALIVE_EXPIRY_SECONDS = 60
+
+_client: httpx.AsyncClient | None = None
+
+
+def base_url() -> str:
+    host = settings.internal_api_host
+    # 0.0.0.0 is the bot's bind address; outside docker it means "this machine".
+    if host in ("", "0.0.0.0"):
+        host = "127.0.0.1"
+    return f"http://{host}:{settings.internal_api_port}"
+
+
+async def _forward_correlation_id(request: httpx.Request) -> None:
+    request.headers["X-Request-ID"] = correlation_id.get()
+
+
+def client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        transport = httpx.AsyncHTTPTransport(uds=settings.internal_api_socket) if settings.internal_api_socket else None
+        _client = httpx.AsyncClient(
+            base_url=base_url(),
+            transport=transport,
+            headers={"X-Internal-Key": settings.internal_api_key},
+            timeout=TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS),
+            event_hooks={"request": [_forward_correlation_id]},
+        )
+    return _client
+
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
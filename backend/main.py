@@ -1,12 +1,60 @@
-from fastapi import FastAPI
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
-from routers import auth, bot_config, orders
+import database
+import internal_api
+from logging_setup import bind_correlation_id, setup_logging
+from routers import analytics, auth, bot_config, export, managers, orders, tenants
+from serialization import FastJSONResponse
+from startup import StartupReport
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli is optional, gzip covers every client
+    BrotliMiddleware = None
 
 load_dotenv()
+# uvicorn's own loggers go through the same queue and JSON writer.
+setup_logging("backend", capture=("uvicorn", "uvicorn.access"))
+
+# Responses smaller than this are sent uncompressed: the headers would eat the gain.
+COMPRESS_MIN_SIZE = 1000
+
+
+startup_report = StartupReport("backend")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # uvicorn accepts connections only after this part, so no request sees cold pools.
+    async with startup_report.phase("db_pool", required=False):
+        await asyncio.to_thread(database.warm_pool)
+        await asyncio.to_thread(database.warm_pool, "replica")
+    async with startup_report.phase("bot_api", required=False):
+        # Opens the keep-alive connection; a 503 just means the bot is still warming up.
+        await internal_api.client().get("/internal/ready")
+    startup_report.finish()
+    yield
+    await internal_api.aclose()
 
-app = FastAPI(title="Chel3D API", description="API для заявок Chel3D")
+
+app = FastAPI(
+    title="Chel3D API",
+    description="API для заявок Chel3D",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
+if BrotliMiddleware is not None:
+    # Brotli for clients that accept it, gzip fallback for the rest.
+    app.add_middleware(BrotliMiddleware, quality=4, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,9 +63,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    # Forwarded to the bot internal API as well, so one id follows a send_message end to end.
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    bind_correlation_id(request_id)
+    database.track_primary_writes()
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
 app.include_router(bot_config.router, prefix="/api/bot-config", tags=["bot-config"])
+app.include_router(export.router, prefix="/api/export", tags=["export"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(tenants.router, prefix="/api/tenants", tags=["tenants"])
+app.include_router(managers.router, prefix="/api/managers", tags=["managers"])
 
 
 @app.get("/")
@@ -28,3 +92,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness():
+    return FastJSONResponse(startup_report.as_dict(), status_code=200 if startup_report.ready else 503)
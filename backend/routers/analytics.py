@@ -0,0 +1,49 @@
+import logging
+from collections import defaultdict
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+
+import database
+from routers.auth import verify_token
+from routers.tenants import current_tenant
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_FUNNEL_DAYS = 365
+
+
+@router.get("/funnel")
+async def get_funnel(
+    days: int = 30,
+    branch: str | None = None,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    if days < 1 or days > MAX_FUNNEL_DAYS:
+        raise HTTPException(status_code=400, detail=f"days должен быть от 1 до {MAX_FUNNEL_DAYS}")
+    try:
+        rows = database.get_funnel_daily(days, branch or None, tenant)
+    except Exception as exc:
+        logger.exception("Ошибка получения воронки")
+        raise HTTPException(status_code=500, detail="Ошибка получения воронки") from exc
+
+    steps: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    series: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for r in rows:
+        step, action = r["step"], r["action"]
+        # users is a per-day distinct count, so the period total is an upper bound.
+        steps[step][action] += int(r["events"])
+        steps[step]["users"] += int(r["users"]) if action in ("start", "enter") else 0
+        series[str(r["day"])][action] += int(r["events"])
+
+    result: list[dict[str, Any]] = [{"step": name, **counts} for name, counts in steps.items()]
+    result.sort(key=lambda s: s.get("users", 0), reverse=True)
+    return {
+        "tenant": tenant,
+        "days": days,
+        "branch": branch,
+        "steps": result,
+        "series": [{"day": day, **counts} for day, counts in sorted(series.items())],
+    }
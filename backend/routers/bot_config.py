@@ -1,10 +1,11 @@
 import logging
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 import database
 from routers.auth import verify_token
+from routers.tenants import current_tenant
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -121,44 +122,106 @@ def _bool_to_str(v: Any) -> str:
     return "true" if bool(v) else "false"
 
 
+def _config_etag(tenant: str, version: int) -> str:
+    return f'W/"cfg-{tenant}-{version}"'
+
+
+def _config_headers(tenant: str, version: int) -> dict[str, str]:
+    # Vary on X-Tenant: the same URL serves every bot's configuration.
+    return {"ETag": _config_etag(tenant, version), "Cache-Control": "private, no-cache", "Vary": "X-Tenant"}
+
+
+def _not_modified(request: Request, tenant: str) -> Response | None:
+    etag = request.headers.get("if-none-match")
+    if not etag:
+        return None
+    version = database.get_bot_config_version()
+    if etag != _config_etag(tenant, version):
+        return None
+    return Response(status_code=304, headers=_config_headers(tenant, version))
+
+
+def _load_config(request: Request, response: Response, tenant: str) -> dict[str, str] | Response:
+    cached = _not_modified(request, tenant)
+    if cached is not None:
+        return cached
+    cfg, version = database.get_bot_config_snapshot(tenant)
+    response.headers.update(_config_headers(tenant, version))
+    return cfg
+
+
+def _saved(message: str, tenant: str, version: int, response: Response) -> dict[str, Any]:
+    response.headers.update(_config_headers(tenant, version))
+    return {"message": message, "version": version}
+
+
 @router.get("/")
-async def get_bot_config(payload: dict = Depends(verify_token)) -> dict[str, Any]:
-    return database.get_bot_config()
+async def get_bot_config(
+    request: Request,
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> Any:
+    return _load_config(request, response, tenant)
 
 
 @router.put("/")
-async def update_bot_config(data: dict[str, Any], payload: dict = Depends(verify_token)) -> dict[str, str]:
+async def update_bot_config(
+    data: dict[str, Any],
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> dict[str, Any]:
     try:
-        database.set_bot_config_many({str(k): _clean_str(v) for k, v in (data or {}).items()})
-        return {"message": "Настройки сохранены"}
+        version = database.set_bot_config_many({str(k): _clean_str(v) for k, v in (data or {}).items()}, tenant)
+        return _saved("Настройки сохранены", tenant, version, response)
     except Exception as exc:
         logger.exception("Ошибка сохранения настроек бота")
         raise HTTPException(status_code=500, detail="Не удалось сохранить настройки") from exc
 
 
 @router.get("/texts")
-async def get_bot_texts(payload: dict = Depends(verify_token)) -> dict[str, str]:
-    cfg = database.get_bot_config()
+async def get_bot_texts(
+    request: Request,
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> Any:
+    cfg = _load_config(request, response, tenant)
+    if isinstance(cfg, Response):
+        return cfg
     return {k: cfg.get(k, "") for k in TEXT_KEYS}
 
 
 @router.put("/texts")
-async def update_bot_texts(data: dict[str, Any], payload: dict = Depends(verify_token)) -> dict[str, str]:
+async def update_bot_texts(
+    data: dict[str, Any],
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> dict[str, Any]:
     try:
         to_save: dict[str, str] = {}
         for k in TEXT_KEYS:
             if k in (data or {}):
                 to_save[k] = _clean_str(data.get(k))
-        database.set_bot_config_many(to_save)
-        return {"message": "Тексты сохранены"}
+        version = database.set_bot_config_many(to_save, tenant)
+        return _saved("Тексты сохранены", tenant, version, response)
     except Exception as exc:
         logger.exception("Ошибка сохранения текстов бота")
         raise HTTPException(status_code=500, detail="Не удалось сохранить тексты") from exc
 
 
 @router.get("/settings")
-async def get_bot_settings(payload: dict = Depends(verify_token)) -> dict[str, Any]:
-    cfg = database.get_bot_config()
+async def get_bot_settings(
+    request: Request,
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> Any:
+    cfg = _load_config(request, response, tenant)
+    if isinstance(cfg, Response):
+        return cfg
     keys = SETTINGS_KEYS + PHOTO_KEYS
     out: dict[str, Any] = {k: cfg.get(k, "") for k in keys}
     for k in TOGGLE_KEYS:
@@ -167,7 +230,12 @@ async def get_bot_settings(payload: dict = Depends(verify_token)) -> dict[str, A
 
 
 @router.put("/settings")
-async def update_bot_settings(data: dict[str, Any], payload: dict = Depends(verify_token)) -> dict[str, str]:
+async def update_bot_settings(
+    data: dict[str, Any],
+    response: Response,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+) -> dict[str, Any]:
     try:
         to_save: dict[str, str] = {}
         for k in SETTINGS_KEYS + PHOTO_KEYS:
@@ -177,8 +245,8 @@ async def update_bot_settings(data: dict[str, Any], payload: dict = Depends(veri
                 to_save[k] = _bool_to_str(data.get(k))
             else:
                 to_save[k] = _clean_str(data.get(k))
-        database.set_bot_config_many(to_save)
-        return {"message": "Настройки сохранены"}
+        version = database.set_bot_config_many(to_save, tenant)
+        return _saved("Настройки сохранены", tenant, version, response)
     except Exception as exc:
         logger.exception("Ошибка сохранения настроек бота")
         raise HTTPException(status_code=500, detail="Не удалось сохранить настройки") from exc
@@ -0,0 +1,218 @@
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+import database
+from routers.auth import verify_token
+from routers.tenants import current_tenant
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+BASE_COLUMNS: list[str] = [
+    "id",
+    "user_id",
+    "username",
+    "full_name",
+    "branch",
+    "status",
+    "summary",
+    "created_at",
+    "updated_at",
+]
+
+PAYLOAD_COLUMNS: list[str] = [
+    "technology",
+    "material",
+    "material_custom",
+    "scan_type",
+    "idea_type",
+    "description",
+    "file",
+]
+
+EXPORT_COLUMNS: list[str] = BASE_COLUMNS + [f"payload_{k}" for k in PAYLOAD_COLUMNS] + ["payload_extra"]
+
+ROWS_PER_CHUNK = 500
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _parse_payload(raw: Any) -> dict[str, Any]:
+    if isinstance(raw, dict):
+        return raw
+    try:
+        data = json.loads(raw or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def flatten_order(order: dict[str, Any]) -> dict[str, Any]:
+    payload = _parse_payload(order.get("order_payload"))
+    row: dict[str, Any] = {k: order.get(k) for k in BASE_COLUMNS}
+    for k in PAYLOAD_COLUMNS:
+        row[f"payload_{k}"] = payload.get(k)
+    extra = {k: v for k, v in payload.items() if k not in PAYLOAD_COLUMNS and k != "branch"}
+    row["payload_extra"] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(orders: Iterator[dict[str, Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    # BOM lets Excel detect UTF-8 for Cyrillic values.
+    buf.write("\ufeff")
+    writer.writeheader()
+    pending = 0
+    for order in orders:
+        writer.writerow(flatten_order(order))
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_ndjson(orders: Iterator[dict[str, Any]]) -> Iterator[bytes]:
+    lines: list[str] = []
+    for order in orders:
+        row = {k: order.get(k) for k in BASE_COLUMNS}
+        row["payload"] = _parse_payload(order.get("order_payload"))
+        lines.append(json.dumps(row, ensure_ascii=False, default=_json_default))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines.clear()
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _parquet_schema() -> Any:
+    fields = []
+    for name in EXPORT_COLUMNS:
+        if name in ("id", "user_id"):
+            fields.append(pa.field(name, pa.int64()))
+        elif name in ("created_at", "updated_at"):
+            fields.append(pa.field(name, pa.timestamp("s")))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def stream_parquet(orders: Iterator[dict[str, Any]]) -> Iterator[bytes]:
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        batch: list[dict[str, Any]] = []
+        for order in orders:
+            batch.append(flatten_order(order))
+            if len(batch) >= ROWS_PER_CHUNK * 10:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch.clear()
+                yield sink.drain()
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _parse_date(value: str | None, field: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Неверный формат даты: {field}") from exc
+
+
+@router.get("/orders")
+async def export_orders(
+    format: str = "csv",
+    status: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    include_archive: bool = True,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    fmt = (format or "csv").lower()
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Формат должен быть csv, ndjson или parquet")
+    if fmt == "parquet" and pa is None:
+        raise HTTPException(status_code=501, detail="Экспорт в Parquet недоступен: не установлен pyarrow")
+
+    statuses = [s.strip() for s in (status or "").split(",") if s.strip()]
+    if any(s not in database.ALLOWED_STATUSES for s in statuses):
+        raise HTTPException(status_code=400, detail="Недопустимый статус")
+    created_from = _parse_date(date_from, "date_from")
+    created_to = _parse_date(date_to, "date_to")
+    # A bare date in date_to means "up to the end of that day".
+    if created_to and date_to and len(date_to) == 10:
+        created_to += timedelta(days=1)
+
+    orders = database.iter_orders_export(
+        statuses or None,
+        created_from,
+        created_to,
+        include_archive=include_archive,
+        tenant=tenant,
+    )
+    body = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}[fmt](orders)
+    filename = f"orders_{tenant}_{datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
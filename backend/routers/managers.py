@@ -0,0 +1,76 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+import database
+from routers.auth import verify_token
+from routers.tenants import current_tenant
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+BRANCHES: tuple[str, ...] = ("print", "scan", "idea", "dialog")
+MAX_QUEUE_DAYS = 90
+
+
+class ManagerSave(BaseModel):
+    telegram_user_id: int
+    name: str
+    # Empty: the manager takes orders of every branch.
+    branches: list[str] = []
+    # 0: no limit.
+    max_in_work: int = 10
+    active: bool = True
+
+
+@router.get("/")
+async def list_managers(tenant: str = Depends(current_tenant), payload: dict = Depends(verify_token)):
+    try:
+        return {"managers": database.list_managers(tenant)}
+    except Exception as exc:
+        logger.exception("Ошибка получения списка менеджеров")
+        raise HTTPException(status_code=500, detail="Ошибка получения списка менеджеров") from exc
+
+
+@router.post("/")
+async def save_manager(
+    manager: ManagerSave,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    """Add a manager, or update the one with the same Telegram ID."""
+    name = manager.name.strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Имя менеджера пустое")
+    branches = sorted(set(manager.branches))
+    unknown = [b for b in branches if b not in BRANCHES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные направления: {', '.join(unknown)}")
+    if manager.max_in_work < 0:
+        raise HTTPException(status_code=400, detail="Лимит заявок не может быть отрицательным")
+    try:
+        manager_id = database.save_manager(
+            manager.telegram_user_id, name, branches, manager.max_in_work, manager.active, tenant=tenant
+        )
+    except Exception as exc:
+        logger.exception("Ошибка сохранения менеджера")
+        raise HTTPException(status_code=500, detail="Ошибка сохранения менеджера") from exc
+    return {"id": manager_id}
+
+
+@router.get("/queue")
+async def get_queue_metrics(
+    days: int = 7,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    """Orders waiting for a manager now, and how long assigned orders waited (seconds)."""
+    if days < 1 or days > MAX_QUEUE_DAYS:
+        raise HTTPException(status_code=400, detail=f"days должен быть от 1 до {MAX_QUEUE_DAYS}")
+    try:
+        metrics = database.get_queue_metrics(tenant, days)
+    except Exception as exc:
+        logger.exception("Ошибка получения метрик очереди")
+        raise HTTPException(status_code=500, detail="Ошибка получения метрик очереди") from exc
+    return {"tenant": tenant, "days": days, **metrics}
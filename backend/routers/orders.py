@@ -1,12 +1,22 @@
+import asyncio
+import hashlib
+import hmac
 import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 import database
-from config import settings
+import internal_api
+from config import DEFAULT_TENANT, settings
 from routers.auth import verify_token
+from routers.tenants import current_tenant
+from serialization import FastJSONResponse, raw_json
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -29,11 +39,110 @@ class MessageCreate(BaseModel):
     text: str
 
 
+MESSAGES_PAGE_LIMIT = 100
+MESSAGES_DETAIL_LIMIT = 30
+
+# Written by the bot (previews.py); mounted read-only into the backend.
+PREVIEWS_DIR = Path(settings.uploads_dir) / "previews"
+# Preview links are signed so <img src> works without the bearer header.
+# The expiry is rounded to whole days to keep URLs (and browser caches) stable.
+PREVIEW_URL_TTL_SECONDS = 86400
+
+
+def _preview_signature(order_id: int, file_id: int, expires: int) -> str:
+    msg = f"preview:{order_id}:{file_id}:{expires}".encode()
+    return hmac.new(settings.secret_key.encode(), msg, hashlib.sha256).hexdigest()[:32]
+
+
+# Telegram keeps a getFile path valid for at least an hour.
+FILE_URL_TTL_SECONDS = 3000
+# LRU bound on top of the TTL; an entry is a couple of hundred bytes.
+FILE_URL_CACHE_SIZE = 5000
+_file_url_cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+_telegram_client: httpx.AsyncClient | None = None
+
+
+def _telegram() -> httpx.AsyncClient:
+    global _telegram_client
+    if _telegram_client is None:
+        _telegram_client = httpx.AsyncClient(timeout=20)
+    return _telegram_client
+
+
+async def _resolve_file_url(file_id: str, tenant: str) -> str | None:
+    # file_id values are only valid for the bot that received the file.
+    token = settings.tenant_tokens.get(tenant)
+    if not token:
+        return None
+    cached = _file_url_cache.get(file_id)
+    if cached:
+        if cached[1] > time.monotonic():
+            _file_url_cache.move_to_end(file_id)
+            return cached[0]
+        del _file_url_cache[file_id]
+    file_url = None
+    try:
+        resp = await _telegram().get(
+            f"https://api.telegram.org/bot{token}/getFile",
+            params={"file_id": file_id},
+        )
+        if resp.status_code == 200:
+            data = (resp.json() or {}).get("result", {}) or {}
+            if data.get("file_path"):
+                file_url = f"https://api.telegram.org/file/bot{token}/{data['file_path']}"
+    except Exception:
+        logger.exception("Ошибка резолва telegram file_id")
+    if file_url:
+        _file_url_cache[file_id] = (file_url, time.monotonic() + FILE_URL_TTL_SECONDS)
+        _file_url_cache.move_to_end(file_id)
+        while len(_file_url_cache) > FILE_URL_CACHE_SIZE:
+            _file_url_cache.popitem(last=False)
+    return file_url
+
+
+async def _with_file_urls(order_id: int, files: list[dict], tenant: str) -> list[dict]:
+    urls = await asyncio.gather(*(_resolve_file_url(item["telegram_file_id"], tenant) for item in files))
+    return [
+        {**item, "file_url": url, "preview_url": _preview_url(order_id, item)}
+        for item, url in zip(files, urls)
+    ]
+
+
+def _preview_url(order_id: int, item: dict) -> str | None:
+    unique_id = item.get("file_unique_id")
+    if not unique_id or not (PREVIEWS_DIR / f"{order_id}_{unique_id}.webp").is_file():
+        return None
+    day = PREVIEW_URL_TTL_SECONDS
+    expires = (int(time.time()) // day + 2) * day
+    sig = _preview_signature(order_id, int(item["id"]), expires)
+    return f"/api/orders/{order_id}/files/{item['id']}/preview?expires={expires}&sig={sig}"
+
+
+def _tenant_order(order_id: int, tenant: str) -> dict:
+    """Order by id, hidden when it belongs to another bot than the one selected."""
+    order = database.get_order(order_id)
+    if not order or order.get("tenant", DEFAULT_TENANT) != tenant:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+    return order
+
+
+def facet_filters(
+    technology: str | None = None,
+    material: str | None = None,
+    scan_type: str | None = None,
+    idea_type: str | None = None,
+) -> dict[str, str | None]:
+    return {"technology": technology, "material": material, "scan_type": scan_type, "idea_type": idea_type}
+
+
 @router.get("/")
 async def get_orders(
     page: int = 1,
     limit: int = 200,
     status_filter: str | None = None,
+    include_archive: bool | None = None,
+    filters: dict = Depends(facet_filters),
+    tenant: str = Depends(current_tenant),
     payload: dict = Depends(verify_token),
 ):
     try:
@@ -42,38 +151,57 @@ async def get_orders(
         if limit < 1:
             limit = 20
         offset = (page - 1) * limit
-        orders = database.get_orders_paginated(limit, offset, status_filter)
+        orders = database.get_orders_paginated(limit, offset, status_filter, filters, include_archive, tenant)
         for order in orders:
             order["status_label"] = STATUS_MAP.get(order.get("status"), order.get("status"))
-        return orders
+            order["order_payload"] = raw_json(order.get("order_payload"))
+        return FastJSONResponse(orders)
     except Exception as exc:
         logger.exception("Ошибка получения списка заявок")
         raise HTTPException(status_code=500, detail="Ошибка получения списка заявок") from exc
 
 
 @router.get("/stats")
-async def get_order_stats(payload: dict = Depends(verify_token)):
+async def get_order_stats(tenant: str = Depends(current_tenant), payload: dict = Depends(verify_token)):
     try:
-        return database.get_order_statistics()
+        return database.get_order_statistics(tenant)
     except Exception:
         logger.exception("Ошибка получения статистики")
         return {"total_orders": 0, "new_orders": 0, "active_orders": 0}
 
 
+@router.get("/facets")
+async def get_order_facets(
+    status_filter: str | None = None,
+    filters: dict = Depends(facet_filters),
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    try:
+        return database.get_order_facets(status_filter, filters, tenant)
+    except Exception as exc:
+        logger.exception("Ошибка получения фасетов заявок")
+        raise HTTPException(status_code=500, detail="Ошибка получения фасетов заявок") from exc
+
+
 @router.get("/{order_id}")
-async def get_order(order_id: int, payload: dict = Depends(verify_token)):
-    order = database.get_order(order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Заявка не найдена")
+async def get_order(order_id: int, tenant: str = Depends(current_tenant), payload: dict = Depends(verify_token)):
+    order = _tenant_order(order_id, tenant)
     order["status_label"] = STATUS_MAP.get(order.get("status"), order.get("status"))
-    return order
+    order["order_payload"] = raw_json(order.get("order_payload"))
+    return FastJSONResponse(order)
 
 
 @router.put("/{order_id}")
-async def update_order(order_id: int, order_update: OrderUpdate, payload: dict = Depends(verify_token)):
-    current_order = database.get_order(order_id)
-    if not current_order:
-        raise HTTPException(status_code=404, detail="Заявка не найдена")
+async def update_order(
+    order_id: int,
+    order_update: OrderUpdate,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    current_order = _tenant_order(order_id, tenant)
+    if "archived_at" in current_order:
+        raise HTTPException(status_code=400, detail="Заявка в архиве и не может быть изменена")
     if order_update.status:
         try:
             database.update_order_status(order_id, order_update.status)
@@ -83,51 +211,105 @@ async def update_order(order_id: int, order_update: OrderUpdate, payload: dict =
 
 
 @router.get("/{order_id}/files")
-async def get_order_files(order_id: int, payload: dict = Depends(verify_token)):
+async def get_order_files(order_id: int, tenant: str = Depends(current_tenant), payload: dict = Depends(verify_token)):
+    _tenant_order(order_id, tenant)
     files = database.list_order_files(order_id)
-    result = []
-    async with httpx.AsyncClient(timeout=20) as client:
-        for item in files:
-            file_url = None
-            try:
-                resp = await client.get(
-                    f"https://api.telegram.org/bot{settings.bot_token}/getFile",
-                    params={"file_id": item["telegram_file_id"]},
-                )
-                if resp.status_code == 200:
-                    data = (resp.json() or {}).get("result", {}) or {}
-                    if data.get("file_path"):
-                        file_url = f"https://api.telegram.org/file/bot{settings.bot_token}/{data['file_path']}"
-            except Exception:
-                logger.exception("Ошибка резолва telegram file_id")
-            result.append({**item, "file_url": file_url})
-    return {"files": result}
+    return {"files": await _with_file_urls(order_id, files, tenant)}
+
+
+@router.get("/{order_id}/detail")
+async def get_order_detail(order_id: int, tenant: str = Depends(current_tenant), payload: dict = Depends(verify_token)):
+    detail = database.get_order_detail(order_id, MESSAGES_DETAIL_LIMIT + 1)
+    if not detail or detail["order"].get("tenant", DEFAULT_TENANT) != tenant:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+    order = detail["order"]
+    order["status_label"] = STATUS_MAP.get(order.get("status"), order.get("status"))
+    order["order_payload"] = raw_json(order.get("order_payload"))
+    messages = detail["messages"]
+    has_more = len(messages) > MESSAGES_DETAIL_LIMIT
+    if has_more:
+        messages = messages[1:]
+    last_id = int(messages[-1]["id"]) if messages else 0
+    return FastJSONResponse(
+        {
+            "order": order,
+            "files": await _with_file_urls(order_id, detail["files"], tenant),
+            "messages": messages,
+            "has_more": has_more,
+            "last_id": last_id,
+            # Same validator as GET /messages, so the chat can keep polling with If-None-Match.
+            "messages_etag": f'W/"msg-{order_id}-{last_id}"',
+        }
+    )
+
+
+@router.get("/{order_id}/files/{file_id}/preview")
+async def get_order_file_preview(order_id: int, file_id: int, expires: int, sig: str):
+    expected = _preview_signature(order_id, file_id, expires)
+    if expires < time.time() or not hmac.compare_digest(sig, expected):
+        raise HTTPException(status_code=403, detail="Ссылка на превью недействительна")
+    item = next((f for f in database.list_order_files(order_id) if int(f["id"]) == file_id), None)
+    path = PREVIEWS_DIR / f"{order_id}_{item['file_unique_id']}.webp" if item and item.get("file_unique_id") else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Превью не найдено")
+    # Previews never change for a given file, so the browser may keep them until the link expires.
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        headers={"Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}, immutable"},
+    )
 
 
 @router.get("/{order_id}/messages")
-async def get_messages(order_id: int, payload: dict = Depends(verify_token)):
-    return {"messages": database.list_order_messages(order_id, 30)}
+async def get_messages(
+    order_id: int,
+    request: Request,
+    response: Response,
+    limit: int = 30,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    _tenant_order(order_id, tenant)
+    limit = max(1, min(limit, MESSAGES_PAGE_LIMIT))
+    last_id = database.get_last_order_message_id(order_id)
+    etag = f'W/"msg-{order_id}-{last_id}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    # Older pages never change, so the validator only covers the head of the chat.
+    if before_id is None and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    messages = database.list_order_messages(order_id, limit + 1, after_id=after_id, before_id=before_id)
+    has_more = len(messages) > limit
+    if has_more:
+        messages = messages[:limit] if after_id is not None else messages[1:]
+    response.headers.update(headers)
+    return {"messages": messages, "last_id": last_id, "has_more": has_more}
 
 
 @router.post("/{order_id}/messages")
-async def send_message(order_id: int, body: MessageCreate, payload: dict = Depends(verify_token)):
-    order = database.get_order(order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Заявка не найдена")
+async def send_message(
+    order_id: int,
+    body: MessageCreate,
+    tenant: str = Depends(current_tenant),
+    payload: dict = Depends(verify_token),
+):
+    order = _tenant_order(order_id, tenant)
     if order.get("status") == "canceled":
         raise HTTPException(status_code=400, detail="Нельзя отправить сообщение для отменённой заявки")
+    if "archived_at" in order:
+        raise HTTPException(status_code=400, detail="Нельзя отправить сообщение для архивной заявки")
 
     text = (body.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="Текст сообщения пустой")
 
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.post(
-                "http://bot:8081/internal/sendMessage",
-                headers={"X-Internal-Key": settings.internal_api_key},
-                json={"user_id": int(order["user_id"]), "text": text, "order_id": int(order_id)},
-            )
+        response = await internal_api.client().post(
+            "/internal/sendMessage",
+            json={"user_id": int(order["user_id"]), "text": text, "order_id": int(order_id), "tenant": tenant},
+        )
     except Exception as exc:
         logger.exception("Ошибка вызова bot internal API")
         raise HTTPException(status_code=400, detail="Не удалось отправить сообщение в Telegram") from exc
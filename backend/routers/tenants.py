@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from config import DEFAULT_TENANT, settings
+from routers.auth import verify_token
+
+router = APIRouter()
+
+
+def current_tenant(x_tenant: str | None = Header(default=None), tenant: str | None = None) -> str:
+    """Tenant the admin is looking at: X-Tenant header, or ?tenant= for plain links (exports)."""
+    slug = (x_tenant or tenant or DEFAULT_TENANT).strip().lower()
+    if slug != DEFAULT_TENANT and slug not in settings.tenant_tokens:
+        raise HTTPException(status_code=404, detail="Неизвестный бот")
+    return slug
+
+
+@router.get("/")
+async def list_tenants(payload: dict = Depends(verify_token)):
+    tenants = list(settings.tenant_tokens) or [DEFAULT_TENANT]
+    return {"tenants": tenants, "default": DEFAULT_TENANT}
@@ -0,0 +1,52 @@
+"""orjson-based JSON responses for the API.
+
+FastAPI runs returned dicts through jsonable_encoder before rendering; hot
+endpoints return FastJSONResponse directly to skip that pass, and embed
+`order_payload` (already JSON in MySQL) with raw_json() instead of
+decoding and re-encoding it.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# orjson.Fragment (3.9+) splices pre-serialized JSON into the output as is.
+_Fragment = getattr(orjson, "Fragment", None)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def raw_json(value: Any) -> Any:
+    """Embed a JSON document stored as text without parsing it when orjson allows."""
+    if value is None or isinstance(value, (dict, list)):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).decode("utf-8")
+    if not value:
+        return None
+    if _Fragment is not None:
+        return _Fragment(value)
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return value
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,106 @@
+"""List/stats latency as closed-order history grows, with and without archiving.
+
+Seeds synthetic `done` orders into the configured MySQL database (from .env),
+measures list_orders()/get_order_statistics() with all history hot, then moves
+it to the archive tier and measures again. Synthetic rows are tagged with a
+negative user_id and removed at the end.
+
+    python benchmarks/archive_latency.py --yes --steps 10000 50000 200000
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+from config import DEFAULT_TENANT  # noqa: E402
+
+BENCH_USER_ID = -424242
+HOT_ORDERS = 2000
+
+
+def timed(fn, repeat: int = 30) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def seed(count: int, status: str, days_ago: int) -> None:
+    payload = json.dumps({"branch": "print", "technology": "FDM", "material": "PLA"})
+    rows = [(BENCH_USER_ID, "bench", "Bench", "print", status, payload, days_ago, days_ago)] * 1000
+    with database.db_cursor() as (conn, cur):
+        for left in range(count, 0, -1000):
+            cur.executemany(
+                """
+                INSERT INTO orders (user_id, username, full_name, branch, status, order_payload, created_at, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW() - INTERVAL %s DAY, NOW() - INTERVAL %s DAY)
+                """,
+                rows[: min(1000, left)],
+            )
+            conn.commit()
+
+
+def cleanup() -> None:
+    with database.db_cursor() as (_, cur):
+        cur.execute("SELECT id FROM orders_archive WHERE user_id=%s", (BENCH_USER_ID,))
+        archived = len(cur.fetchall())
+        cur.execute("DELETE FROM orders_archive WHERE user_id=%s", (BENCH_USER_ID,))
+        cur.execute("DELETE FROM orders WHERE user_id=%s", (BENCH_USER_ID,))
+        cur.execute(
+            "UPDATE orders_archive_stats SET archived_orders=GREATEST(archived_orders-%s, 0) WHERE tenant=%s",
+            (archived, DEFAULT_TENANT),
+        )
+
+
+def measure(label: str, history: int) -> None:
+    list_ms = timed(lambda: database.list_orders(None, limit=200))
+    stats_ms = timed(lambda: database.get_order_statistics())
+    print(f"{label:<10} history={history:>9}  list_orders={list_ms:8.2f} ms  stats={stats_ms:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--yes", action="store_true", help="allow writing synthetic rows to the configured DB")
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("this benchmark writes to the configured database; pass --yes to run it")
+
+    database.init_db_if_needed()
+    database.ensure_archive_partitions()
+    cleanup()
+    try:
+        seed(HOT_ORDERS, "new", 1)
+        seeded = 0
+        for step in sorted(args.steps):
+            seed(step - seeded, "done", 365)
+            seeded = step
+            measure("hot", seeded)
+            while database.archive_orders_batch(older_than_days=180, limit=1000):
+                pass
+            measure("archived", seeded)
+            # Move history back so the next step starts from an all-hot table again.
+            with database.db_cursor() as (_, cur):
+                cols = ", ".join(database.ORDER_COLUMNS[:8] + ("tenant", "created_at", "updated_at"))
+                cur.execute(
+                    f"INSERT INTO orders ({cols}) SELECT {cols} FROM orders_archive WHERE user_id=%s",
+                    (BENCH_USER_ID,),
+                )
+                cur.execute("DELETE FROM orders_archive WHERE user_id=%s", (BENCH_USER_ID,))
+                cur.execute(
+                    "UPDATE orders_archive_stats SET archived_orders=GREATEST(archived_orders-%s, 0) WHERE tenant=%s",
+                    (seeded, DEFAULT_TENANT),
+                )
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
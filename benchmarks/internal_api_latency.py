@@ -0,0 +1,101 @@
+"""Backend -> bot internal API round trip: client per call vs keep-alive vs Unix socket.
+
+Starts a stub aiohttp app with the same /internal/sendMessage route the bot
+serves (answers {"ok": true} without calling Telegram) and times, per mode:
+  per-call   - a fresh httpx.AsyncClient per request (the old send_message path)
+  keepalive  - one persistent client over TCP, as internal_api.client() does
+  uds        - one persistent client over a Unix domain socket (INTERNAL_API_SOCKET)
+No Telegram token or database needed.
+
+    python benchmarks/internal_api_latency.py --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+import internal_api  # noqa: E402
+
+BODY = {"user_id": 1, "text": "Ваш заказ готов", "order_id": 1, "tenant": "default"}
+
+
+async def handle(request: web.Request) -> web.Response:
+    await request.json()
+    return web.json_response({"ok": True})
+
+
+async def timed(send, count: int) -> list[float]:
+    samples: list[float] = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        response = await send()
+        response.raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<10} median={statistics.median(samples):7.3f} ms  p95={p95:7.3f} ms  max={samples[-1]:7.3f} ms")
+
+
+def persistent(base_url: str, transport: httpx.AsyncHTTPTransport | None = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        transport=transport,
+        timeout=internal_api.TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=internal_api.KEEPALIVE_EXPIRY_SECONDS),
+    )
+
+
+async def run(count: int) -> None:
+    app = web.Application()
+    app.router.add_post("/internal/sendMessage", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    tcp = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await tcp.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sock = str(Path(tmp) / "internal.sock")
+        await web.UnixSite(runner, sock).start()
+        try:
+            async def per_call():
+                async with httpx.AsyncClient(timeout=internal_api.TIMEOUT_SECONDS) as client:
+                    return await client.post(f"{url}/internal/sendMessage", json=BODY)
+
+            report("per-call", await timed(per_call, count))
+
+            async with persistent(url) as client:
+                await client.post("/internal/sendMessage", json=BODY)  # open the connection
+                report("keepalive", await timed(lambda: client.post("/internal/sendMessage", json=BODY), count))
+
+            async with persistent("http://bot", httpx.AsyncHTTPTransport(uds=sock)) as client:
+                await client.post("/internal/sendMessage", json=BODY)
+                report("uds", await timed(lambda: client.post("/internal/sendMessage", json=BODY), count))
+        finally:
+            await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
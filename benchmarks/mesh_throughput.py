@@ -0,0 +1,78 @@
+"""Mesh analysis throughput on large synthetic binary STL files.
+
+Writes a tessellated sphere with the requested triangle count to a temp
+directory and times mesh_analysis.analyze_mesh() on it, both inline and
+through a ProcessPoolExecutor (the path the bot uses). No database needed.
+
+    python benchmarks/mesh_throughput.py --triangles 1000000 4000000
+"""
+import argparse
+import math
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import mesh_analysis  # noqa: E402
+
+
+def write_sphere_stl(path: Path, triangles: int, radius: float = 50.0) -> None:
+    """UV sphere with ~`triangles` faces, written as binary STL."""
+    n = max(4, int(math.sqrt(triangles / 2)))
+    theta = np.linspace(0, np.pi, n + 1)
+    phi = np.linspace(0, 2 * np.pi, n + 1)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    pts = np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1) * radius
+    a, b = pts[:-1, :-1], pts[1:, :-1]
+    c, d = pts[1:, 1:], pts[:-1, 1:]
+    tris = np.concatenate([np.stack([a, b, c], axis=-2), np.stack([a, c, d], axis=-2)]).reshape(-1, 3, 3)
+
+    records = np.zeros(len(tris), dtype=mesh_analysis._STL_RECORD)
+    records["v"] = tris
+    with path.open("wb") as f:
+        f.write(b"\0" * 80)
+        f.write(np.uint32(len(records)).tobytes())
+        records.tofile(f)
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triangles", type=int, nargs="+", default=[1_000_000, 4_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=1) as pool:
+        for count in args.triangles:
+            path = Path(tmp) / f"sphere_{count}.stl"
+            write_sphere_stl(path, count)
+            size_mb = path.stat().st_size / 1024 / 1024
+            stats = mesh_analysis.analyze_mesh(str(path), "PLA")
+            inline_ms = timed(lambda: mesh_analysis.analyze_mesh(str(path), "PLA"), args.repeat)
+            pool_ms = timed(lambda: pool.submit(mesh_analysis.analyze_mesh, str(path), "PLA").result(), args.repeat)
+            expected = 4 / 3 * math.pi * 50.0**3 / 1000
+            print(
+                f"triangles={stats['triangles']:>9}  file={size_mb:7.1f} MB  "
+                f"inline={inline_ms:8.1f} ms  pool={pool_ms:8.1f} ms  "
+                f"volume={stats['volume_cm3']:.2f} cm3 (sphere {expected:.2f})  "
+                f"{stats['triangles'] / inline_ms / 1000:.1f} Mtri/s"
+            )
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Serialization cost of an orders page: default FastAPI path vs FastJSONResponse.
+
+Builds synthetic order rows shaped like database.list_orders() output and
+times, per page size:
+  default  - jsonable_encoder() + JSONResponse.render() (FastAPI without a custom class)
+  orjson   - FastJSONResponse.render() with order_payload embedded via raw_json()
+plus the gzip/brotli body sizes. No database needed.
+
+    python benchmarks/serialization.py --sizes 20 50 200 1000
+"""
+import argparse
+import gzip
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from serialization import FastJSONResponse, raw_json  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    payload = {
+        "branch": "print",
+        "technology": "FDM",
+        "material": "PET-G",
+        "description": "Корпус для датчика, нужен в двух цветах, толщина стенки 2 мм. " * 3,
+        "file": "housing_v3.stl",
+    }
+    return [
+        {
+            "id": 100000 + i,
+            "user_id": 500000000 + i,
+            "username": f"client{i}",
+            "full_name": "Иван Петров",
+            "branch": "print",
+            "status": "new",
+            "order_payload": json.dumps(payload, ensure_ascii=False),
+            "summary": "Тип заявки: Рассчитать печать\n• Технология: FDM\n• Материал: PET-G",
+            "technology": "FDM",
+            "material": "PET-G",
+            "scan_type": None,
+            "idea_type": None,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+            "status_label": "Новая заявка",
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def default_path(rows: list[dict]) -> bytes:
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def orjson_path(rows: list[dict]) -> bytes:
+    page = [{**r, "order_payload": raw_json(r["order_payload"])} for r in rows]
+    return FastJSONResponse(page).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows = make_rows(size)
+        default_ms = timed(lambda: default_path(rows), args.repeat)
+        orjson_ms = timed(lambda: orjson_path(rows), args.repeat)
+        body = orjson_path(rows)
+        gz = len(gzip.compress(body, 6))
+        br = len(brotli.compress(body, quality=4)) if brotli else 0
+        print(
+            f"rows={size:>5}  default={default_ms:8.2f} ms  orjson={orjson_ms:7.2f} ms  "
+            f"x{default_ms / orjson_ms:5.1f}  body={len(body) / 1024:7.1f} KiB  "
+            f"gzip={gz / 1024:6.1f} KiB  brotli={br / 1024:6.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Telegram API calls and request bytes per order journey: send-per-step vs edit-in-place.
+
+Replays a typical journey (menu -> print -> FDM -> PLA -> back -> PET-G -> review
+-> back to menu) against a fake Message that records every Bot API call the
+step helpers make and approximates its request size (uploaded photo bytes +
+caption + keyboard JSON). No Telegram token or network needed.
+
+    python benchmarks/step_navigation.py --photo assets/placeholder.png --journeys 100
+"""
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import BufferedInputFile, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+import bot  # noqa: E402
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.bytes = 0
+        self.next_id = 1000
+
+    def record(self, method: str, text: str, keyboard, photo=None) -> None:
+        self.calls[method] += 1
+        size = len((text or "").encode()) + (len(keyboard.model_dump_json()) if keyboard else 0)
+        if isinstance(photo, FSInputFile):
+            size += Path(photo.path).stat().st_size
+        elif isinstance(photo, BufferedInputFile):
+            size += len(photo.data)
+        elif isinstance(photo, str):
+            size += len(photo)
+        self.bytes += size
+
+
+class FakeMessage:
+    """Just enough of aiogram's Message for send_step()/edit_step()."""
+
+    def __init__(self, rec: Recorder, photo: bool, from_bot: bool = True) -> None:
+        rec.next_id += 1
+        self.rec = rec
+        self.message_id = rec.next_id
+        self.chat = SimpleNamespace(id=1)
+        self.from_user = SimpleNamespace(is_bot=from_bot)
+        self.photo = [SimpleNamespace(file_id=f"AgAC{self.message_id:06d}")] if photo else None
+        self.text = None if photo else "text"
+
+    async def answer_photo(self, photo, caption, reply_markup=None):
+        self.rec.record("sendPhoto", caption, reply_markup, photo)
+        return FakeMessage(self.rec, photo=True)
+
+    async def answer(self, text, reply_markup=None):
+        self.rec.record("sendMessage", text, reply_markup)
+        return FakeMessage(self.rec, photo=False)
+
+    async def edit_caption(self, caption, reply_markup=None):
+        self.rec.record("editMessageCaption", caption, reply_markup)
+        return self
+
+    async def edit_media(self, media, reply_markup=None):
+        self.rec.record("editMessageMedia", media.caption, reply_markup, media.media)
+        return self
+
+    async def edit_text(self, text, reply_markup=None):
+        self.rec.record("editMessageText", text, reply_markup)
+        return self
+
+
+def keyboard(*labels: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text=t, callback_data=f"set:x:{t}")] for t in labels]
+        + [[InlineKeyboardButton(text="⬅️ Назад", callback_data="nav:back")]]
+    )
+
+
+def journey(menu_photo: str, print_photo: str) -> list[tuple[str, InlineKeyboardMarkup, str]]:
+    menu = ("Выберите услугу", keyboard("Печать", "Скан", "Идея", "О нас"), menu_photo)
+    tech = ("Выберите технологию", keyboard("FDM", "Фотополимер", "Не знаю"), print_photo)
+    mat = ("Выберите материал", keyboard("PET-G", "PLA", "TPU", "Нейлон"), print_photo)
+    review = ("Проверьте заявку:\nТип заявки: Рассчитать печать\n• Технология: FDM", keyboard("Отправить"), print_photo)
+    return [tech, mat, tech, mat, review, menu, tech]
+
+
+async def run(mode: str, journeys: int, menu_photo: str, print_photo: str) -> Recorder:
+    bot._photo_file_ids.clear()
+    bot._message_photos.clear()
+    rec = Recorder()
+    show = bot.send_step if mode == "send" else bot.show_step
+    for _ in range(journeys):
+        # /start always sends a fresh menu message.
+        current = await bot.send_step(FakeMessage(rec, photo=False, from_bot=False), "Меню", keyboard("Печать"), menu_photo)
+        for text, kb, photo in journey(menu_photo, print_photo):
+            current = await show(current, text, kb, photo)
+    return rec
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photo", default=bot.settings.placeholder_photo_path, help="local step photo")
+    parser.add_argument("--print-photo", default=None, help="second photo for print steps (default: same)")
+    parser.add_argument("--journeys", type=int, default=100)
+    args = parser.parse_args()
+    if not Path(args.photo).is_file():
+        parser.error(f"photo not found: {args.photo}")
+    print_photo = args.print_photo or args.photo
+
+    for mode in ("send", "edit"):
+        rec = asyncio.run(run(mode, args.journeys, args.photo, print_photo))
+        total = sum(rec.calls.values())
+        calls = ", ".join(f"{k}={v / args.journeys:.1f}" for k, v in sorted(rec.calls.items()))
+        print(
+            f"{mode:<5} calls/journey={total / args.journeys:5.1f}  "
+            f"KiB/journey={rec.bytes / args.journeys / 1024:9.1f}  ({calls})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 import asyncio
 import logging
 import mimetypes
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
 from aiohttp import ClientSession, ClientTimeout, web
-from aiogram import Bot, Dispatcher, F
+from aiogram import BaseMiddleware, Bot, Dispatcher, F
 from aiogram.enums import ContentType
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -17,18 +24,61 @@ from aiogram.types import (
     FSInputFile,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InputMediaPhoto,
     Message,
+    TelegramObject,
 )
 
 import database
-from config import settings
-
-logging.basicConfig(level=logging.INFO)
+import mesh_analysis
+import previews
+import storage
+from config import DEFAULT_TENANT, settings
+from logging_setup import bind_correlation_id, setup_logging
+from startup import StartupReport
+
+setup_logging("bot")
 logger = logging.getLogger("chel3d_bot")
 
-UPLOADS_DIR = Path("uploads")
-UPLOADS_DIR.mkdir(exist_ok=True)
+UPLOADS_DIR = Path(settings.uploads_dir)
+PREVIEWS_DIR = UPLOADS_DIR / "previews"
+PREVIEWS_DIR.mkdir(parents=True, exist_ok=True)
 MAX_IMAGE_SIZE_BYTES = 10 * 1024 * 1024
+CONFIG_RECHECK_SECONDS = 5.0
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_SECONDS = 5.0
+OUTBOX_BASE_DELAY_SECONDS = 5
+OUTBOX_MAX_DELAY_SECONDS = 600
+ASSIGN_BATCH_SIZE = 50
+# Periodic pass for orders that wait until a manager frees up or is added.
+ASSIGN_POLL_SECONDS = 30.0
+ACTIVE_ORDER_CACHE_SECONDS = 60.0
+ACTIVE_ORDER_CACHE_SIZE = 10_000
+# Telegram allows about 20 messages per minute into one group chat.
+ORDERS_CHAT_RATE = 20
+FUNNEL_FLUSH_BATCH = 1000
+
+# Tenant (storefront bot) of the update being handled; set by TenantMiddleware.
+_tenant: ContextVar[str] = ContextVar("tenant", default=DEFAULT_TENANT)
+_bot_tenants: dict[int, str] = {}
+_config_caches: dict[str, dict[str, Any]] = {}
+_outbox_wakeup = asyncio.Event()
+_assign_wakeup = asyncio.Event()
+_submit_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+# (tenant, user_id) -> (order_id, cached_at), least recently used first.
+_active_order_cache: "OrderedDict[tuple[str, int], tuple[int, float]]" = OrderedDict()
+_worker_pool: ProcessPoolExecutor | None = None
+_mesh_jobs: set[asyncio.Task] = set()
+_preview_jobs: set[asyncio.Task] = set()
+# Telegram file_id of every step photo already uploaded once, keyed by (tenant, photo_key()):
+# file_ids are only valid for the bot that uploaded them.
+_photo_file_ids: dict[tuple[str, str], str] = {}
+# photo_key() currently shown by each (tenant, chat_id, message_id), so unchanged photos are not re-sent.
+_message_photos: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+MESSAGE_PHOTOS_CAPACITY = 10_000
+# URL step photos downloaded during warm start, kept until the first upload returns a file_id.
+_prefetched_photos: dict[tuple[str, str], BufferedInputFile] = {}
+_startup = StartupReport("bot")
 
 
 def user_full_name(user: Any) -> str:
@@ -42,11 +92,26 @@ def user_username(user: Any) -> str | None:
     return getattr(user, "username", None)
 
 
+def current_tenant() -> str:
+    return _tenant.get()
+
+
 def bot_cfg() -> dict[str, str]:
+    """Config snapshot of the current tenant, re-read only when the stored config version changes."""
+    tenant = current_tenant()
+    cache = _config_caches.setdefault(tenant, {"version": None, "data": {}, "checked_at": 0.0})
+    now = time.monotonic()
+    if now - cache["checked_at"] < CONFIG_RECHECK_SECONDS:
+        return cache["data"]
     try:
-        return database.get_bot_config()
+        version = database.get_bot_config_version()
+        if version != cache["version"]:
+            data, version = database.get_bot_config_snapshot(tenant)
+            cache.update(data=data, version=version)
+        cache["checked_at"] = now
     except Exception:
-        return {}
+        pass
+    return cache["data"]
 
 
 def get_cfg(key: str, default: str = "") -> str:
@@ -98,6 +163,179 @@ class Form(StatesGroup):
     step = State()
 
 
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per `per` seconds, with bursts up to `rate`."""
+
+    def __init__(self, rate: int, per: float) -> None:
+        self._rate = rate
+        self._per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate / self._per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self._per / self._rate)
+
+
+class MessageBatchWriter:
+    """Buffers inbound client messages and stores them in multi-row INSERTs.
+
+    Handlers only append to memory; a background task flushes every
+    `flush_interval` seconds (or sooner once `max_batch` is reached) and queues
+    one orders-chat notification per order and flush.
+    """
+
+    def __init__(self, flush_interval: float = 0.05, max_batch: int = 200) -> None:
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._pending: list[tuple[int, str, int | None, dict[str, Any]]] = []
+        self._wakeup = asyncio.Event()
+
+    def add(self, order_id: int, text: str, telegram_message_id: int | None, user: Any) -> None:
+        sender = {
+            "user_id": getattr(user, "id", 0),
+            "username": user_username(user),
+            "full_name": user_full_name(user),
+        }
+        self._pending.append((order_id, text, telegram_message_id, sender))
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        messages = [(order_id, text, tg_id) for order_id, text, tg_id, _ in batch]
+        grouped: dict[int, dict[str, Any]] = {}
+        for order_id, text, _, sender in batch:
+            grouped.setdefault(order_id, {**sender, "texts": []})["texts"].append(text)
+        try:
+            await asyncio.to_thread(database.add_client_messages, messages, list(grouped.items()))
+        except Exception:
+            logger.exception("Не удалось сохранить сообщения клиентов (%s шт.)", len(batch))
+            if len(self._pending) < self._max_batch * 10:
+                self._pending[:0] = batch
+            await asyncio.sleep(1)
+            return
+        notify_outbox()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if len(self._pending) < self._max_batch:
+                    await asyncio.sleep(self._flush_interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+class FunnelRecorder:
+    """In-memory ring buffer of funnel events, flushed to the DB in bulk.
+
+    record() never blocks or touches the DB; when the buffer is full the
+    oldest events are dropped. The background task also refreshes the daily
+    rollups every `rollup_interval` seconds.
+    """
+
+    def __init__(self, capacity: int = 50_000, flush_interval: float = 1.0, rollup_interval: float = 300.0) -> None:
+        self._buffer: deque[tuple[str, int, int | None, str, str, str, datetime]] = deque(maxlen=capacity)
+        self._flush_interval = flush_interval
+        self._rollup_interval = rollup_interval
+
+    def record(self, user_id: int, order_id: Any, branch: str, step: str, action: str) -> None:
+        self._buffer.append(
+            (current_tenant(), int(user_id), int(order_id) if order_id else None, branch or "", step, action, datetime.now())
+        )
+
+    async def flush(self) -> None:
+        batch: list[tuple[str, int, int | None, str, str, str, datetime]] = []
+        while self._buffer and len(batch) < FUNNEL_FLUSH_BATCH:
+            batch.append(self._buffer.popleft())
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(database.add_funnel_events, batch)
+        except Exception:
+            logger.exception("Не удалось записать события воронки (%s шт.)", len(batch))
+
+    async def run(self) -> None:
+        last_rollup = 0.0
+        try:
+            while True:
+                await asyncio.sleep(self._flush_interval)
+                while self._buffer:
+                    await self.flush()
+                if time.monotonic() - last_rollup >= self._rollup_interval:
+                    last_rollup = time.monotonic()
+                    try:
+                        await asyncio.to_thread(database.rollup_funnel, date.today() - timedelta(days=1))
+                    except Exception:
+                        logger.exception("Не удалось пересчитать агрегаты воронки")
+        finally:
+            await self.flush()
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Bind the update to the tenant of the bot that received it (see current_tenant()) and tag its logs."""
+
+    async def __call__(self, handler, event: TelegramObject, data: dict[str, Any]) -> Any:
+        bot: Bot | None = data.get("bot")
+        _tenant.set(_bot_tenants.get(bot.id, DEFAULT_TENANT) if bot else DEFAULT_TENANT)
+        # Every record logged while handling this update can be grepped by it.
+        bind_correlation_id(f"{current_tenant()}:{getattr(event, 'update_id', '-')}")
+        # Reads after this update's writes (even ones done via asyncio.to_thread) skip the replica.
+        database.track_primary_writes()
+        return await handler(event, data)
+
+
+class DedupUpdatesMiddleware(BaseMiddleware):
+    """Drop updates whose update_id was already seen (polling retries, webhook redelivery).
+
+    update_ids are per bot, so they are keyed by tenant. Keeps the last
+    `capacity` ids in insertion order, so memory stays bounded.
+    """
+
+    def __init__(self, capacity: int = 10_000) -> None:
+        self._seen: OrderedDict[tuple[str, int], None] = OrderedDict()
+        self._capacity = capacity
+
+    async def __call__(self, handler, event: TelegramObject, data: dict[str, Any]) -> Any:
+        update_id = getattr(event, "update_id", None)
+        if update_id is not None:
+            key = (current_tenant(), update_id)
+            if key in self._seen:
+                return None
+            self._seen[key] = None
+            if len(self._seen) > self._capacity:
+                self._seen.popitem(last=False)
+        return await handler(event, data)
+
+
+_orders_chat_limiters: dict[str, RateLimiter] = {}
+
+
+def orders_chat_limiter() -> RateLimiter:
+    """Rate limiter of the current tenant's orders chat."""
+    tenant = current_tenant()
+    limiter = _orders_chat_limiters.get(tenant)
+    if limiter is None:
+        limiter = _orders_chat_limiters[tenant] = RateLimiter(ORDERS_CHAT_RATE, 60.0)
+    return limiter
+
+
+client_messages = MessageBatchWriter()
+funnel = FunnelRecorder()
+
+
 def kb(rows: list[list[InlineKeyboardButton]]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
@@ -183,6 +421,42 @@ def step_keyboard_for_print(payload: dict[str, Any]) -> InlineKeyboardMarkup:
     return kb(rows)
 
 
+def photo_key(ref: str) -> str:
+    """Cache key for a step photo; local files include mtime so replacing the file invalidates it."""
+    p = Path(ref)
+    if not ref.startswith(("http://", "https://")) and p.is_file():
+        return f"{ref}@{p.stat().st_mtime_ns}"
+    return ref
+
+
+async def step_photo(ref: str, key: str) -> Any:
+    """InputFile/str for sendPhoto; reuses the Telegram file_id after the first upload."""
+    file_id = _photo_file_ids.get((current_tenant(), key))
+    if file_id:
+        return file_id
+    prefetched = _prefetched_photos.get((current_tenant(), key))
+    if prefetched is not None:
+        return prefetched
+    if ref.startswith("http://") or ref.startswith("https://"):
+        return await fetch_image(ref)
+    p = Path(ref)
+    if p.exists() and p.is_file():
+        return FSInputFile(str(p))
+    return ref
+
+
+def remember_step_photo(sent: Message, key: str) -> None:
+    tenant = current_tenant()
+    if sent.photo:
+        _photo_file_ids[(tenant, key)] = sent.photo[-1].file_id
+        _prefetched_photos.pop((tenant, key), None)
+    msg_key = (tenant, sent.chat.id, sent.message_id)
+    _message_photos[msg_key] = key if sent.photo else ""
+    _message_photos.move_to_end(msg_key)
+    while len(_message_photos) > MESSAGE_PHOTOS_CAPACITY:
+        _message_photos.popitem(last=False)
+
+
 async def send_step(
     message: Message,
     text: str,
@@ -191,24 +465,73 @@ async def send_step(
 ) -> Message:
     ref = photo_ref or getattr(settings, "placeholder_photo_path", "")
     if ref:
+        key = photo_key(ref)
         try:
-            if ref.startswith("http://") or ref.startswith("https://"):
-                photo_file = await fetch_image(ref)
-                return await message.answer_photo(photo=photo_file, caption=text, reply_markup=keyboard)
-
-            p = Path(ref)
-            if p.exists() and p.is_file():
-                return await message.answer_photo(
-                    photo=FSInputFile(str(p)),
-                    caption=text,
-                    reply_markup=keyboard,
-                )
-
-            return await message.answer_photo(photo=ref, caption=text, reply_markup=keyboard)
+            sent = await message.answer_photo(photo=await step_photo(ref, key), caption=text, reply_markup=keyboard)
+            remember_step_photo(sent, key)
+            return sent
         except Exception:
+            # Forget a cached file_id in case it is the reason sendPhoto failed.
+            _photo_file_ids.pop((current_tenant(), key), None)
             logger.exception("Не удалось отправить фото — отправляю текстом")
 
-    return await message.answer(text, reply_markup=keyboard)
+    sent = await message.answer(text, reply_markup=keyboard)
+    remember_step_photo(sent, "")
+    return sent
+
+
+async def edit_step(
+    message: Message,
+    text: str,
+    keyboard: Optional[InlineKeyboardMarkup] = None,
+    photo_ref: Optional[str] = None,
+) -> Optional[Message]:
+    """Turn an existing step message into the next step; None when it can't be edited.
+
+    Same photo -> editMessageCaption, other photo -> editMessageMedia (by file_id
+    once uploaded), text step -> editMessageText.
+    """
+    ref = photo_ref or getattr(settings, "placeholder_photo_path", "")
+    shown = _message_photos.get((current_tenant(), message.chat.id, message.message_id))
+    try:
+        if ref and message.photo:
+            key = photo_key(ref)
+            if shown == key:
+                await message.edit_caption(caption=text, reply_markup=keyboard)
+                return message
+            edited = await message.edit_media(
+                InputMediaPhoto(media=await step_photo(ref, key), caption=text),
+                reply_markup=keyboard,
+            )
+            if isinstance(edited, Message):
+                remember_step_photo(edited, key)
+                return edited
+            return message
+        if not ref and message.text:
+            await message.edit_text(text, reply_markup=keyboard)
+            return message
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return message
+        logger.info("Не удалось отредактировать шаг, отправляю новое сообщение: %s", e)
+    except Exception:
+        logger.exception("Не удалось отредактировать шаг")
+    return None
+
+
+async def show_step(
+    message: Message,
+    text: str,
+    keyboard: Optional[InlineKeyboardMarkup] = None,
+    photo_ref: Optional[str] = None,
+) -> Message:
+    """Edit the bot's own step message in place, sending a new one only when that fails."""
+    from_user = getattr(message, "from_user", None)
+    if from_user is not None and from_user.is_bot:
+        edited = await edit_step(message, text, keyboard, photo_ref)
+        if edited is not None:
+            return edited
+    return await send_step(message, text, keyboard, photo_ref)
 
 
 async def fetch_image(url: str) -> BufferedInputFile:
@@ -253,13 +576,13 @@ async def send_step_cb(
     keyboard: Optional[InlineKeyboardMarkup] = None,
     photo_ref: Optional[str] = None,
 ) -> None:
-    """Send a step message and safely acknowledge callback.
+    """Show a step (editing the callback's message in place) and safely acknowledge callback.
 
     NOTE: We sometimes call render_step() from non-callback contexts by creating a fake CallbackQuery.
     Such objects are not 'mounted' to a Bot instance, so cb.answer() raises RuntimeError in aiogram v3.
     """
     if cb.message:
-        await send_step(cb.message, text, keyboard, photo_ref)
+        await show_step(cb.message, text, keyboard, photo_ref)
 
     try:
         await cb.answer()
@@ -323,9 +646,10 @@ def _push_history(state_data: dict[str, Any]) -> list[str]:
     return history
 
 
-async def show_main(message: Message, state: FSMContext) -> None:
+async def show_main(message: Message, state: FSMContext, in_place: bool = False) -> None:
+    """Main menu: a new message for /start, the current step edited in place from a callback."""
     await state.clear()
-    await send_step(
+    await (show_step if in_place else send_step)(
         message,
         get_cfg(
             "welcome_menu_msg",
@@ -337,11 +661,12 @@ async def show_main(message: Message, state: FSMContext) -> None:
 
 
 async def start_order(cb: CallbackQuery, state: FSMContext, branch: str) -> None:
-    order_id = database.create_order(
+    order_id = database.find_or_create_draft_order(
         cb.from_user.id,
         user_username(cb.from_user),
         user_full_name(cb.from_user),
         branch,
+        tenant=current_tenant(),
     )
     await state.set_state(Form.step)
     await state.update_data(
@@ -352,6 +677,7 @@ async def start_order(cb: CallbackQuery, state: FSMContext, branch: str) -> None
         waiting_text=None,
         pending_files=[],
     )
+    funnel.record(cb.from_user.id, order_id, branch, branch, "start")
 
 
 async def render_step(cb: CallbackQuery, state: FSMContext, step: str, from_back: bool = False) -> None:
@@ -362,6 +688,13 @@ async def render_step(cb: CallbackQuery, state: FSMContext, step: str, from_back
 
     data = await state.get_data()
     payload: dict[str, Any] = data.get("payload", {})
+    funnel.record(
+        cb.from_user.id,
+        data.get("order_id"),
+        str(payload.get("branch", "")),
+        step,
+        "back" if from_back else "enter",
+    )
 
     if step == "print_tech":
         rows: list[list[InlineKeyboardButton]] = []
@@ -576,7 +909,7 @@ async def render_step(cb: CallbackQuery, state: FSMContext, step: str, from_back
         return
 
     if cb.message:
-        await show_main(cb.message, state)
+        await show_main(cb.message, state, in_place=True)
     try:
         await cb.answer()
     except Exception:
@@ -588,7 +921,7 @@ async def go_back(cb: CallbackQuery, state: FSMContext) -> None:
     history: list[str] = data.get("history", [])
     if not history:
         if cb.message:
-            await show_main(cb.message, state)
+            await show_main(cb.message, state, in_place=True)
         await cb.answer()
         return
     prev = history.pop()
@@ -596,60 +929,175 @@ async def go_back(cb: CallbackQuery, state: FSMContext) -> None:
     await render_step(cb, state, prev, from_back=True)
 
 
-async def send_order_to_orders_chat(bot: Bot, order_id: int, summary: str) -> None:
+def format_contact_block(data: dict[str, Any]) -> str:
+    full_name = data.get("full_name") or "Без имени"
+    username = data.get("username")
+    username_line = f"@{username}" if username else "нет username"
+    user_id = int(data.get("user_id") or 0)
+    return (
+        f"👤 Клиент: {full_name}\n"
+        f"🔖 Username: {username_line}\n"
+        f"🆔 Telegram ID: {user_id}\n"
+        f"🔗 tg://user?id={user_id}\n\n"
+    )
+
+
+def format_order_notification(order_id: int, data: dict[str, Any]) -> str:
+    text = f"🆕 Заявка №{order_id}\n\n{format_contact_block(data)}{data.get('summary') or ''}"
+    mesh = [format_mesh_stats(m.get("file_name") or "модель", m["stats"]) for m in data.get("mesh_stats") or []]
+    return "\n\n".join([text, "\n".join(mesh)]) if mesh else text
+
+
+def format_assignment_notification(order_id: int, data: dict[str, Any]) -> str:
+    return f"📌 Вам назначена заявка №{order_id}\n\n{format_contact_block(data)}{data.get('summary') or ''}"
+
+
+async def deliver_assignment(bot: Bot, order_id: int, payload: dict[str, Any]) -> None:
+    text = format_assignment_notification(order_id, payload)
+    try:
+        await bot.send_message(chat_id=int(payload["manager_chat_id"]), text=text)
+        return
+    except (TelegramForbiddenError, TelegramBadRequest) as exc:
+        # A bot cannot open a private chat: the manager has to press Start in this bot first.
+        logger.warning("Менеджер %s недоступен в личке: %s", payload.get("manager_id"), exc)
     raw_chat = get_orders_chat_id()
     if not raw_chat:
         return
+    await orders_chat_limiter().acquire()
+    await bot.send_message(
+        chat_id=normalize_chat_id(raw_chat),
+        text=f"📌 Заявка №{order_id} назначена: {payload.get('manager_name') or payload.get('manager_id')}",
+    )
 
-    contact_block = ""
-    order = database.get_order(order_id) if order_id else None
-    if order:
-        full_name = order.get("full_name") or "Без имени"
-        username = order.get("username")
-        username_line = f"@{username}" if username else "нет username"
-        user_id = int(order.get("user_id") or 0)
-        contact_block = (
-            f"👤 Клиент: {full_name}\n"
-            f"🔖 Username: {username_line}\n"
-            f"🆔 Telegram ID: {user_id}\n"
-            f"🔗 tg://user?id={user_id}\n\n"
-        )
-
-    chat_id = normalize_chat_id(raw_chat)
-    try:
-        await bot.send_message(chat_id=chat_id, text=f"🆕 Заявка №{order_id}\n\n{contact_block}{summary}")
-    except Exception:
-        logger.exception("Не удалось отправить заявку в чат заказов")
 
+async def deliver_outbox_event(bot: Bot, event: dict[str, Any]) -> None:
+    order_id = int(event["order_id"])
+    payload: dict[str, Any] = event.get("payload") or {}
+    if event["event_type"] == "order_assigned":
+        await deliver_assignment(bot, order_id, payload)
+        return
 
-async def forward_order_files_to_orders_chat(bot: Bot, order_id: int) -> None:
     raw_chat = get_orders_chat_id()
-    if not raw_chat or not order_id:
+    if not raw_chat:
         return
-
     chat_id = normalize_chat_id(raw_chat)
 
-    try:
-        files = database.list_order_files(order_id)
-    except Exception:
-        logger.exception("Не удалось получить файлы заявки из БД")
+    if event["event_type"] == "order_submitted":
+        await orders_chat_limiter().acquire()
+        await bot.send_message(chat_id=chat_id, text=format_order_notification(order_id, payload))
         return
+    if event["event_type"] == "client_message":
+        await orders_chat_limiter().acquire()
+        await bot.send_message(chat_id=chat_id, text=format_client_messages(order_id, payload))
+        return
+    if event["event_type"] == "order_mesh_stats":
+        await orders_chat_limiter().acquire()
+        text = format_mesh_stats(payload.get("file_name") or "модель", payload.get("stats") or {})
+        await bot.send_message(chat_id=chat_id, text=f"📐 Заявка №{order_id}\n{text}")
+        return
+    if event["event_type"] == "order_file":
+        file_id = payload.get("file_id")
+        file_type = str(payload.get("file_type") or "").lower()
+        if not file_id:
+            return
+        await orders_chat_limiter().acquire()
+        if file_type == "photo" or file_type.startswith("image/"):
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=f"📎 Фото к заявке №{order_id}")
+        else:
+            await bot.send_document(chat_id=chat_id, document=file_id, caption=f"📎 Файл к заявке №{order_id}")
+        return
+    logger.warning("Неизвестный тип события outbox: %s", event["event_type"])
+
+
+def format_client_messages(order_id: int, data: dict[str, Any]) -> str:
+    full_name = data.get("full_name") or "Без имени"
+    username = data.get("username")
+    who = f"{full_name} (@{username})" if username else f"{full_name} (id:{data.get('user_id')})"
+    texts = "\n".join(f"— {t}" for t in data.get("texts") or [])
+    return f"💬 Сообщение по заявке №{order_id}\n👤 {who}\n\n{texts}"
+
+
+def outbox_retry_delay(attempts: int, exc: Exception) -> float:
+    if isinstance(exc, TelegramRetryAfter):
+        return float(exc.retry_after)
+    return float(min(OUTBOX_BASE_DELAY_SECONDS * 2 ** max(attempts - 1, 0), OUTBOX_MAX_DELAY_SECONDS))
+
+
+def notify_outbox() -> None:
+    _outbox_wakeup.set()
+
+
+def notify_assignment() -> None:
+    _assign_wakeup.set()
+
+
+async def outbox_dispatcher(bots: dict[str, Bot]) -> None:
+    """Deliver queued orders-chat and manager notifications of every tenant with retries.
 
-    sent_file_ids: set[str] = set()
-    for item in files or []:
-        tg_file_id = item.get("telegram_file_id") or item.get("file_id")
-        if not tg_file_id or tg_file_id in sent_file_ids:
+    Events of one order are delivered in id order: when one fails, the later
+    ones of that order are deferred by the same delay.
+    """
+    while True:
+        try:
+            events = await asyncio.to_thread(database.claim_outbox_events, OUTBOX_BATCH_SIZE)
+        except Exception:
+            logger.exception("Не удалось получить события outbox")
+            events = []
+
+        blocked: dict[int, float] = {}
+        for event in events:
+            order_id = int(event["order_id"])
+            if order_id in blocked:
+                await asyncio.to_thread(database.defer_outbox_events, [event["id"]], blocked[order_id])
+                continue
+            tenant = str(event.get("tenant") or DEFAULT_TENANT)
+            # Config lookups and the orders-chat rate limit below are per tenant.
+            _tenant.set(tenant)
+            bind_correlation_id(f"outbox:{event['id']}")
+            try:
+                bot = bots.get(tenant)
+                if bot is None:
+                    raise RuntimeError(f"Бот тенанта {tenant} не запущен")
+                await deliver_outbox_event(bot, event)
+            except Exception as exc:
+                delay = outbox_retry_delay(event["attempts"], exc)
+                blocked[order_id] = delay
+                logger.warning("Не удалось доставить событие outbox %s: %s", event["id"], exc)
+                await asyncio.to_thread(database.mark_outbox_failed, event["id"], event["attempts"], str(exc), delay)
+                continue
+            await asyncio.to_thread(database.mark_outbox_sent, event["id"])
+
+        if len(events) >= OUTBOX_BATCH_SIZE:
             continue
-        sent_file_ids.add(tg_file_id)
+        try:
+            await asyncio.wait_for(_outbox_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _outbox_wakeup.clear()
+
 
-        file_type = str(item.get("file_type") or item.get("mime_type") or "").lower()
+async def assignment_loop() -> None:
+    """Hand waiting orders to managers (see database.assign_queued_orders()).
+
+    Woken right after a submit; the periodic pass picks up orders that had to
+    wait for a manager to free up or be added in the admin panel.
+    """
+    while True:
         try:
-            if file_type == "photo" or file_type.startswith("image/"):
-                await bot.send_photo(chat_id=chat_id, photo=tg_file_id, caption=f"📎 Фото к заявке №{order_id}")
-            else:
-                await bot.send_document(chat_id=chat_id, document=tg_file_id, caption=f"📎 Файл к заявке №{order_id}")
+            assigned = await asyncio.to_thread(database.assign_queued_orders, ASSIGN_BATCH_SIZE)
         except Exception:
-            logger.exception("Не удалось переслать вложение заявки в чат заказов")
+            logger.exception("Не удалось распределить заявки по менеджерам")
+            assigned = 0
+        if assigned:
+            # The notifications were queued in the same transaction.
+            notify_outbox()
+        if assigned >= ASSIGN_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_assign_wakeup.wait(), timeout=ASSIGN_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _assign_wakeup.clear()
 
 
 async def forward_file_to_orders_chat(message: Message, order_id: int) -> None:
@@ -675,21 +1123,85 @@ async def forward_file_to_orders_chat(message: Message, order_id: int) -> None:
         logger.exception("Не удалось переслать файл в чат заказов")
 
 
+def worker_pool() -> ProcessPoolExecutor:
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ProcessPoolExecutor(max_workers=settings.process_pool_workers)
+    return _worker_pool
+
+
+async def analyze_mesh_file(order_id: int, file_unique_id: str, path: Path, material: str | None) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        stats = await loop.run_in_executor(worker_pool(), mesh_analysis.analyze_mesh, str(path), material)
+        # Finished after the submit: the results were queued for the orders chat on their own.
+        if await asyncio.to_thread(database.set_order_file_mesh_stats, order_id, file_unique_id, stats):
+            notify_outbox()
+    except mesh_analysis.MeshError as e:
+        logger.warning("Не удалось разобрать модель %s: %s", path.name, e)
+    except Exception:
+        logger.exception("Ошибка анализа модели %s", path.name)
+
+
+def schedule_mesh_analysis(order_id: int, file_unique_id: str, path: Path, material: str | None) -> None:
+    task = asyncio.create_task(analyze_mesh_file(order_id, file_unique_id, path, material))
+    _mesh_jobs.add(task)
+    task.add_done_callback(_mesh_jobs.discard)
+
+
+async def build_file_preview(order_id: int, file_unique_id: str, path: Path) -> None:
+    dst = PREVIEWS_DIR / previews.preview_name(order_id, file_unique_id)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(worker_pool(), previews.build_preview, str(path), str(dst))
+    except Exception:
+        logger.exception("Не удалось построить превью %s", path.name)
+
+
+def format_mesh_stats(file_name: str, stats: dict[str, Any]) -> str:
+    x, y, z = stats.get("bbox_mm") or (0, 0, 0)
+    material = stats.get("material") or "материал не выбран"
+    triangles = f"{int(stats.get('triangles', 0)):,}".replace(",", " ")
+    return (
+        f"📐 {file_name}: {x:g}×{y:g}×{z:g} мм, {triangles} треуг., "
+        f"{stats.get('volume_cm3', 0):g} см³ ≈ {stats.get('grams', 0):g} г ({material}, 100% заполнение)"
+    )
+
+
+def submit_lock(order_id: int) -> asyncio.Lock:
+    lock = _submit_locks.get(order_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _submit_locks[order_id] = lock
+    return lock
+
+
 async def submit_order(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     order_id = int(data.get("order_id", 0) or 0)
-    payload: dict[str, Any] = data.get("payload", {})
-    summary = payload_summary(payload)
+    if not order_id:
+        return
 
-    if order_id:
-        database.finalize_order(order_id, summary)
+    lock = submit_lock(order_id)
+    if lock.locked():
+        # Double tap while the first submit is still running.
+        return
+    async with lock:
+        payload: dict[str, Any] = data.get("payload", {})
+        summary = payload_summary(payload)
 
-    await send_order_to_orders_chat(message.bot, order_id, summary)
-    await forward_order_files_to_orders_chat(message.bot, order_id)
+        # Orders-chat notifications and the manager queue entry are written in the same transaction;
+        # outbox_dispatcher() and assignment_loop() take it from there. Mesh analysis still running
+        # is not waited for: its results follow as a separate `order_mesh_stats` event.
+        if not await asyncio.to_thread(database.finalize_order, order_id, summary):
+            return
+        notify_outbox()
+        notify_assignment()
+        funnel.record(message.chat.id, order_id, str(payload.get("branch", "")), "review", "submit")
 
-    ok_text = get_cfg("text_submit_ok", "✅ Заявка отправлена! Менеджер скоро напишет вам в этот чат.")
-    await send_step(message, ok_text, kb([nav_row(include_back=False)]))
-    await state.clear()
+        ok_text = get_cfg("text_submit_ok", "✅ Заявка отправлена! Менеджер скоро напишет вам в этот чат.")
+        await send_step(message, ok_text, kb([nav_row(include_back=False)]))
+        await state.clear()
 
 
 async def on_start(message: Message, state: FSMContext) -> None:
@@ -703,7 +1215,7 @@ async def on_menu(cb: CallbackQuery, state: FSMContext) -> None:
         return
     if branch not in {"print", "scan", "idea"}:
         if cb.message:
-            await show_main(cb.message, state)
+            await show_main(cb.message, state, in_place=True)
         await cb.answer()
         return
     await start_order(cb, state, branch)
@@ -714,7 +1226,7 @@ async def on_nav(cb: CallbackQuery, state: FSMContext) -> None:
     action = (cb.data or "").split(":", 1)[1]
     if action == "menu":
         if cb.message:
-            await show_main(cb.message, state)
+            await show_main(cb.message, state, in_place=True)
         await cb.answer()
         return
     if action == "back":
@@ -779,10 +1291,48 @@ async def on_set(cb: CallbackQuery, state: FSMContext) -> None:
     await cb.answer()
 
 
+def resolve_client_order(message: Message) -> int:
+    """Order a free-form client message belongs to.
+
+    A reply to a manager message goes to that message's order; otherwise the
+    user's latest active order. The order being filled in (st["order_id"]) is
+    a draft managers have not seen, so text typed mid-form does not go there.
+    """
+    user = message.from_user
+    reply = message.reply_to_message
+    if reply:
+        order_id = database.find_order_by_outgoing_message(user.id, reply.message_id, tenant=current_tenant())
+        if order_id:
+            return order_id
+
+    tenant = current_tenant()
+    key = (tenant, user.id)
+    cached = _active_order_cache.get(key)
+    if cached:
+        if time.monotonic() - cached[1] < ACTIVE_ORDER_CACHE_SECONDS:
+            _active_order_cache.move_to_end(key)
+            return cached[0]
+        del _active_order_cache[key]
+    order_id = database.find_or_create_active_order(user.id, user_username(user), user_full_name(user), tenant=tenant)
+    _active_order_cache[key] = (order_id, time.monotonic())
+    while len(_active_order_cache) > ACTIVE_ORDER_CACHE_SIZE:
+        _active_order_cache.popitem(last=False)
+    return order_id
+
+
 async def on_text(message: Message, state: FSMContext) -> None:
     st = await state.get_data()
     waiting = st.get("waiting_text")
     if not waiting:
+        text = (message.text or "").strip()
+        if message.chat.type != "private" or not text or text.startswith("/"):
+            return
+        try:
+            order_id = resolve_client_order(message)
+        except Exception:
+            logger.exception("Не удалось определить заявку для сообщения клиента")
+            return
+        client_messages.add(order_id, text, message.message_id, message.from_user)
         return
 
     payload: dict[str, Any] = st.get("payload", {})
@@ -794,7 +1344,7 @@ async def on_text(message: Message, state: FSMContext) -> None:
         await persist(state)
         if st.get("order_id") and user_text:
             try:
-                database.add_order_message(int(st["order_id"]), "in", user_text)
+                database.add_order_message(int(st["order_id"]), "in", user_text, message.message_id)
             except Exception:
                 logger.exception("Не удалось сохранить входящее сообщение (description)")
 
@@ -803,46 +1353,56 @@ async def on_text(message: Message, state: FSMContext) -> None:
         return
 
 
-async def on_file(message: Message, state: FSMContext) -> None:
-    st = await state.get_data()
-    order_id = int(st.get("order_id", 0) or 0)
-    if not order_id:
-        return
-
-    tg_file_id = None
-    file_unique_id = None
-    file_name = None
-    file_type = None
-
+def file_info(message: Message) -> Optional[tuple[str, str, str, str]]:
+    """(telegram_file_id, file_unique_id, file_name, file_type) of a document or photo message."""
     if message.document:
-        tg_file_id = message.document.file_id
-        file_unique_id = message.document.file_unique_id
-        file_name = message.document.file_name
-        file_type = "document"
-    elif message.photo:
+        return (
+            message.document.file_id,
+            message.document.file_unique_id,
+            message.document.file_name,
+            "document",
+        )
+    if message.photo:
         tg_file_id = message.photo[-1].file_id
-        file_unique_id = message.photo[-1].file_unique_id
-        file_name = f"photo_{tg_file_id}.jpg"
-        file_type = "photo"
-    else:
-        return
+        return tg_file_id, message.photo[-1].file_unique_id, f"photo_{tg_file_id}.jpg", "photo"
+    return None
 
-    try:
-        database.add_order_file(order_id, tg_file_id, file_unique_id, file_name, file_type)
-    except Exception:
-        logger.exception("Не удалось записать файл в БД")
 
+async def download_order_file(message: Message, order_id: int, info: tuple[str, str, str, str], material: Any) -> None:
+    tg_file_id, file_unique_id, file_name, _ = info
     try:
         f = await message.bot.get_file(tg_file_id)
-        dst = UPLOADS_DIR / f"{order_id}_{Path(file_name or tg_file_id).name}"
+        dst = storage.hot_path(order_id, file_unique_id or tg_file_id, file_name or tg_file_id)
+        dst.parent.mkdir(parents=True, exist_ok=True)
         await message.bot.download_file(f.file_path, destination=dst)
+        if file_unique_id:
+            await asyncio.to_thread(
+                database.set_order_file_location, order_id, file_unique_id, storage.to_location(dst), dst.stat().st_size
+            )
+        if file_unique_id and dst.suffix.lower() in mesh_analysis.MESH_EXTENSIONS:
+            schedule_mesh_analysis(order_id, file_unique_id, dst, material)
+        if file_unique_id and previews.preview_kind(dst):
+            task = asyncio.create_task(build_file_preview(order_id, file_unique_id, dst))
+            _preview_jobs.add(task)
+            task.add_done_callback(_preview_jobs.discard)
     except Exception:
         logger.exception("Не удалось скачать файл локально")
 
+
+async def register_files(
+    message: Message,
+    state: FSMContext,
+    order_id: int,
+    files: list[tuple[Message, tuple[str, str, str, str]]],
+) -> None:
+    """Download new files, then update the draft and show the review step once."""
+    st = await state.get_data()
     payload: dict[str, Any] = st.get("payload", {})
-    payload["file"] = file_name or "файл"
+    await asyncio.gather(*(download_order_file(m, order_id, info, payload.get("material")) for m, info in files))
+
+    payload["file"] = ", ".join(info[2] or "файл" for _, info in files)
     pending_files: list[dict[str, str]] = st.get("pending_files", [])
-    pending_files.append({"file_id": tg_file_id, "file_type": file_type or ""})
+    pending_files.extend({"file_id": info[0], "file_type": info[3] or ""} for _, info in files)
     await state.update_data(payload=payload, pending_files=pending_files)
     await persist(state)
 
@@ -850,6 +1410,78 @@ async def on_file(message: Message, state: FSMContext) -> None:
     await render_step(fake_cb, state, "review")
 
 
+class MediaGroupCollector:
+    """Debounce album items: Telegram sends one update per photo/document of a media group.
+
+    Items of one media_group_id are buffered until no new item arrived for
+    `window` seconds, then stored with one multi-row insert and one review step.
+    """
+
+    def __init__(self, window: float = 1.0) -> None:
+        self._window = window
+        self._groups: dict[str, dict[str, Any]] = {}
+
+    def add(self, message: Message, state: FSMContext, order_id: int, info: tuple[str, str, str, str]) -> None:
+        key = str(message.media_group_id)
+        group = self._groups.setdefault(key, {"items": [], "task": None})
+        group["items"].append((message, info))
+        group["state"] = state
+        group["order_id"] = order_id
+        if group["task"] is not None:
+            # Still sleeping: the group is popped right after the sleep, before any await.
+            group["task"].cancel()
+        group["task"] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: str) -> None:
+        await asyncio.sleep(self._window)
+        group = self._groups.pop(key, None)
+        if not group:
+            return
+        items: list[tuple[Message, tuple[str, str, str, str]]] = group["items"]
+        order_id: int = group["order_id"]
+        try:
+            fresh = set(
+                await asyncio.to_thread(database.add_order_files, order_id, [info for _, info in items])
+            )
+        except Exception:
+            logger.exception("Не удалось записать файлы альбома в БД")
+            fresh = {info[1] for _, info in items}
+        items = [(m, info) for m, info in items if info[1] in fresh]
+        if not items:
+            return
+        try:
+            await register_files(items[-1][0], group["state"], order_id, items)
+        except Exception:
+            logger.exception("Не удалось обработать альбом")
+
+
+album_collector = MediaGroupCollector()
+
+
+async def on_file(message: Message, state: FSMContext) -> None:
+    st = await state.get_data()
+    order_id = int(st.get("order_id", 0) or 0)
+    if not order_id:
+        return
+
+    info = file_info(message)
+    if info is None:
+        return
+    if message.media_group_id:
+        album_collector.add(message, state, order_id, info)
+        return
+
+    tg_file_id, file_unique_id, file_name, file_type = info
+    try:
+        if not database.add_order_file(order_id, tg_file_id, file_unique_id, file_name, file_type):
+            # Same file already attached (redelivered update or re-sent file).
+            return
+    except Exception:
+        logger.exception("Не удалось записать файл в БД")
+
+    await register_files(message, state, order_id, [(message, info)])
+
+
 async def on_review(cb: CallbackQuery, state: FSMContext) -> None:
     action = (cb.data or "").split(":", 1)[1] if cb.data else ""
     if action == "add_description":
@@ -863,10 +1495,18 @@ async def on_review(cb: CallbackQuery, state: FSMContext) -> None:
     await cb.answer()
 
 
+async def handle_internal_ready(request: web.Request) -> web.Response:
+    """Readiness probe: 503 until warm_start() has finished."""
+    return web.json_response(_startup.as_dict(), status=200 if _startup.ready else 503)
+
+
 async def handle_internal_send_message(request: web.Request) -> web.Response:
+    bind_correlation_id(request.headers.get("X-Request-ID") or "internal")
     key = request.headers.get("X-Internal-Key", "")
     if not key or key != settings.internal_api_key:
         return web.json_response({"detail": "Unauthorized"}, status=401)
+    if not _startup.ready:
+        return web.json_response({"detail": "Бот ещё запускается"}, status=503)
 
     try:
         data = await request.json()
@@ -876,43 +1516,183 @@ async def handle_internal_send_message(request: web.Request) -> web.Response:
     user_id = int(data.get("user_id", 0) or 0)
     text = str(data.get("text", "") or "").strip()
     order_id = int(data.get("order_id", 0) or 0)
+    tenant = str(data.get("tenant") or DEFAULT_TENANT)
 
     if not user_id or not text:
         return web.json_response({"detail": "user_id и text обязательны"}, status=400)
 
-    bot: Bot = request.app["bot"]
+    bot: Bot | None = request.app["bots"].get(tenant)
+    if bot is None:
+        return web.json_response({"detail": "Неизвестный бот"}, status=404)
     try:
-        await bot.send_message(chat_id=user_id, text=text)
+        sent = await bot.send_message(chat_id=user_id, text=text)
     except Exception:
         logger.exception("Не удалось отправить сообщение пользователю")
         return web.json_response({"detail": "Telegram send failed"}, status=400)
 
     if order_id:
         try:
-            database.add_order_message(order_id, "out", text)
+            database.add_order_message(order_id, "out", text, sent.message_id)
         except Exception:
             logger.exception("Не удалось сохранить сообщение в БД")
 
     return web.json_response({"ok": True})
 
 
-async def start_internal_api(bot: Bot) -> web.AppRunner:
+async def start_internal_api(bots: dict[str, Bot]) -> web.AppRunner:
     app = web.Application()
-    app["bot"] = bot
+    app["bots"] = bots
     app.router.add_post("/internal/sendMessage", handle_internal_send_message)
+    app.router.add_get("/internal/ready", handle_internal_ready)
 
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, host="0.0.0.0", port=8081)
-    await site.start()
+    await web.TCPSite(runner, host=settings.internal_api_host, port=settings.internal_api_port).start()
+    if settings.internal_api_socket:
+        await web.UnixSite(runner, settings.internal_api_socket).start()
     return runner
 
 
-async def main() -> None:
-    database.init_db_if_needed()
+def remove_local_uploads(order_ids: list[int]) -> None:
+    for order_id in order_ids:
+        try:
+            storage.remove_order(order_id)
+        except Exception:
+            logger.exception("Не удалось удалить вложения заявки %s", order_id)
+        # Files saved before tiered storage, plus previews.
+        for path in [*UPLOADS_DIR.glob(f"{order_id}_*"), *PREVIEWS_DIR.glob(f"{order_id}_*")]:
+            try:
+                path.unlink()
+            except OSError:
+                logger.warning("Не удалось удалить файл %s", path)
+
+
+async def run_draft_gc() -> int:
+    """Purge abandoned drafts in bounded batches, yielding between them."""
+    purged = 0
+    while True:
+        ids = await asyncio.to_thread(
+            database.purge_stale_drafts,
+            settings.draft_ttl_hours,
+            settings.draft_gc_batch_size,
+        )
+        if not ids:
+            return purged
+        purged += len(ids)
+        await asyncio.to_thread(remove_local_uploads, ids)
+        await asyncio.sleep(0.5)
+
+
+async def run_archive() -> int:
+    """Move closed orders to the archive tier batch by batch."""
+    await asyncio.to_thread(database.ensure_archive_partitions)
+    moved = 0
+    while True:
+        count = await asyncio.to_thread(
+            database.archive_orders_batch,
+            settings.archive_after_days,
+            settings.archive_batch_size,
+        )
+        if not count:
+            return moved
+        moved += count
+        await asyncio.sleep(0.5)
+
+
+async def maintenance_loop() -> None:
+    while True:
+        try:
+            purged = await run_draft_gc()
+            if purged:
+                logger.info("Удалено брошенных черновиков: %s", purged)
+        except Exception:
+            logger.exception("Ошибка очистки черновиков")
+        try:
+            await asyncio.to_thread(database.purge_sent_outbox)
+            await asyncio.to_thread(database.purge_funnel_events)
+        except Exception:
+            logger.exception("Ошибка очистки outbox и событий воронки")
+        try:
+            moved = await run_archive()
+            if moved:
+                logger.info("Перенесено заявок в архив: %s", moved)
+        except Exception:
+            logger.exception("Ошибка архивации заявок")
+        try:
+            tiers = await asyncio.to_thread(storage.run_tiering)
+            if any(tiers.values()):
+                logger.info("Хранилище вложений: %s", tiers)
+        except Exception:
+            logger.exception("Ошибка обслуживания хранилища вложений")
+        await asyncio.sleep(settings.maintenance_interval_seconds)
+
+
+def _step_photo_refs() -> set[str]:
+    cfg = bot_cfg()
+    refs = {photo_ref_for(key) for key in cfg if key.startswith("photo_")}
+    refs.add(cfg.get("placeholder_photo_path", "") or settings.placeholder_photo_path)
+    return {ref for ref in refs if ref}
+
+
+async def warm_step_photos(tenant: str, bot: Bot) -> None:
+    """Check every step photo of a tenant before the first user needs it.
+
+    Local files must exist and fit Telegram's photo limit, URLs are
+    downloaded once (see step_photo()). With WARMUP_CHAT_ID set, each photo
+    is also uploaded there and the message deleted, so even the first user
+    gets a cached file_id.
+    """
+    _tenant.set(tenant)
+    for ref in _step_photo_refs():
+        key = photo_key(ref)
+        if (tenant, key) in _photo_file_ids:
+            continue
+        try:
+            if ref.startswith(("http://", "https://")):
+                _prefetched_photos[(tenant, key)] = await fetch_image(ref)
+            elif Path(ref).is_file() and Path(ref).stat().st_size > MAX_IMAGE_SIZE_BYTES:
+                raise ValueError("файл больше 10 МБ")
+            if settings.warmup_chat_id:
+                chat_id = normalize_chat_id(settings.warmup_chat_id)
+                sent = await bot.send_photo(chat_id, photo=await step_photo(ref, key), disable_notification=True)
+                _photo_file_ids[(tenant, key)] = sent.photo[-1].file_id
+                _prefetched_photos.pop((tenant, key), None)
+                await bot.delete_message(chat_id, sent.message_id)
+        except Exception as exc:
+            logger.warning("Фото шага %s (%s) не прогрето: %s", ref, tenant, exc)
+
+
+def _preload_config(tenant: str) -> None:
+    _tenant.set(tenant)
+    bot_cfg()
+
+
+async def warm_start(bots: dict[str, Bot]) -> None:
+    """Pay the cold-start costs before the first update instead of during it."""
+    async with _startup.phase("schema"):
+        await asyncio.to_thread(database.init_db_if_needed)
+    async with _startup.phase("db_pool", required=False):
+        await asyncio.to_thread(database.warm_pool)
+        await asyncio.to_thread(database.warm_pool, "replica")
+    async with _startup.phase("telegram"):
+        # Checks every token and opens the HTTPS session to the Bot API.
+        await asyncio.gather(*(bot.get_me() for bot in bots.values()))
+    async with _startup.phase("config", required=False):
+        await asyncio.gather(*(asyncio.to_thread(_preload_config, tenant) for tenant in bots))
+    async with _startup.phase("photos", required=False):
+        await asyncio.gather(*(warm_step_photos(tenant, bot) for tenant, bot in bots.items()))
+    _startup.finish()
+
 
-    bot = Bot(token=settings.bot_token)
+async def main() -> None:
+    # One Bot per storefront token; they share the dispatcher, DB pool, outbox and workers.
+    bots = {tenant: Bot(token=token) for tenant, token in settings.tenant_tokens.items()}
+    if not bots:
+        raise RuntimeError("BOT_TOKEN или BOT_TOKENS не заданы")
+    _bot_tenants.update({bot.id: tenant for tenant, bot in bots.items()})
     dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(TenantMiddleware())
+    dp.update.outer_middleware(DedupUpdatesMiddleware())
 
     dp.message.register(on_start, CommandStart())
     dp.callback_query.register(on_menu, F.data.startswith("menu:"))
@@ -927,12 +1707,30 @@ async def main() -> None:
         F.content_type.in_({ContentType.DOCUMENT, ContentType.PHOTO}),
     )
 
-    runner = await start_internal_api(bot)
-
+    # Up first so /internal/ready answers 503 while warming.
+    runner = await start_internal_api(bots)
+    tasks: list[asyncio.Task] = []
     try:
-        await dp.start_polling(bot)
+        # Polling and background workers start only once the warm start is done.
+        await warm_start(bots)
+        tasks = [
+            asyncio.create_task(maintenance_loop()),
+            asyncio.create_task(outbox_dispatcher(bots)),
+            asyncio.create_task(assignment_loop()),
+            asyncio.create_task(client_messages.run()),
+            asyncio.create_task(funnel.run()),
+        ]
+        await dp.start_polling(*bots.values())
     finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if _worker_pool is not None:
+            _worker_pool.shutdown(wait=False, cancel_futures=True)
         await runner.cleanup()
+        # start_polling closes them too, but not when the warm start failed.
+        for bot in bots.values():
+            await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -1,26 +1,78 @@
 import os
+import re
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Tenant served by BOT_TOKEN; rows written before multi-bot hosting belong to it.
+DEFAULT_TENANT = "default"
+TENANT_SLUG = re.compile(r"^[a-z0-9_-]{1,64}$")
+
 
 @dataclass(frozen=True)
 class Settings:
     bot_token: str = os.getenv("BOT_TOKEN", "")
+    # Extra storefront bots served by the same process: "brand:token,other:token".
+    bot_tokens: str = os.getenv("BOT_TOKENS", "")
+    # "mysql" or "sqlite" (single-node deployments, see database_sqlite.py)
+    db_backend: str = os.getenv("DB_BACKEND", "mysql").lower()
+    sqlite_path: str = os.getenv("SQLITE_PATH", "chel3d.db")
     mysql_host: str = os.getenv("MYSQL_HOST", "mysql")
     mysql_port: int = int(os.getenv("MYSQL_PORT", "3306"))
     mysql_db: str = os.getenv("MYSQL_DB", "chel3d_db")
     mysql_user: str = os.getenv("MYSQL_USER", "chel3d_user")
     mysql_password: str = os.getenv("MYSQL_PASSWORD", "")
+    mysql_pool_size: int = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+    mysql_replica_host: str = os.getenv("MYSQL_REPLICA_HOST", "")
+    mysql_replica_port: int = int(os.getenv("MYSQL_REPLICA_PORT", "3306"))
+    mysql_replica_max_lag_seconds: float = float(os.getenv("MYSQL_REPLICA_MAX_LAG_SECONDS", "5"))
     orders_chat_id: str = os.getenv("ORDERS_CHAT_ID", "")
     manager_username: str = os.getenv("MANAGER_USERNAME", "")
     placeholder_photo_path: str = os.getenv("PLACEHOLDER_PHOTO_PATH", "assets/placeholder.png")
+    # Service chat where warm start uploads step photos to cache their file_ids (optional).
+    warmup_chat_id: str = os.getenv("WARMUP_CHAT_ID", "")
     internal_api_key: str = os.getenv("INTERNAL_API_KEY", "")
     internal_api_host: str = os.getenv("INTERNAL_API_HOST", "0.0.0.0")
     internal_api_port: int = int(os.getenv("INTERNAL_API_PORT", "8081"))
+    # Optional Unix socket path for the internal API when bot and backend share a host.
+    internal_api_socket: str = os.getenv("INTERNAL_API_SOCKET", "")
     admin_panel_password: str = os.getenv("ADMIN_PANEL_PASSWORD", "admin123")
     secret_key: str = os.getenv("SECRET_KEY", "change-me")
+    draft_ttl_hours: int = int(os.getenv("DRAFT_TTL_HOURS", "72"))
+    draft_gc_batch_size: int = int(os.getenv("DRAFT_GC_BATCH_SIZE", "500"))
+    archive_after_days: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+    archive_batch_size: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+    maintenance_interval_seconds: int = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+    uploads_dir: str = os.getenv("UPLOADS_DIR", "uploads")
+    # Attachment tiers (storage.py); a quota of 0 means unlimited.
+    storage_compress_after_hours: int = int(os.getenv("STORAGE_COMPRESS_AFTER_HOURS", "24"))
+    storage_offload_after_days: int = int(os.getenv("STORAGE_OFFLOAD_AFTER_DAYS", "30"))
+    storage_local_quota_mb: int = int(os.getenv("STORAGE_LOCAL_QUOTA_MB", "0"))
+    # S3-compatible bucket for offloaded attachments; empty S3_BUCKET keeps everything local.
+    s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "")
+    s3_bucket: str = os.getenv("S3_BUCKET", "")
+    s3_access_key: str = os.getenv("S3_ACCESS_KEY", "")
+    s3_secret_key: str = os.getenv("S3_SECRET_KEY", "")
+    s3_region: str = os.getenv("S3_REGION", "us-east-1")
+    process_pool_workers: int = int(os.getenv("PROCESS_POOL_WORKERS", "2"))
+    log_level: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    # "json" (one object per line) or "text"
+    log_format: str = os.getenv("LOG_FORMAT", "json").lower()
+
+    @property
+    def tenant_tokens(self) -> dict[str, str]:
+        """Tenant slug -> bot token, BOT_TOKEN first as the default tenant."""
+        tokens = {DEFAULT_TENANT: self.bot_token} if self.bot_token else {}
+        for item in self.bot_tokens.split(","):
+            slug, _, token = item.strip().partition(":")
+            slug = slug.strip().lower()
+            if not token:
+                continue
+            if not TENANT_SLUG.match(slug):
+                raise ValueError(f"Invalid tenant slug in BOT_TOKENS: {slug!r}")
+            tokens[slug] = token.strip()
+        return tokens
 
 
 settings = Settings()
@@ -1,32 +1,378 @@
 import json
+import logging
+import queue
+import re
+import threading
 import time
+from collections import Counter
 from contextlib import contextmanager
-from typing import Any
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Iterator
 
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 
-from config import settings
+from config import DEFAULT_TENANT, settings
 
 ALLOWED_STATUSES = {"draft", "new", "submitted", "in_work", "done", "canceled"}
 
+# Payload fields mirrored into indexed generated columns of `orders`.
+FACET_FIELDS: tuple[str, ...] = ("technology", "material", "scan_type", "idea_type")
+
+# Closed orders eligible for the archive tier.
+ARCHIVE_STATUSES: tuple[str, ...] = ("done", "canceled")
+
+# Orders that count towards a manager's load; a waiting order outside them is dropped from the queue.
+MANAGER_LOAD_STATUSES: tuple[str, ...] = ("new", "submitted", "in_work")
+
+# Columns shared by `orders` and `orders_archive`, in the same order.
+ORDER_COLUMNS: tuple[str, ...] = (
+    "id",
+    "user_id",
+    "username",
+    "full_name",
+    "branch",
+    "status",
+    "summary",
+    "order_payload",
+    *FACET_FIELDS,
+    "tenant",
+    "created_at",
+    "updated_at",
+)
+ORDER_FILE_COLUMNS: tuple[str, ...] = (
+    "id",
+    "order_id",
+    "telegram_file_id",
+    "file_unique_id",
+    "telegram_message_id",
+    "original_name",
+    "mime_type",
+    "file_size",
+    "local_path",
+    "mesh_stats",
+    "created_at",
+)
+ORDER_MESSAGE_COLUMNS: tuple[str, ...] = (
+    "id",
+    "order_id",
+    "direction",
+    "message_text",
+    "telegram_message_id",
+    "created_at",
+)
+
+# (kind, table, name, ddl) applied by init_db_if_needed() to databases created
+# from an older schema.sql; kind is "table", "column" or "index".
+SCHEMA_MIGRATIONS: list[tuple[str, str, str, str]] = [
+    *[
+        (
+            "column",
+            "orders",
+            field,
+            f"ALTER TABLE orders ADD COLUMN {field} VARCHAR(128) "
+            f"GENERATED ALWAYS AS (LEFT(order_payload->>'$.{field}', 128)) STORED",
+        )
+        for field in FACET_FIELDS
+    ],
+    *[
+        ("index", "orders", f"idx_orders_{field}", f"ALTER TABLE orders ADD KEY idx_orders_{field} ({field}, created_at)")
+        for field in FACET_FIELDS
+    ],
+    ("index", "order_messages", "idx_order_messages_order_id", "ALTER TABLE order_messages ADD KEY idx_order_messages_order_id (order_id, id)"),
+    (
+        "table",
+        "bot_config_version",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS bot_config_version (
+          id TINYINT UNSIGNED NOT NULL,
+          version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+          PRIMARY KEY (id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    (
+        "table",
+        "order_outbox",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS order_outbox (
+          id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+          order_id BIGINT UNSIGNED NOT NULL,
+          event_type VARCHAR(64) NOT NULL,
+          payload JSON NULL,
+          status ENUM('pending','sent','failed') NOT NULL DEFAULT 'pending',
+          attempts INT UNSIGNED NOT NULL DEFAULT 0,
+          next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          last_error VARCHAR(512) NULL,
+          created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          sent_at DATETIME NULL,
+          PRIMARY KEY (id),
+          KEY idx_order_outbox_due (status, next_attempt_at),
+          KEY idx_order_outbox_order (order_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    (
+        "table",
+        "orders_archive",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS orders_archive (
+          id BIGINT UNSIGNED NOT NULL,
+          user_id BIGINT NOT NULL,
+          username VARCHAR(255) NULL,
+          full_name VARCHAR(255) NULL,
+          branch VARCHAR(64) NOT NULL,
+          status ENUM('draft','new','in_work','done','canceled') NOT NULL,
+          summary TEXT NULL,
+          order_payload JSON NULL,
+          technology VARCHAR(128) NULL,
+          material VARCHAR(128) NULL,
+          scan_type VARCHAR(128) NULL,
+          idea_type VARCHAR(128) NULL,
+          created_at DATETIME NOT NULL,
+          updated_at DATETIME NOT NULL,
+          archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (id, created_at),
+          KEY idx_orders_archive_user (user_id),
+          KEY idx_orders_archive_status_created (status, created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        PARTITION BY RANGE (TO_DAYS(created_at)) (
+          PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+          PARTITION p_max VALUES LESS THAN MAXVALUE
+        )
+        ''',
+    ),
+    (
+        "table",
+        "order_files_archive",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS order_files_archive (
+          id BIGINT UNSIGNED NOT NULL,
+          order_id BIGINT UNSIGNED NOT NULL,
+          telegram_file_id VARCHAR(255) NOT NULL,
+          file_unique_id VARCHAR(255) NULL,
+          telegram_message_id BIGINT NULL,
+          original_name VARCHAR(255) NOT NULL,
+          mime_type VARCHAR(255) NULL,
+          file_size BIGINT NULL,
+          local_path VARCHAR(512) NULL,
+          mesh_stats JSON NULL,
+          created_at DATETIME NOT NULL,
+          PRIMARY KEY (id, created_at),
+          KEY idx_order_files_archive_order (order_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        PARTITION BY RANGE (TO_DAYS(created_at)) (
+          PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+          PARTITION p_max VALUES LESS THAN MAXVALUE
+        )
+        ''',
+    ),
+    (
+        "table",
+        "order_messages_archive",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS order_messages_archive (
+          id BIGINT UNSIGNED NOT NULL,
+          order_id BIGINT UNSIGNED NOT NULL,
+          direction ENUM('in','out') NOT NULL,
+          message_text TEXT NOT NULL,
+          telegram_message_id BIGINT NULL,
+          created_at DATETIME NOT NULL,
+          PRIMARY KEY (id, created_at),
+          KEY idx_order_messages_archive_order_id (order_id, id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        PARTITION BY RANGE (TO_DAYS(created_at)) (
+          PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+          PARTITION p_max VALUES LESS THAN MAXVALUE
+        )
+        ''',
+    ),
+    (
+        "table",
+        "orders_archive_stats",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS orders_archive_stats (
+          tenant VARCHAR(64) NOT NULL,
+          archived_orders BIGINT UNSIGNED NOT NULL DEFAULT 0,
+          PRIMARY KEY (tenant)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    ("column", "order_files", "file_unique_id", "ALTER TABLE order_files ADD COLUMN file_unique_id VARCHAR(255) NULL AFTER telegram_file_id"),
+    ("index", "order_files", "uq_order_files_unique", "ALTER TABLE order_files ADD UNIQUE KEY uq_order_files_unique (order_id, file_unique_id)"),
+    (
+        "column",
+        "order_files_archive",
+        "file_unique_id",
+        "ALTER TABLE order_files_archive ADD COLUMN file_unique_id VARCHAR(255) NULL AFTER telegram_file_id",
+    ),
+    (
+        "index",
+        "order_messages",
+        "uq_order_messages_tg",
+        "ALTER TABLE order_messages ADD UNIQUE KEY uq_order_messages_tg (order_id, direction, telegram_message_id)",
+    ),
+    ("index", "order_messages", "idx_order_messages_tg", "ALTER TABLE order_messages ADD KEY idx_order_messages_tg (telegram_message_id)"),
+    (
+        "table",
+        "funnel_events",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS funnel_events (
+          id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+          user_id BIGINT NOT NULL,
+          order_id BIGINT UNSIGNED NULL,
+          branch VARCHAR(64) NOT NULL DEFAULT '',
+          step VARCHAR(64) NOT NULL,
+          action VARCHAR(16) NOT NULL,
+          created_at DATETIME(3) NOT NULL,
+          PRIMARY KEY (id),
+          KEY idx_funnel_events_created (created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    (
+        "table",
+        "funnel_daily",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS funnel_daily (
+          day DATE NOT NULL,
+          branch VARCHAR(64) NOT NULL,
+          step VARCHAR(64) NOT NULL,
+          action VARCHAR(16) NOT NULL,
+          events INT UNSIGNED NOT NULL DEFAULT 0,
+          users INT UNSIGNED NOT NULL DEFAULT 0,
+          PRIMARY KEY (day, branch, step, action)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    ("column", "order_files", "mesh_stats", "ALTER TABLE order_files ADD COLUMN mesh_stats JSON NULL AFTER local_path"),
+    (
+        "column",
+        "order_files_archive",
+        "mesh_stats",
+        "ALTER TABLE order_files_archive ADD COLUMN mesh_stats JSON NULL AFTER local_path",
+    ),
+    # Multi-bot hosting: existing rows belong to the default tenant.
+    (
+        "column",
+        "orders",
+        "tenant",
+        "ALTER TABLE orders ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' AFTER id, "
+        "ADD KEY idx_orders_tenant_user (tenant, user_id, status), ADD KEY idx_orders_tenant_created (tenant, created_at)",
+    ),
+    (
+        "column",
+        "orders_archive",
+        "tenant",
+        "ALTER TABLE orders_archive ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' AFTER id, "
+        "ADD KEY idx_orders_archive_tenant (tenant, created_at)",
+    ),
+    ("column", "order_outbox", "tenant", "ALTER TABLE order_outbox ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' AFTER id"),
+    (
+        "column",
+        "bot_config",
+        "tenant",
+        "ALTER TABLE bot_config ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' FIRST, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (tenant, config_key)",
+    ),
+    ("column", "funnel_events", "tenant", "ALTER TABLE funnel_events ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' AFTER id"),
+    (
+        "column",
+        "funnel_daily",
+        "tenant",
+        "ALTER TABLE funnel_daily ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' AFTER day, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (day, tenant, branch, step, action)",
+    ),
+    (
+        "column",
+        "orders_archive_stats",
+        "tenant",
+        "ALTER TABLE orders_archive_stats ADD COLUMN tenant VARCHAR(64) NOT NULL DEFAULT 'default' FIRST, "
+        "DROP PRIMARY KEY, DROP COLUMN id, ADD PRIMARY KEY (tenant)",
+    ),
+    (
+        "table",
+        "managers",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS managers (
+          id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+          tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+          telegram_user_id BIGINT NOT NULL,
+          name VARCHAR(255) NOT NULL,
+          branches VARCHAR(255) NOT NULL DEFAULT '',
+          max_in_work INT UNSIGNED NOT NULL DEFAULT 10,
+          active TINYINT(1) NOT NULL DEFAULT 1,
+          created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (id),
+          UNIQUE KEY uq_managers_tenant_user (tenant, telegram_user_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+    (
+        "table",
+        "order_queue",
+        "",
+        '''
+        CREATE TABLE IF NOT EXISTS order_queue (
+          order_id BIGINT UNSIGNED NOT NULL,
+          tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+          branch VARCHAR(64) NOT NULL,
+          status ENUM('waiting','assigned','closed') NOT NULL DEFAULT 'waiting',
+          manager_id BIGINT UNSIGNED NULL,
+          enqueued_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          checked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          assigned_at DATETIME NULL,
+          PRIMARY KEY (order_id),
+          KEY idx_order_queue_claim (status, checked_at),
+          KEY idx_order_queue_manager (manager_id, status),
+          KEY idx_order_queue_assigned (tenant, assigned_at),
+          CONSTRAINT fk_order_queue_order FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''',
+    ),
+]
+
 
 class DatabaseError(Exception):
     pass
 
 
-def get_connection(retries: int = 20, delay: float = 1.5):
+_READ_ONLY_SQL = re.compile(r"\s*(SELECT|SHOW|WITH)\b", re.IGNORECASE)
+
+
+class TrackingCursor(DictCursor):
+    """DictCursor that remembers whether it ran anything other than a read."""
+
+    wrote = False
+
+    def execute(self, query, args=None):
+        if not self.wrote and not _READ_ONLY_SQL.match(query):
+            self.wrote = True
+        return super().execute(query, args)
+
+
+def get_connection(retries: int = 20, delay: float = 1.5, host: str | None = None, port: int | None = None):
     last_error: Exception | None = None
     for _ in range(retries):
         try:
             return pymysql.connect(
-                host=settings.mysql_host,
-                port=int(settings.mysql_port),
+                host=host or settings.mysql_host,
+                port=int(port or settings.mysql_port),
                 user=settings.mysql_user,
                 password=settings.mysql_password,
                 database=settings.mysql_db,
                 charset="utf8mb4",
-                cursorclass=DictCursor,
+                cursorclass=TrackingCursor,
                 autocommit=False,
             )
         except Exception as exc:
@@ -35,115 +381,453 @@ def get_connection(retries: int = 20, delay: float = 1.5):
     raise DatabaseError(f"Cannot connect to DB: {last_error}")
 
 
+# Idle connections as (conn, released_at) per role; LIFO keeps the warmest ones in use.
+_pools: dict[str, "queue.LifoQueue[tuple[Any, float]]"] = {
+    "primary": queue.LifoQueue(maxsize=settings.mysql_pool_size),
+    "replica": queue.LifoQueue(maxsize=settings.mysql_pool_size),
+}
+POOL_PING_AFTER_SECONDS = 30.0
+
+# Replica routing: read-only helpers pass db_cursor(readonly=True). They go to
+# MYSQL_REPLICA_HOST while its lag is within MYSQL_REPLICA_MAX_LAG_SECONDS,
+# unless the current context (one API request / one bot update) has already
+# written to the primary, so it reads its own writes.
+REPLICA_LAG_CHECK_SECONDS = 5.0
+_replica_state: dict[str, Any] = {"healthy": False, "checked_at": 0.0, "warned": False}
+_replica_lock = threading.Lock()
+# A one-item list rather than a bool: asyncio.to_thread() runs the DAL in a copy
+# of the context, and only a shared mutable holder carries its writes back.
+_wrote_primary: ContextVar[list[bool] | None] = ContextVar("wrote_primary", default=None)
+
+
+def track_primary_writes() -> None:
+    """Start read-your-writes tracking for one API request or bot update.
+
+    Call it in the caller's context before any DAL call, so writes made in
+    worker threads mark the same holder.
+    """
+    _wrote_primary.set([False])
+
+
+def _mark_primary_written() -> None:
+    holder = _wrote_primary.get()
+    if holder is None:
+        _wrote_primary.set([True])
+    else:
+        holder[0] = True
+
+
+def _open_connection(role: str):
+    if role == "replica":
+        # Fail fast: a dead replica must not stall reads that can go to the primary.
+        return get_connection(retries=1, host=settings.mysql_replica_host, port=settings.mysql_replica_port)
+    return get_connection()
+
+
+def _acquire_connection(role: str = "primary"):
+    pool = _pools[role]
+    while True:
+        try:
+            conn, released_at = pool.get_nowait()
+        except queue.Empty:
+            return _open_connection(role)
+        if time.monotonic() - released_at < POOL_PING_AFTER_SECONDS:
+            return conn
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Exception:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _release_connection(conn, role: str = "primary") -> None:
+    try:
+        _pools[role].put_nowait((conn, time.monotonic()))
+    except queue.Full:
+        _close_quietly(conn)
+
+
+def _replica_lag_seconds(cur) -> float | None:
+    """Seconds_Behind_Source of the replica, None when replication is not running."""
+    try:
+        cur.execute("SHOW REPLICA STATUS")
+        row = cur.fetchone()
+        key = "Seconds_Behind_Source"
+    except pymysql.MySQLError:
+        # MySQL < 8.0.22
+        cur.execute("SHOW SLAVE STATUS")
+        row = cur.fetchone()
+        key = "Seconds_Behind_Master"
+    if not row or row.get(key) is None:
+        return None
+    return float(row[key])
+
+
+def _replica_usable() -> bool:
+    if not settings.mysql_replica_host:
+        return False
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] < REPLICA_LAG_CHECK_SECONDS:
+        return _replica_state["healthy"]
+    with _replica_lock:
+        if now - _replica_state["checked_at"] < REPLICA_LAG_CHECK_SECONDS:
+            return _replica_state["healthy"]
+        healthy = False
+        try:
+            conn = _acquire_connection("replica")
+            try:
+                with conn.cursor() as cur:
+                    lag = _replica_lag_seconds(cur)
+                healthy = lag is not None and lag <= settings.mysql_replica_max_lag_seconds
+                _release_connection(conn, "replica")
+            except Exception:
+                _close_quietly(conn)
+                raise
+        except Exception as exc:
+            if not _replica_state["warned"]:
+                # Typically a dead replica or a missing REPLICATION CLIENT grant.
+                logging.getLogger(__name__).warning("Реплика недоступна, чтение идёт с primary: %s", exc)
+                _replica_state["warned"] = True
+        _replica_state.update(healthy=healthy, checked_at=time.monotonic())
+        return healthy
+
+
 @contextmanager
-def db_cursor():
-    conn = get_connection()
+def db_cursor(readonly: bool = False):
+    holder = _wrote_primary.get()
+    role = "replica" if readonly and not (holder and holder[0]) and _replica_usable() else "primary"
+    try:
+        conn = _acquire_connection(role)
+    except DatabaseError:
+        if role == "primary":
+            raise
+        _replica_state.update(healthy=False, checked_at=time.monotonic())
+        role = "primary"
+        conn = _acquire_connection(role)
     try:
         with conn.cursor() as cur:
             yield conn, cur
         conn.commit()
     except Exception:
-        conn.rollback()
+        # A failed connection may be mid-result or broken; don't hand it out again.
+        try:
+            conn.rollback()
+        finally:
+            _close_quietly(conn)
         raise
-    finally:
-        conn.close()
+    if cur.wrote:
+        _mark_primary_written()
+    _release_connection(conn, role)
 
 
-def init_db_if_needed() -> None:
+def _schema_object_exists(cur, kind: str, table: str, name: str) -> bool:
+    if kind == "column":
+        cur.execute(
+            "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s LIMIT 1",
+            (table, name),
+        )
+    elif kind == "index":
+        cur.execute(
+            "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s LIMIT 1",
+            (table, name),
+        )
+    else:
+        cur.execute(
+            "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s LIMIT 1",
+            (table,),
+        )
+    return cur.fetchone() is not None
+
+
+def _schema_objects(cur) -> set[tuple[str, str, str]]:
+    """Every table, column and index of the current database, in three queries."""
+    found: set[tuple[str, str, str]] = set()
+    cur.execute("SELECT TABLE_NAME AS t FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE()")
+    found.update(("table", r["t"], "") for r in cur.fetchall())
+    cur.execute("SELECT TABLE_NAME AS t, COLUMN_NAME AS n FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=DATABASE()")
+    found.update(("column", r["t"], r["n"]) for r in cur.fetchall())
+    cur.execute("SELECT DISTINCT TABLE_NAME AS t, INDEX_NAME AS n FROM information_schema.STATISTICS WHERE TABLE_SCHEMA=DATABASE()")
+    found.update(("index", r["t"], r["n"]) for r in cur.fetchall())
+    return found
+
+
+def init_db_if_needed() -> int:
+    """Apply pending SCHEMA_MIGRATIONS; returns how many ran.
+
+    An up-to-date database is detected from one snapshot of information_schema
+    instead of a query per migration. Objects missing from the snapshot are
+    re-checked live, since an earlier DDL (a CREATE TABLE) may have added them.
+    """
+    applied = 0
     with db_cursor() as (_, cur):
-        cur.execute("SELECT 1")
+        existing = _schema_objects(cur)
+        for kind, table, name, ddl in SCHEMA_MIGRATIONS:
+            if (kind, table, "" if kind == "table" else name) in existing:
+                continue
+            if not _schema_object_exists(cur, kind, table, name):
+                cur.execute(ddl)
+                applied += 1
+    return applied
+
+
+def warm_pool(role: str = "primary") -> int:
+    """Open connections up to MYSQL_POOL_SIZE so the first requests skip the handshake; returns the pool size."""
+    if role == "replica" and not settings.mysql_replica_host:
+        return 0
+    pool = _pools[role]
+    opened = [_acquire_connection(role) for _ in range(pool.maxsize - pool.qsize())]
+    for conn in opened:
+        _release_connection(conn, role)
+    return pool.qsize()
 
 
 # -----------------------------
 # Bot config (table: bot_config)
 # -----------------------------
-def get_bot_config() -> dict[str, str]:
+def _read_bot_config(cur, tenant: str) -> dict[str, str]:
+    cur.execute("SELECT config_key, config_value FROM bot_config WHERE tenant=%s", (tenant,))
+    cfg: dict[str, str] = {}
+    for r in cur.fetchall():
+        k = str(r.get("config_key", ""))
+        v = r.get("config_value")
+        cfg[k] = "" if v is None else str(v)
+    return cfg
+
+
+def _read_bot_config_version(cur) -> int:
+    cur.execute("SELECT version FROM bot_config_version WHERE id=1")
+    row = cur.fetchone()
+    return int(row["version"]) if row else 0
+
+
+def get_bot_config(tenant: str = DEFAULT_TENANT) -> dict[str, str]:
     with db_cursor() as (_, cur):
-        cur.execute("SELECT config_key, config_value FROM bot_config")
-        rows = cur.fetchall()
-        cfg: dict[str, str] = {}
-        for r in rows:
-            k = str(r.get("config_key", ""))
-            v = r.get("config_value")
-            cfg[k] = "" if v is None else str(v)
-        return cfg
+        return _read_bot_config(cur, tenant)
 
 
-def set_bot_config(key: str, value: str) -> None:
+def get_bot_config_version() -> int:
+    """Monotonic counter bumped by every write that changes bot_config (of any tenant)."""
     with db_cursor() as (_, cur):
-        cur.execute(
-            '''
-            INSERT INTO bot_config (config_key, config_value)
-            VALUES (%s, %s)
-            ON DUPLICATE KEY UPDATE config_value=VALUES(config_value), updated_at=NOW()
-            ''',
-            (key, value),
-        )
+        return _read_bot_config_version(cur)
 
 
-def set_bot_config_many(items: dict[str, str]) -> None:
-    if not items:
-        return
+def get_bot_config_snapshot(tenant: str = DEFAULT_TENANT) -> tuple[dict[str, str], int]:
     with db_cursor() as (_, cur):
-        cur.executemany(
-            '''
-            INSERT INTO bot_config (config_key, config_value)
-            VALUES (%s, %s)
+        version = _read_bot_config_version(cur)
+        return _read_bot_config(cur, tenant), version
+
+
+def set_bot_config(key: str, value: str, tenant: str = DEFAULT_TENANT) -> int:
+    return set_bot_config_many({key: value}, tenant)
+
+
+def set_bot_config_many(items: dict[str, str], tenant: str = DEFAULT_TENANT) -> int:
+    """Write only the keys whose value differs from the stored one.
+
+    Changed keys go out in a single multi-row upsert and bump the config
+    version in the same transaction. Returns the (possibly unchanged) version.
+    """
+    clean = {str(k): "" if v is None else str(v) for k, v in (items or {}).items()}
+    with db_cursor() as (_, cur):
+        if not clean:
+            return _read_bot_config_version(cur)
+        keys = list(clean)
+        cur.execute(
+            f"SELECT config_key, config_value FROM bot_config WHERE tenant=%s AND config_key IN ({', '.join(['%s'] * len(keys))}) FOR UPDATE",
+            (tenant, *keys),
+        )
+        current = {str(r["config_key"]): "" if r["config_value"] is None else str(r["config_value"]) for r in cur.fetchall()}
+        changed = [(k, v) for k, v in clean.items() if current.get(k) != v]
+        if not changed:
+            return _read_bot_config_version(cur)
+
+        cur.execute(
+            f'''
+            INSERT INTO bot_config (tenant, config_key, config_value)
+            VALUES {", ".join(["(%s, %s, %s)"] * len(changed))}
             ON DUPLICATE KEY UPDATE config_value=VALUES(config_value), updated_at=NOW()
             ''',
-            [(str(k), "" if v is None else str(v)) for k, v in items.items()],
+            [x for k, v in changed for x in (tenant, k, v)],
+        )
+        cur.execute(
+            "INSERT INTO bot_config_version (id, version) VALUES (1, 1) ON DUPLICATE KEY UPDATE version=version+1"
         )
+        return _read_bot_config_version(cur)
 
 
 # -----------------------------
 # Orders + chat (tables: orders, order_messages, order_files)
 # -----------------------------
-def create_order(user_id: int, username: str | None, full_name: str | None, branch: str) -> int:
+def create_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
     payload = {"branch": branch}
     with db_cursor() as (_, cur):
         cur.execute(
             '''
-            INSERT INTO orders (user_id, username, full_name, branch, status, order_payload, updated_at)
-            VALUES (%s, %s, %s, %s, 'draft', %s, NOW())
+            INSERT INTO orders (tenant, user_id, username, full_name, branch, status, order_payload, updated_at)
+            VALUES (%s, %s, %s, %s, %s, 'draft', %s, NOW())
             ''',
-            (user_id, username, full_name, branch, json.dumps(payload, ensure_ascii=False)),
+            (tenant, user_id, username, full_name, branch, json.dumps(payload, ensure_ascii=False)),
         )
         return int(cur.lastrowid)
 
 
-def get_last_user_order(user_id: int) -> dict[str, Any] | None:
+def get_last_user_order(user_id: int, tenant: str = DEFAULT_TENANT) -> dict[str, Any] | None:
     with db_cursor() as (_, cur):
         cur.execute(
-            "SELECT * FROM orders WHERE user_id=%s ORDER BY updated_at DESC, created_at DESC LIMIT 1",
-            (user_id,),
+            "SELECT * FROM orders WHERE tenant=%s AND user_id=%s ORDER BY updated_at DESC, created_at DESC LIMIT 1",
+            (tenant, user_id),
         )
         row = cur.fetchone()
         return dict(row) if row else None
 
 
-def find_or_create_active_order(user_id: int, username: str | None, full_name: str | None) -> int:
+def _find_or_create_order(
+    cur,
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    statuses: tuple[str, ...],
+    new_status: str,
+    same_branch: bool,
+    without_files: bool = False,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    clauses = [f"tenant=%s AND user_id=%s AND status IN ({', '.join(['%s'] * len(statuses))})"]
+    params: list[Any] = [tenant, user_id, *statuses]
+    if same_branch:
+        clauses.append("branch=%s")
+        params.append(branch)
+    if without_files:
+        clauses.append("NOT EXISTS (SELECT 1 FROM order_files f WHERE f.order_id=orders.id)")
+    cur.execute(
+        f'''
+        SELECT id FROM orders
+        WHERE {' AND '.join(clauses)}
+        ORDER BY updated_at DESC, created_at DESC
+        LIMIT 1
+        FOR UPDATE
+        ''',
+        params,
+    )
+    row = cur.fetchone()
+    if row:
+        return int(row["id"])
+
+    cur.execute(
+        '''
+        INSERT INTO orders (tenant, user_id, username, full_name, branch, status, order_payload, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ''',
+        (tenant, user_id, username, full_name, branch, new_status, json.dumps({"branch": branch}, ensure_ascii=False)),
+    )
+    order_id = int(cur.lastrowid)
+    if new_status != "draft":
+        _enqueue_assignment(cur, order_id)
+    return order_id
+
+
+def find_or_create_active_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
     with db_cursor() as (_, cur):
+        return _find_or_create_order(
+            cur,
+            user_id,
+            username,
+            full_name,
+            "dialog",
+            # Not drafts: purge_stale_drafts() would take the client's messages with them.
+            ("new", "submitted", "in_work"),
+            "new",
+            same_branch=False,
+            tenant=tenant,
+        )
+
+
+def find_or_create_draft_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    """Reuse the user's open draft for `branch` instead of leaving a new row per menu press.
+
+    Drafts that already have attachments are not reused, so stale files can
+    never ride along with a fresh submission; the draft GC collects those.
+    """
+    with db_cursor() as (_, cur):
+        order_id = _find_or_create_order(
+            cur,
+            user_id,
+            username,
+            full_name,
+            branch,
+            ("draft",),
+            "draft",
+            same_branch=True,
+            without_files=True,
+            tenant=tenant,
+        )
         cur.execute(
             '''
-            SELECT id FROM orders
-            WHERE user_id=%s AND status IN ('draft','new','submitted','in_work')
-            ORDER BY updated_at DESC, created_at DESC
-            LIMIT 1
+            UPDATE orders
+            SET username=%s, full_name=%s, order_payload=%s, summary=NULL, updated_at=NOW()
+            WHERE id=%s
             ''',
-            (user_id,),
+            (username, full_name, json.dumps({"branch": branch}, ensure_ascii=False), order_id),
         )
-        row = cur.fetchone()
-        if row:
-            return int(row["id"])
+        return order_id
+
+
+def purge_stale_drafts(max_age_hours: int, limit: int = 500) -> list[int]:
+    """Delete one bounded batch of drafts untouched for `max_age_hours`.
 
+    Each call is its own short transaction; files and messages go with the
+    order via ON DELETE CASCADE. Returns the ids removed.
+    """
+    with db_cursor() as (_, cur):
         cur.execute(
             '''
-            INSERT INTO orders (user_id, username, full_name, branch, status, order_payload, updated_at)
-            VALUES (%s, %s, %s, 'dialog', 'new', %s, NOW())
+            SELECT id FROM orders
+            WHERE status='draft'
+              AND created_at < NOW() - INTERVAL %s HOUR
+              AND updated_at < NOW() - INTERVAL %s HOUR
+            ORDER BY created_at
+            LIMIT %s
             ''',
-            (user_id, username, full_name, json.dumps({"branch": "dialog"}, ensure_ascii=False)),
+            (max_age_hours, max_age_hours, limit),
         )
-        return int(cur.lastrowid)
+        ids = [int(r["id"]) for r in cur.fetchall()]
+        if not ids:
+            return []
+        cur.execute(
+            f'''
+            DELETE FROM orders
+            WHERE status='draft'
+              AND updated_at < NOW() - INTERVAL %s HOUR
+              AND id IN ({', '.join(['%s'] * len(ids))})
+            ''',
+            (max_age_hours, *ids),
+        )
+        return ids
 
 
 def update_order_contact(order_id: int, username: str | None, full_name: str | None) -> None:
@@ -166,56 +850,369 @@ def update_order_payload(order_id: int, payload: dict[str, Any], summary: str |
         )
 
 
-def finalize_order(order_id: int, summary: str | None = None) -> None:
+def finalize_order(order_id: int, summary: str | None = None) -> bool:
+    """Submit a draft and queue its orders-chat notifications and manager assignment in the same transaction.
+
+    The row lock makes this idempotent: only the call that moves the order out
+    of `draft` writes the outbox; repeats return False and change nothing.
+    """
     with db_cursor() as (_, cur):
-        cur.execute("SELECT status FROM orders WHERE id=%s", (order_id,))
+        cur.execute("SELECT status, user_id, username, full_name FROM orders WHERE id=%s FOR UPDATE", (order_id,))
         row = cur.fetchone()
         if not row:
-            return
+            return False
         status = (row.get("status") or "draft")
-        new_status = "new" if status in ("draft", "", None) else str(status)
-        if new_status not in ALLOWED_STATUSES:
-            new_status = "new"
+        if status not in ("draft", ""):
+            return False
+        new_status = "new"
         cur.execute(
             "UPDATE orders SET status=%s, summary=%s, updated_at=NOW() WHERE id=%s",
             (new_status, summary, order_id),
         )
 
+        events: list[tuple[str, dict[str, Any]]] = [
+            (
+                "order_submitted",
+                {
+                    "summary": summary or "",
+                    "user_id": int(row.get("user_id") or 0),
+                    "username": row.get("username"),
+                    "full_name": row.get("full_name"),
+                },
+            )
+        ]
+        cur.execute("SELECT * FROM order_files WHERE order_id=%s ORDER BY id", (order_id,))
+        files = _decode_mesh_stats(cur.fetchall())
+        # Analyses still running report through set_order_file_mesh_stats() once they finish.
+        mesh = [{"file_name": f["original_name"], "stats": f["mesh_stats"]} for f in files if f.get("mesh_stats")]
+        if mesh:
+            events[0][1]["mesh_stats"] = mesh
+        seen: set[str] = set()
+        for f in files:
+            file_id = f.get("telegram_file_id")
+            if not file_id or file_id in seen:
+                continue
+            seen.add(file_id)
+            file_type = f.get("file_type") or f.get("mime_type") or ""
+            events.append(("order_file", {"file_id": file_id, "file_type": str(file_type)}))
+        _enqueue_outbox(cur, order_id, events)
+        _enqueue_assignment(cur, order_id)
+        return True
+
+
+# -----------------------------
+# Outbox (table: order_outbox)
+# -----------------------------
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_LEASE_SECONDS = 120
+
+
+def _enqueue_outbox(cur, order_id: int, events: list[tuple[str, dict[str, Any]]]) -> None:
+    # The event is delivered by the bot of the order's tenant.
+    cur.executemany(
+        "INSERT INTO order_outbox (tenant, order_id, event_type, payload) SELECT tenant, id, %s, %s FROM orders WHERE id=%s",
+        [(event_type, json.dumps(payload, ensure_ascii=False), order_id) for event_type, payload in events],
+    )
+
+
+def claim_outbox_events(limit: int = 50) -> list[dict[str, Any]]:
+    """Lease due events for delivery.
+
+    A claimed event is pushed OUTBOX_LEASE_SECONDS into the future, so if the
+    dispatcher dies mid-delivery the event becomes due again (at-least-once).
+    """
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            SELECT id, tenant, order_id, event_type, payload, attempts FROM order_outbox
+            WHERE status='pending' AND next_attempt_at<=NOW()
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            ''',
+            (limit,),
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+        if not rows:
+            return []
+        ids = [r["id"] for r in rows]
+        cur.execute(
+            f'''
+            UPDATE order_outbox
+            SET attempts=attempts+1, next_attempt_at=NOW() + INTERVAL %s SECOND
+            WHERE id IN ({', '.join(['%s'] * len(ids))})
+            ''',
+            (OUTBOX_LEASE_SECONDS, *ids),
+        )
+    for r in rows:
+        r["payload"] = json.loads(r["payload"] or "{}") if isinstance(r["payload"], (str, bytes)) else (r["payload"] or {})
+        r["attempts"] = int(r["attempts"]) + 1
+    return rows
+
 
-def list_orders(status: str | None = None, limit: int = 200, offset: int = 0) -> list[dict[str, Any]]:
+def mark_outbox_sent(event_id: int) -> None:
     with db_cursor() as (_, cur):
-        if status:
+        cur.execute("UPDATE order_outbox SET status='sent', sent_at=NOW(), last_error=NULL WHERE id=%s", (event_id,))
+
+
+def mark_outbox_failed(event_id: int, attempts: int, error: str, retry_in_seconds: float) -> None:
+    """Schedule a retry, or give up once OUTBOX_MAX_ATTEMPTS is reached."""
+    with db_cursor() as (_, cur):
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
             cur.execute(
-                "SELECT * FROM orders WHERE status=%s ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                (status, limit, offset),
+                "UPDATE order_outbox SET status='failed', last_error=%s WHERE id=%s",
+                (error[:512], event_id),
             )
-        else:
+            return
+        cur.execute(
+            "UPDATE order_outbox SET next_attempt_at=NOW() + INTERVAL %s SECOND, last_error=%s WHERE id=%s",
+            (int(retry_in_seconds), error[:512], event_id),
+        )
+
+
+def defer_outbox_events(event_ids: list[int], delay_seconds: float) -> None:
+    """Hand leased events back without counting the attempt (used to keep per-order ordering)."""
+    if not event_ids:
+        return
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            UPDATE order_outbox
+            SET attempts=GREATEST(attempts-1, 0), next_attempt_at=NOW() + INTERVAL %s SECOND
+            WHERE id IN ({', '.join(['%s'] * len(event_ids))})
+            ''',
+            (int(delay_seconds), *event_ids),
+        )
+
+
+def purge_sent_outbox(older_than_days: int = 7, limit: int = 1000) -> int:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            "DELETE FROM order_outbox WHERE status='sent' AND sent_at < NOW() - INTERVAL %s DAY LIMIT %s",
+            (older_than_days, limit),
+        )
+        return int(cur.rowcount)
+
+
+def _orders_where(
+    status: str | None,
+    filters: dict[str, str | None] | None,
+    exclude: str | None = None,
+    tenant: str | None = None,
+) -> tuple[str, list[Any]]:
+    clauses: list[str] = []
+    params: list[Any] = []
+    if tenant is not None:
+        clauses.append("tenant=%s")
+        params.append(tenant)
+    if status:
+        clauses.append("status=%s")
+        params.append(status)
+    for field in FACET_FIELDS:
+        value = (filters or {}).get(field)
+        if field == exclude or not value:
+            continue
+        clauses.append(f"{field}=%s")
+        params.append(value)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _use_archive(status: str | None, include_archive: bool | None) -> bool:
+    if include_archive is None:
+        return status in ARCHIVE_STATUSES
+    return include_archive
+
+
+def list_orders(
+    status: str | None = None,
+    limit: int = 200,
+    offset: int = 0,
+    filters: dict[str, str | None] | None = None,
+    include_archive: bool | None = None,
+    tenant: str | None = None,
+) -> list[dict[str, Any]]:
+    """Newest orders first; closed statuses transparently include the archive tier.
+
+    tenant=None lists every tenant's orders.
+    """
+    where, params = _orders_where(status, filters, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        if not _use_archive(status, include_archive):
             cur.execute(
-                "SELECT * FROM orders ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                (limit, offset),
+                f"SELECT * FROM orders{where} ORDER BY created_at DESC LIMIT %s OFFSET %s",
+                (*params, limit, offset),
             )
+            return [dict(r) for r in cur.fetchall()]
+
+        cols = ", ".join(ORDER_COLUMNS)
+        window = limit + offset
+        cur.execute(
+            f'''
+            (SELECT {cols} FROM orders{where} ORDER BY created_at DESC LIMIT %s)
+            UNION ALL
+            (SELECT {cols} FROM orders_archive{where} ORDER BY created_at DESC LIMIT %s)
+            ORDER BY created_at DESC
+            LIMIT %s OFFSET %s
+            ''',
+            (*params, window, *params, window, limit, offset),
+        )
         return [dict(r) for r in cur.fetchall()]
 
 
-def get_orders_paginated(limit: int, offset: int, status_filter: str | None = None) -> list[dict[str, Any]]:
-    return list_orders(status_filter, limit=limit, offset=offset)
+def count_orders(
+    status: str | None = None,
+    filters: dict[str, str | None] | None = None,
+    include_archive: bool | None = None,
+    tenant: str | None = None,
+) -> int:
+    where, params = _orders_where(status, filters, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(f"SELECT COUNT(*) AS c FROM orders{where}", params)
+        total = int(cur.fetchone()["c"])
+        if _use_archive(status, include_archive):
+            cur.execute(f"SELECT COUNT(*) AS c FROM orders_archive{where}", params)
+            total += int(cur.fetchone()["c"])
+        return total
 
 
-def get_order_statistics() -> dict[str, int]:
-    with db_cursor() as (_, cur):
-        cur.execute("SELECT COUNT(*) AS c FROM orders")
-        total = int(cur.fetchone()["c"])
-        cur.execute("SELECT COUNT(*) AS c FROM orders WHERE status IN ('new','submitted')")
-        new_orders = int(cur.fetchone()["c"])
-        cur.execute("SELECT COUNT(*) AS c FROM orders WHERE status IN ('new','submitted','in_work','draft')")
-        active_orders = int(cur.fetchone()["c"])
-    return {"total_orders": total, "new_orders": new_orders, "active_orders": active_orders}
+def get_orders_paginated(
+    limit: int,
+    offset: int,
+    status_filter: str | None = None,
+    filters: dict[str, str | None] | None = None,
+    include_archive: bool | None = None,
+    tenant: str | None = None,
+) -> list[dict[str, Any]]:
+    return list_orders(
+        status_filter,
+        limit=limit,
+        offset=offset,
+        filters=filters,
+        include_archive=include_archive,
+        tenant=tenant,
+    )
+
+
+def get_order_facets(
+    status: str | None = None,
+    filters: dict[str, str | None] | None = None,
+    tenant: str | None = None,
+) -> dict[str, list[dict[str, Any]]]:
+    """Counts per value of every facet field in one UNION ALL round trip.
+
+    Each facet is counted with all other filters applied but its own, so the
+    admin can still see the alternatives for the currently selected value.
+    """
+    parts: list[str] = []
+    params: list[Any] = []
+    for field in FACET_FIELDS:
+        where, where_params = _orders_where(status, filters, exclude=field, tenant=tenant)
+        where = f"{where} AND {field} IS NOT NULL" if where else f" WHERE {field} IS NOT NULL"
+        parts.append(f"(SELECT '{field}' AS facet, {field} AS value, COUNT(*) AS c FROM orders{where} GROUP BY {field})")
+        params.extend(where_params)
+
+    facets: dict[str, list[dict[str, Any]]] = {field: [] for field in FACET_FIELDS}
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(" UNION ALL ".join(parts), params)
+        for r in cur.fetchall():
+            facets[str(r["facet"])].append({"value": r["value"], "count": int(r["c"])})
+    for items in facets.values():
+        items.sort(key=lambda item: item["count"], reverse=True)
+    return facets
+
+
+def get_order_statistics(tenant: str | None = None) -> dict[str, int]:
+    where, params = _orders_where(None, None, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT
+                COUNT(*) AS total,
+                COALESCE(SUM(status IN ('new','submitted')), 0) AS new_orders,
+                COALESCE(SUM(status IN ('new','submitted','in_work','draft')), 0) AS active_orders
+            FROM orders{where}
+            ''',
+            params,
+        )
+        row = cur.fetchone()
+        # Archived orders are counted through per-tenant counters maintained by archive_orders_batch().
+        cur.execute(f"SELECT COALESCE(SUM(archived_orders), 0) AS archived_orders FROM orders_archive_stats{where}", params)
+        archived = cur.fetchone()
+    total = int(row["total"]) + int(archived["archived_orders"])
+    return {
+        "total_orders": total,
+        "new_orders": int(row["new_orders"]),
+        "active_orders": int(row["active_orders"]),
+    }
+
+
+def iter_orders_export(
+    statuses: list[str] | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    batch_size: int = 500,
+    include_archive: bool = True,
+    tenant: str | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Stream orders through an unbuffered server-side cursor.
+
+    Rows are pulled from MySQL `batch_size` at a time, so memory stays flat
+    however large the table is. The connection is held until the iterator
+    is exhausted or closed. With include_archive the archive tier is
+    streamed as well.
+    """
+    clauses: list[str] = []
+    params: list[Any] = []
+    if tenant is not None:
+        clauses.append("tenant=%s")
+        params.append(tenant)
+    if statuses:
+        clauses.append(f"status IN ({', '.join(['%s'] * len(statuses))})")
+        params.extend(statuses)
+    if created_from:
+        clauses.append("created_at>=%s")
+        params.append(created_from)
+    if created_to:
+        clauses.append("created_at<%s")
+        params.append(created_to)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = None
+    if _replica_usable():
+        try:
+            conn = _open_connection("replica")
+        except DatabaseError:
+            conn = None
+    if conn is None:
+        conn = get_connection()
+    try:
+        with conn.cursor(SSDictCursor) as cur:
+            cols = ", ".join(ORDER_COLUMNS)
+            if include_archive:
+                cur.execute(
+                    f"SELECT {cols} FROM orders{where} UNION ALL SELECT {cols} FROM orders_archive{where}",
+                    params * 2,
+                )
+            else:
+                cur.execute(f"SELECT {cols} FROM orders{where} ORDER BY id", params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    yield dict(r)
+    finally:
+        conn.close()
 
 
 def get_order(order_id: int) -> dict[str, Any] | None:
     with db_cursor() as (_, cur):
         cur.execute("SELECT * FROM orders WHERE id=%s", (order_id,))
         row = cur.fetchone()
+        if not row:
+            cur.execute("SELECT * FROM orders_archive WHERE id=%s", (order_id,))
+            row = cur.fetchone()
         return dict(row) if row else None
 
 
@@ -226,15 +1223,17 @@ def update_order_status(order_id: int, status: str) -> None:
         cur.execute("UPDATE orders SET status=%s, updated_at=NOW() WHERE id=%s", (status, order_id))
 
 
-def add_order_message(order_id: int, direction: str, text: str) -> None:
+def add_order_message(order_id: int, direction: str, text: str, telegram_message_id: int | None = None) -> bool:
+    """Store a chat message; returns False when this Telegram message was already stored."""
     with db_cursor() as (_, cur):
         try:
             cur.execute(
                 '''
-                INSERT INTO order_messages (order_id, direction, message_text, created_at)
-                VALUES (%s, %s, %s, NOW())
+                INSERT INTO order_messages (order_id, direction, message_text, telegram_message_id, created_at)
+                VALUES (%s, %s, %s, %s, NOW())
+                ON DUPLICATE KEY UPDATE id=id
                 ''',
-                (order_id, direction, text),
+                (order_id, direction, text, telegram_message_id),
             )
         except Exception:
             cur.execute(
@@ -244,21 +1243,136 @@ def add_order_message(order_id: int, direction: str, text: str) -> None:
                 ''',
                 (order_id, direction, text),
             )
+        return cur.rowcount == 1
+
+
+def add_client_messages(
+    messages: list[tuple[int, str, int | None]],
+    notifications: list[tuple[int, dict[str, Any]]],
+) -> None:
+    """Store a batch of inbound (order_id, text, telegram_message_id) messages.
+
+    All rows go out in one multi-row INSERT, and the orders-chat notifications
+    are queued in the outbox within the same transaction. Drafts get no
+    notification: managers have not received the order yet.
+    """
+    if not messages:
+        return
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            INSERT INTO order_messages (order_id, direction, message_text, telegram_message_id, created_at)
+            VALUES {", ".join(["(%s, 'in', %s, %s, NOW())"] * len(messages))}
+            ON DUPLICATE KEY UPDATE id=id
+            ''',
+            [x for row in messages for x in row],
+        )
+        # A message keeps its order alive: purge_stale_drafts() goes by updated_at.
+        order_ids = sorted({row[0] for row in messages})
+        in_ids = ", ".join(["%s"] * len(order_ids))
+        cur.execute(f"UPDATE orders SET updated_at=NOW() WHERE id IN ({in_ids})", order_ids)
+        cur.execute(f"SELECT id FROM orders WHERE id IN ({in_ids}) AND status<>'draft'", order_ids)
+        submitted = {int(r["id"]) for r in cur.fetchall()}
+        for order_id, payload in notifications:
+            if order_id in submitted:
+                _enqueue_outbox(cur, order_id, [("client_message", payload)])
 
 
-def list_order_messages(order_id: int, limit: int = 30) -> list[dict[str, Any]]:
+def find_order_by_outgoing_message(
+    user_id: int,
+    telegram_message_id: int,
+    tenant: str = DEFAULT_TENANT,
+) -> int | None:
+    """Order whose manager message (sent to `user_id` by the tenant's bot) has this Telegram message id."""
     with db_cursor() as (_, cur):
         cur.execute(
             '''
-            SELECT * FROM order_messages
+            SELECT m.order_id FROM order_messages m
+            JOIN orders o ON o.id=m.order_id
+            WHERE m.direction='out' AND m.telegram_message_id=%s AND o.user_id=%s AND o.tenant=%s
+            ORDER BY m.id DESC
+            LIMIT 1
+            ''',
+            (telegram_message_id, user_id, tenant),
+        )
+        row = cur.fetchone()
+        return int(row["order_id"]) if row else None
+
+
+def _select_messages(
+    cur,
+    table: str,
+    order_id: int,
+    limit: int,
+    after_id: int | None,
+    before_id: int | None,
+) -> list[dict[str, Any]]:
+    if after_id is not None:
+        cur.execute(
+            f'''
+            SELECT * FROM {table}
+            WHERE order_id=%s AND id>%s
+            ORDER BY id ASC
+            LIMIT %s
+            ''',
+            (order_id, after_id, limit),
+        )
+        return [dict(r) for r in cur.fetchall()]
+    if before_id is not None:
+        cur.execute(
+            f'''
+            SELECT * FROM {table}
+            WHERE order_id=%s AND id<%s
+            ORDER BY id DESC
+            LIMIT %s
+            ''',
+            (order_id, before_id, limit),
+        )
+    else:
+        cur.execute(
+            f'''
+            SELECT * FROM {table}
             WHERE order_id=%s
-            ORDER BY created_at DESC
+            ORDER BY id DESC
             LIMIT %s
             ''',
             (order_id, limit),
         )
-        rows = cur.fetchall()
-        return [dict(r) for r in reversed(rows)]
+    return [dict(r) for r in reversed(cur.fetchall())]
+
+
+def list_order_messages(
+    order_id: int,
+    limit: int = 30,
+    after_id: int | None = None,
+    before_id: int | None = None,
+) -> list[dict[str, Any]]:
+    """Chat page keyed on (order_id, id), always returned oldest first.
+
+    after_id pages forward (incremental refresh), before_id pages backward
+    (history scroll); without either the latest `limit` messages are returned.
+    Archived orders are served from order_messages_archive.
+    """
+    with db_cursor(readonly=True) as (_, cur):
+        rows = _select_messages(cur, "order_messages", order_id, limit, after_id, before_id)
+        # Archived orders take no new messages, so an after_id poll never needs the archive;
+        # otherwise check once that the order really left the live table.
+        if rows or after_id is not None:
+            return rows
+        cur.execute("SELECT 1 FROM orders WHERE id=%s", (order_id,))
+        if cur.fetchone():
+            return rows
+        return _select_messages(cur, "order_messages_archive", order_id, limit, after_id, before_id)
+
+
+def get_last_order_message_id(order_id: int) -> int:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute("SELECT MAX(id) AS last_id FROM order_messages WHERE order_id=%s", (order_id,))
+        row = cur.fetchone()
+        if not row or row["last_id"] is None:
+            cur.execute("SELECT MAX(id) AS last_id FROM order_messages_archive WHERE order_id=%s", (order_id,))
+            row = cur.fetchone()
+        return int(row["last_id"] or 0) if row else 0
 
 
 def add_order_file(
@@ -267,29 +1381,93 @@ def add_order_file(
     file_unique_id: str | None,
     file_name: str | None,
     file_type: str | None,
-) -> None:
+) -> bool:
+    """Attach a file; returns False when (order_id, file_unique_id) is already stored."""
     with db_cursor() as (_, cur):
         try:
+            cur.execute(
+                '''
+                INSERT INTO order_files (order_id, telegram_file_id, file_unique_id, original_name, mime_type, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                ON DUPLICATE KEY UPDATE id=id
+                ''',
+                (order_id, telegram_file_id, file_unique_id, file_name or telegram_file_id, file_type),
+            )
+        except Exception:
             cur.execute(
                 '''
                 INSERT INTO order_files (order_id, telegram_file_id, file_unique_id, file_name, file_type, created_at)
                 VALUES (%s, %s, %s, %s, %s, NOW())
+                ON DUPLICATE KEY UPDATE id=id
                 ''',
                 (order_id, telegram_file_id, file_unique_id, file_name, file_type),
             )
+        return cur.rowcount == 1
+
+
+def add_order_files(order_id: int, files: list[tuple[str, str, str | None, str | None]]) -> list[str]:
+    """Attach several (telegram_file_id, file_unique_id, file_name, file_type) in one insert.
+
+    Returns the file_unique_ids that were not stored for this order before.
+    """
+    if not files:
+        return []
+    unique_ids = [f[1] for f in files]
+    with db_cursor() as (_, cur):
+        placeholders = ", ".join(["%s"] * len(unique_ids))
+        cur.execute(
+            f"SELECT file_unique_id FROM order_files WHERE order_id=%s AND file_unique_id IN ({placeholders})",
+            (order_id, *unique_ids),
+        )
+        existing = {r["file_unique_id"] for r in cur.fetchall()}
+        fresh = [f for f in dict((f[1], f) for f in files).values() if f[1] not in existing]
+        if not fresh:
+            return []
+        values = ", ".join(["(%s, %s, %s, %s, %s, NOW())"] * len(fresh))
+        try:
+            cur.execute(
+                f'''
+                INSERT INTO order_files (order_id, telegram_file_id, file_unique_id, original_name, mime_type, created_at)
+                VALUES {values}
+                ON DUPLICATE KEY UPDATE id=id
+                ''',
+                [v for tg_id, uid, name, ftype in fresh for v in (order_id, tg_id, uid, name or tg_id, ftype)],
+            )
         except Exception:
             cur.execute(
-                '''
-                INSERT INTO order_files (order_id, telegram_file_id, original_name, mime_type, created_at)
-                VALUES (%s, %s, %s, %s, NOW())
+                f'''
+                INSERT INTO order_files (order_id, telegram_file_id, file_unique_id, file_name, file_type, created_at)
+                VALUES {values}
+                ON DUPLICATE KEY UPDATE id=id
                 ''',
-                (order_id, telegram_file_id, file_name, file_type),
+                [v for tg_id, uid, name, ftype in fresh for v in (order_id, tg_id, uid, name, ftype)],
             )
+        return [f[1] for f in fresh]
 
 
 def list_order_files(order_id: int) -> list[dict[str, Any]]:
     with db_cursor() as (_, cur):
         try:
+            cur.execute(
+                '''
+                SELECT
+                    id,
+                    order_id,
+                    telegram_file_id,
+                    file_unique_id,
+                    original_name AS file_name,
+                    mime_type AS file_type,
+                    created_at,
+                    original_name,
+                    mime_type,
+                    mesh_stats
+                FROM order_files
+                WHERE order_id=%s
+                ORDER BY created_at DESC
+                ''',
+                (order_id,),
+            )
+        except Exception:
             cur.execute(
                 '''
                 SELECT
@@ -301,30 +1479,553 @@ def list_order_files(order_id: int) -> list[dict[str, Any]]:
                     file_type,
                     created_at,
                     file_name AS original_name,
-                    file_type AS mime_type
+                    file_type AS mime_type,
+                    NULL AS mesh_stats
                 FROM order_files
                 WHERE order_id=%s
                 ORDER BY created_at DESC
                 ''',
                 (order_id,),
             )
-        except Exception:
+        rows = cur.fetchall()
+        if not rows:
             cur.execute(
                 '''
                 SELECT
                     id,
                     order_id,
                     telegram_file_id,
-                    NULL AS file_unique_id,
+                    file_unique_id,
                     original_name AS file_name,
                     mime_type AS file_type,
                     created_at,
                     original_name,
-                    mime_type
-                FROM order_files
+                    mime_type,
+                    mesh_stats
+                FROM order_files_archive
                 WHERE order_id=%s
                 ORDER BY created_at DESC
                 ''',
                 (order_id,),
             )
+            rows = cur.fetchall()
+        return _decode_mesh_stats(rows)
+
+
+def _decode_mesh_stats(rows) -> list[dict[str, Any]]:
+    result = [dict(r) for r in rows]
+    for r in result:
+        if isinstance(r.get("mesh_stats"), (str, bytes)):
+            try:
+                r["mesh_stats"] = json.loads(r["mesh_stats"])
+            except ValueError:
+                r["mesh_stats"] = None
+    return result
+
+
+_DETAIL_FILES_SQL = '''
+SELECT
+    id, order_id, telegram_file_id, file_unique_id,
+    original_name AS file_name, mime_type AS file_type, created_at,
+    original_name, mime_type, mesh_stats
+FROM {files} WHERE order_id=%s ORDER BY created_at DESC
+'''
+
+
+def get_order_detail(order_id: int, messages_limit: int = 30) -> dict[str, Any] | None:
+    """Order, its files and the latest `messages_limit` messages over one pooled connection.
+
+    Plain statements, one per part: the connections do not allow multi-statement
+    queries. Falls back to the archive tables, and to the per-table helpers on
+    the legacy order_files schema.
+    """
+    try:
+        with db_cursor(readonly=True) as (_, cur):
+            tier = ("orders", "order_files", "order_messages")
+            cur.execute("SELECT * FROM orders WHERE id=%s", (order_id,))
+            order = cur.fetchone()
+            if not order:
+                tier = ("orders_archive", "order_files_archive", "order_messages_archive")
+                cur.execute("SELECT * FROM orders_archive WHERE id=%s", (order_id,))
+                order = cur.fetchone()
+            if not order:
+                return None
+            _, files, messages = tier
+            cur.execute(_DETAIL_FILES_SQL.format(files=files), (order_id,))
+            file_rows = cur.fetchall()
+            cur.execute(
+                f"SELECT * FROM {messages} WHERE order_id=%s ORDER BY id DESC LIMIT %s",
+                (order_id, messages_limit),
+            )
+            message_rows = cur.fetchall()
+    except pymysql.MySQLError:
+        order = get_order(order_id)
+        if not order:
+            return None
+        return {
+            "order": order,
+            "files": list_order_files(order_id),
+            "messages": list_order_messages(order_id, messages_limit),
+        }
+    return {
+        "order": dict(order),
+        "files": _decode_mesh_stats(file_rows),
+        "messages": [dict(r) for r in reversed(message_rows)],
+    }
+
+
+def set_order_file_mesh_stats(order_id: int, file_unique_id: str, stats: dict[str, Any]) -> bool:
+    """Store analysis results; returns True when they were also queued for the orders chat.
+
+    The order row lock orders this against finalize_order(): results stored
+    before the submit ride along in `order_submitted`, later ones get their
+    own `order_mesh_stats` event.
+    """
+    with db_cursor() as (_, cur):
+        cur.execute("SELECT status FROM orders WHERE id=%s FOR UPDATE", (order_id,))
+        order = cur.fetchone()
+        cur.execute(
+            "UPDATE order_files SET mesh_stats=%s WHERE order_id=%s AND file_unique_id=%s",
+            (json.dumps(stats, ensure_ascii=False), order_id, file_unique_id),
+        )
+        if not order or order["status"] == "draft" or not cur.rowcount:
+            return False
+        cur.execute(
+            "SELECT original_name FROM order_files WHERE order_id=%s AND file_unique_id=%s",
+            (order_id, file_unique_id),
+        )
+        name = cur.fetchone()["original_name"]
+        _enqueue_outbox(cur, order_id, [("order_mesh_stats", {"file_name": name, "stats": stats})])
+        return True
+
+
+def set_order_file_location(order_id: int, file_unique_id: str, local_path: str | None, file_size: int | None) -> None:
+    """Record where the downloaded attachment lives (see storage.py) and its original size."""
+    with db_cursor() as (_, cur):
+        cur.execute(
+            "UPDATE order_files SET local_path=%s, file_size=%s WHERE order_id=%s AND file_unique_id=%s",
+            (local_path, file_size, order_id, file_unique_id),
+        )
+
+
+def list_local_order_files(after_id: int = 0, limit: int = 1000) -> list[dict[str, Any]]:
+    """One page of attachments still on local disk, hot and archived, by id (keyset: pass the last id)."""
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            '''
+            (SELECT id, order_id, local_path, created_at FROM order_files
+             WHERE id > %s AND local_path IS NOT NULL AND local_path NOT LIKE 's3://%%'
+             ORDER BY id LIMIT %s)
+            UNION ALL
+            (SELECT id, order_id, local_path, created_at FROM order_files_archive
+             WHERE id > %s AND local_path IS NOT NULL AND local_path NOT LIKE 's3://%%'
+             ORDER BY id LIMIT %s)
+            ORDER BY id
+            LIMIT %s
+            ''',
+            (after_id, limit, after_id, limit, limit),
+        )
+        return list(cur.fetchall())
+
+
+def update_order_file_location(file_id: int, local_path: str | None) -> None:
+    """Move a file row to a new storage location; the row may already be in the archive tier."""
+    with db_cursor() as (_, cur):
+        cur.execute("UPDATE order_files SET local_path=%s WHERE id=%s", (local_path, file_id))
+        cur.execute("UPDATE order_files_archive SET local_path=%s WHERE id=%s", (local_path, file_id))
+
+
+# -----------------------------
+# Manager queue (tables: managers, order_queue)
+# -----------------------------
+def _enqueue_assignment(cur, order_id: int) -> None:
+    cur.execute(
+        "INSERT INTO order_queue (order_id, tenant, branch) SELECT id, tenant, branch FROM orders WHERE id=%s",
+        (order_id,),
+    )
+
+
+def _manager_branches(raw: str | None) -> list[str]:
+    return [b for b in (raw or "").split(",") if b]
+
+
+def _pick_manager(managers: list[dict[str, Any]], tenant: str, branch: str) -> dict[str, Any] | None:
+    """Least-loaded active manager of the tenant who handles `branch` and has room; no branches means all."""
+    best = None
+    for m in managers:
+        if m["tenant"] != tenant:
+            continue
+        branches = _manager_branches(m["branches"])
+        if branches and branch not in branches:
+            continue
+        if m["max_in_work"] and m["in_work"] >= m["max_in_work"]:
+            continue
+        if best is None or m["in_work"] < best["in_work"]:
+            best = m
+    return best
+
+
+def _wait_summary(waits: list[float]) -> dict[str, float | None]:
+    if not waits:
+        return {"avg": None, "p50": None, "p90": None, "max": None}
+    waits = sorted(waits)
+    return {
+        "avg": round(sum(waits) / len(waits), 1),
+        "p50": waits[len(waits) // 2],
+        "p90": waits[min(int(len(waits) * 0.9), len(waits) - 1)],
+        "max": waits[-1],
+    }
+
+
+def assign_queued_orders(limit: int = 50) -> int:
+    """Hand waiting orders to managers by branch and current load; returns how many were assigned.
+
+    Waiting rows are claimed with SKIP LOCKED, so several bot processes can
+    run this side by side. The tenants' active managers are then locked, so
+    concurrent batches are placed one after another; the loads are read only
+    after that lock (the first plain read opens the InnoDB snapshot) and see
+    every earlier batch. Each assignment queues an `order_assigned` outbox
+    event for the manager. Orders nobody can take right now go to the back of
+    the queue (checked_at) instead of holding up the ones behind them.
+    """
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            SELECT order_id, tenant, branch FROM order_queue
+            WHERE status='waiting'
+            ORDER BY checked_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            ''',
+            (limit,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return 0
+        ids = [int(r["order_id"]) for r in rows]
+        tenants = sorted({str(r["tenant"]) for r in rows})
+        cur.execute(
+            f'''
+            SELECT id, tenant, telegram_user_id, name, branches, max_in_work FROM managers
+            WHERE active=1 AND tenant IN ({', '.join(['%s'] * len(tenants))})
+            ORDER BY id
+            FOR UPDATE
+            ''',
+            tenants,
+        )
+        managers = [dict(m, in_work=0) for m in cur.fetchall()]
+        if managers:
+            by_id = {int(m["id"]): m for m in managers}
+            cur.execute(
+                f'''
+                SELECT q.manager_id, COUNT(*) AS in_work
+                FROM order_queue q
+                JOIN orders o ON o.id=q.order_id
+                WHERE q.manager_id IN ({', '.join(['%s'] * len(by_id))}) AND q.status='assigned'
+                  AND o.status IN ({', '.join(['%s'] * len(MANAGER_LOAD_STATUSES))})
+                GROUP BY q.manager_id
+                ''',
+                (*by_id, *MANAGER_LOAD_STATUSES),
+            )
+            for load in cur.fetchall():
+                by_id[int(load["manager_id"])]["in_work"] = int(load["in_work"])
+        cur.execute(
+            f"SELECT id, status, summary, user_id, username, full_name FROM orders WHERE id IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+        orders = {int(o["id"]): o for o in cur.fetchall()}
+
+        assigned: list[tuple[int, int]] = []
+        skipped: list[int] = []
+        closed: list[int] = []
+        for r in rows:
+            order_id = int(r["order_id"])
+            order = orders.get(order_id)
+            if order is None or order["status"] not in MANAGER_LOAD_STATUSES:
+                closed.append(order_id)
+                continue
+            manager = _pick_manager(managers, str(r["tenant"]), str(r["branch"]))
+            if manager is None:
+                skipped.append(order_id)
+                continue
+            manager["in_work"] += 1
+            assigned.append((int(manager["id"]), order_id))
+            _enqueue_outbox(
+                cur,
+                order_id,
+                [
+                    (
+                        "order_assigned",
+                        {
+                            "manager_id": int(manager["id"]),
+                            "manager_chat_id": int(manager["telegram_user_id"]),
+                            "manager_name": manager["name"],
+                            "summary": order["summary"] or "",
+                            "user_id": int(order["user_id"] or 0),
+                            "username": order["username"],
+                            "full_name": order["full_name"],
+                        },
+                    )
+                ],
+            )
+        if assigned:
+            cur.executemany(
+                "UPDATE order_queue SET status='assigned', manager_id=%s, assigned_at=NOW() WHERE order_id=%s",
+                assigned,
+            )
+        if skipped:
+            cur.execute(
+                f"UPDATE order_queue SET checked_at=NOW() WHERE order_id IN ({', '.join(['%s'] * len(skipped))})",
+                skipped,
+            )
+        if closed:
+            cur.execute(
+                f"UPDATE order_queue SET status='closed' WHERE order_id IN ({', '.join(['%s'] * len(closed))})",
+                closed,
+            )
+        return len(assigned)
+
+
+def list_managers(tenant: str = DEFAULT_TENANT) -> list[dict[str, Any]]:
+    load_statuses = ", ".join(["%s"] * len(MANAGER_LOAD_STATUSES))
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT m.id, m.telegram_user_id, m.name, m.branches, m.max_in_work, m.active, m.created_at,
+                   (SELECT COUNT(*) FROM order_queue q JOIN orders o ON o.id=q.order_id
+                    WHERE q.manager_id=m.id AND q.status='assigned' AND o.status IN ({load_statuses})) AS in_work
+            FROM managers m
+            WHERE m.tenant=%s
+            ORDER BY m.active DESC, m.name
+            ''',
+            (*MANAGER_LOAD_STATUSES, tenant),
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    for r in rows:
+        r["branches"] = _manager_branches(r["branches"])
+        r["active"] = bool(r["active"])
+        r["in_work"] = int(r["in_work"])
+    return rows
+
+
+def save_manager(
+    telegram_user_id: int,
+    name: str,
+    branches: list[str],
+    max_in_work: int,
+    active: bool = True,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    """Create or update the tenant's manager with this Telegram id; returns the manager id."""
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            INSERT INTO managers (tenant, telegram_user_id, name, branches, max_in_work, active)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                id=LAST_INSERT_ID(id), name=VALUES(name), branches=VALUES(branches),
+                max_in_work=VALUES(max_in_work), active=VALUES(active)
+            ''',
+            (tenant, telegram_user_id, name, ",".join(branches), max_in_work, int(active)),
+        )
+        return int(cur.lastrowid)
+
+
+def get_queue_metrics(tenant: str = DEFAULT_TENANT, days: int = 7) -> dict[str, Any]:
+    """Orders waiting now per branch, and how long assigned orders waited over the last `days` (seconds)."""
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            '''
+            SELECT branch, COUNT(*) AS waiting, TIMESTAMPDIFF(SECOND, MIN(enqueued_at), NOW()) AS oldest_wait
+            FROM order_queue
+            WHERE status='waiting' AND tenant=%s
+            GROUP BY branch
+            ''',
+            (tenant,),
+        )
+        branches = [dict(r) for r in cur.fetchall()]
+        cur.execute(
+            '''
+            SELECT TIMESTAMPDIFF(SECOND, enqueued_at, assigned_at) AS wait FROM order_queue
+            WHERE tenant=%s AND assigned_at >= NOW() - INTERVAL %s DAY
+            ''',
+            (tenant, days),
+        )
+        waits = [float(r["wait"]) for r in cur.fetchall()]
+    for b in branches:
+        b["waiting"] = int(b["waiting"])
+        b["oldest_wait"] = float(b["oldest_wait"] or 0)
+    return {
+        "waiting": sum(b["waiting"] for b in branches),
+        "oldest_wait": max((b["oldest_wait"] for b in branches), default=None),
+        "branches": sorted(branches, key=lambda b: b["branch"]),
+        "assigned": len(waits),
+        "wait": _wait_summary(waits),
+    }
+
+
+# -----------------------------
+# Archive tier (tables: orders_archive, order_files_archive, order_messages_archive)
+# -----------------------------
+ARCHIVE_TABLES: tuple[str, ...] = ("orders_archive", "order_files_archive", "order_messages_archive")
+
+
+def _month_start(d: date, shift: int = 0) -> date:
+    month_index = d.year * 12 + d.month - 1 + shift
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def ensure_archive_partitions(months_ahead: int = 2) -> int:
+    """Split p_max into monthly partitions up to `months_ahead` months from now.
+
+    Partitions are named pYYYYMM and hold rows created in that month.
+    Returns the number of partitions added.
+    """
+    added = 0
+    horizon = _month_start(date.today(), months_ahead + 1)
+    with db_cursor() as (_, cur):
+        for table in ARCHIVE_TABLES:
+            cur.execute(
+                '''
+                SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+                FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND PARTITION_NAME IS NOT NULL
+                ORDER BY PARTITION_ORDINAL_POSITION
+                ''',
+                (table,),
+            )
+            bounds = [r["PARTITION_DESCRIPTION"] for r in cur.fetchall() if r["PARTITION_NAME"] != "p_max"]
+            if not bounds:
+                continue
+            cur.execute("SELECT FROM_DAYS(%s) AS d", (int(bounds[-1]),))
+            upper = cur.fetchone()["d"]
+            new_parts: list[str] = []
+            while upper < horizon:
+                nxt = _month_start(upper, 1)
+                new_parts.append(f"PARTITION p{upper:%Y%m} VALUES LESS THAN (TO_DAYS('{nxt:%Y-%m-%d}'))")
+                upper = nxt
+            if not new_parts:
+                continue
+            cur.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION p_max INTO "
+                f"({', '.join(new_parts)}, PARTITION p_max VALUES LESS THAN MAXVALUE)"
+            )
+            added += len(new_parts)
+    return added
+
+
+def archive_orders_batch(older_than_days: int, limit: int = 200) -> int:
+    """Move one batch of closed orders with their files and messages to the archive.
+
+    Copy and delete happen in one transaction, so an order is never visible
+    in both tiers or in neither. Returns the number of orders moved.
+    """
+    statuses = ", ".join(["%s"] * len(ARCHIVE_STATUSES))
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            SELECT id, tenant FROM orders
+            WHERE status IN ({statuses})
+              AND created_at < NOW() - INTERVAL %s DAY
+              AND updated_at < NOW() - INTERVAL %s DAY
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE
+            ''',
+            (*ARCHIVE_STATUSES, older_than_days, older_than_days, limit),
+        )
+        rows = cur.fetchall()
+        ids = [int(r["id"]) for r in rows]
+        if not ids:
+            return 0
+        in_ids = ", ".join(["%s"] * len(ids))
+
+        for table, archive, cols, key in (
+            ("order_messages", "order_messages_archive", ORDER_MESSAGE_COLUMNS, "order_id"),
+            ("order_files", "order_files_archive", ORDER_FILE_COLUMNS, "order_id"),
+            ("orders", "orders_archive", ORDER_COLUMNS, "id"),
+        ):
+            col_list = ", ".join(cols)
+            cur.execute(
+                f"INSERT INTO {archive} ({col_list}) SELECT {col_list} FROM {table} WHERE {key} IN ({in_ids})",
+                ids,
+            )
+        cur.execute(f"DELETE FROM orders WHERE id IN ({in_ids})", ids)
+        per_tenant = Counter(str(r["tenant"]) for r in rows)
+        cur.execute(
+            f'''
+            INSERT INTO orders_archive_stats (tenant, archived_orders)
+            VALUES {", ".join(["(%s, %s)"] * len(per_tenant))}
+            ON DUPLICATE KEY UPDATE archived_orders=archived_orders+VALUES(archived_orders)
+            ''',
+            [x for item in per_tenant.items() for x in item],
+        )
+        return len(ids)
+
+
+# -----------------------------
+# Funnel analytics (tables: funnel_events, funnel_daily)
+# -----------------------------
+def add_funnel_events(events: list[tuple[str, int, int | None, str, str, str, datetime]]) -> None:
+    """Append (tenant, user_id, order_id, branch, step, action, created_at) rows in one INSERT."""
+    if not events:
+        return
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            INSERT INTO funnel_events (tenant, user_id, order_id, branch, step, action, created_at)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(events))}
+            ''',
+            [x for row in events for x in row],
+        )
+
+
+def rollup_funnel(since: date) -> None:
+    """Recompute funnel_daily for every day from `since`; safe to repeat."""
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            INSERT INTO funnel_daily (day, tenant, branch, step, action, events, users)
+            SELECT DATE(created_at), tenant, branch, step, action, COUNT(*), COUNT(DISTINCT user_id)
+            FROM funnel_events
+            WHERE created_at >= %s
+            GROUP BY DATE(created_at), tenant, branch, step, action
+            ON DUPLICATE KEY UPDATE events=VALUES(events), users=VALUES(users)
+            ''',
+            (since,),
+        )
+
+
+def get_funnel_daily(days: int = 30, branch: str | None = None, tenant: str | None = None) -> list[dict[str, Any]]:
+    clauses = ["day >= CURDATE() - INTERVAL %s DAY"]
+    params: list[Any] = [days]
+    if tenant is not None:
+        clauses.append("tenant=%s")
+        params.append(tenant)
+    if branch:
+        clauses.append("branch=%s")
+        params.append(branch)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT day, tenant, branch, step, action, events, users FROM funnel_daily
+            WHERE {' AND '.join(clauses)}
+            ORDER BY day
+            ''',
+            params,
+        )
         return [dict(r) for r in cur.fetchall()]
+
+
+def purge_funnel_events(older_than_days: int = 90, limit: int = 5000) -> int:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            "DELETE FROM funnel_events WHERE created_at < NOW() - INTERVAL %s DAY ORDER BY created_at LIMIT %s",
+            (older_than_days, limit),
+        )
+        return int(cur.rowcount)
+
+
+# DB_BACKEND=sqlite swaps every public helper above for its SQLite counterpart.
+if settings.db_backend == "sqlite":
+    from database_sqlite import *  # noqa: E402,F401,F403
@@ -0,0 +1,1458 @@
+"""SQLite implementation of the database.py API for single-node and test deployments.
+
+Selected with DB_BACKEND=sqlite: database.py then re-exports every name in
+__all__ from here, so callers keep using `database.*` unchanged. The file
+runs in WAL mode, so readers never block the writer. Write transactions open
+with BEGIN IMMEDIATE, which takes the write lock up front and stands in for
+MySQL's SELECT ... FOR UPDATE (SKIP LOCKED). There is no replica routing and
+no archive partitioning here.
+"""
+import json
+import queue
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Iterator
+
+from config import DEFAULT_TENANT, settings
+from database import (
+    ALLOWED_STATUSES,
+    ARCHIVE_STATUSES,
+    FACET_FIELDS,
+    MANAGER_LOAD_STATUSES,
+    ORDER_COLUMNS,
+    ORDER_FILE_COLUMNS,
+    ORDER_MESSAGE_COLUMNS,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    DatabaseError,
+    _decode_mesh_stats,
+    _manager_branches,
+    _pick_manager,
+    _use_archive,
+    _wait_summary,
+)
+
+__all__ = [
+    "get_connection",
+    "db_cursor",
+    "init_db_if_needed",
+    "warm_pool",
+    "get_bot_config",
+    "get_bot_config_version",
+    "get_bot_config_snapshot",
+    "set_bot_config_many",
+    "create_order",
+    "get_last_user_order",
+    "find_or_create_active_order",
+    "find_or_create_draft_order",
+    "purge_stale_drafts",
+    "update_order_contact",
+    "update_order_payload",
+    "finalize_order",
+    "claim_outbox_events",
+    "mark_outbox_sent",
+    "mark_outbox_failed",
+    "defer_outbox_events",
+    "purge_sent_outbox",
+    "list_orders",
+    "count_orders",
+    "get_order_facets",
+    "get_order_statistics",
+    "iter_orders_export",
+    "get_order",
+    "update_order_status",
+    "add_order_message",
+    "add_client_messages",
+    "find_order_by_outgoing_message",
+    "list_order_messages",
+    "get_last_order_message_id",
+    "add_order_file",
+    "add_order_files",
+    "list_order_files",
+    "get_order_detail",
+    "set_order_file_mesh_stats",
+    "set_order_file_location",
+    "list_local_order_files",
+    "update_order_file_location",
+    "assign_queued_orders",
+    "list_managers",
+    "save_manager",
+    "get_queue_metrics",
+    "ensure_archive_partitions",
+    "archive_orders_batch",
+    "add_funnel_events",
+    "rollup_funnel",
+    "get_funnel_daily",
+    "purge_funnel_events",
+]
+
+# MySQL NOW()/CURDATE() use the server's local time; keep stored values comparable.
+_NOW = "datetime('now', 'localtime')"
+
+_STATUS_CHECK = "CHECK (status IN ('draft','new','in_work','done','canceled'))"
+_FACET_COLUMNS = ",\n".join(
+    f"  {field} TEXT GENERATED ALWAYS AS (substr(json_extract(order_payload, '$.{field}'), 1, 128)) STORED"
+    for field in FACET_FIELDS
+)
+_FACET_INDEXES = "\n".join(
+    f"CREATE INDEX IF NOT EXISTS idx_orders_{field} ON orders ({field}, created_at);" for field in FACET_FIELDS
+)
+
+# Mirrors schema.sql; ENUMs become CHECKs and partitions are dropped.
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS orders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  user_id INTEGER NOT NULL,
+  username TEXT NULL,
+  full_name TEXT NULL,
+  branch TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'draft' {_STATUS_CHECK},
+  summary TEXT NULL,
+  order_payload TEXT NULL,
+{_FACET_COLUMNS},
+  created_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  updated_at TIMESTAMP NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user_status ON orders (user_id, status);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_tenant_user ON orders (tenant, user_id, status);
+CREATE INDEX IF NOT EXISTS idx_orders_tenant_created ON orders (tenant, created_at);
+{_FACET_INDEXES}
+
+CREATE TABLE IF NOT EXISTS order_files (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+  telegram_file_id TEXT NOT NULL,
+  file_unique_id TEXT NULL,
+  telegram_message_id INTEGER NULL,
+  original_name TEXT NOT NULL,
+  mime_type TEXT NULL,
+  file_size INTEGER NULL,
+  local_path TEXT NULL,
+  mesh_stats TEXT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_order_files_order ON order_files (order_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_order_files_unique ON order_files (order_id, file_unique_id);
+
+CREATE TABLE IF NOT EXISTS order_messages (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+  direction TEXT NOT NULL CHECK (direction IN ('in','out')),
+  message_text TEXT NOT NULL,
+  telegram_message_id INTEGER NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_order_messages_order ON order_messages (order_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_order_messages_order_id ON order_messages (order_id, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_order_messages_tg ON order_messages (order_id, direction, telegram_message_id);
+CREATE INDEX IF NOT EXISTS idx_order_messages_tg ON order_messages (telegram_message_id);
+
+CREATE TABLE IF NOT EXISTS order_outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  order_id INTEGER NOT NULL,
+  event_type TEXT NOT NULL,
+  payload TEXT NULL,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending','sent','failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  last_error TEXT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  sent_at TIMESTAMP NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_outbox_due ON order_outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_order_outbox_order ON order_outbox (order_id);
+
+CREATE TABLE IF NOT EXISTS managers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  telegram_user_id INTEGER NOT NULL,
+  name TEXT NOT NULL,
+  branches TEXT NOT NULL DEFAULT '',
+  max_in_work INTEGER NOT NULL DEFAULT 10,
+  active INTEGER NOT NULL DEFAULT 1,
+  created_at TIMESTAMP NOT NULL DEFAULT ({_NOW})
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_managers_tenant_user ON managers (tenant, telegram_user_id);
+
+CREATE TABLE IF NOT EXISTS order_queue (
+  order_id INTEGER PRIMARY KEY REFERENCES orders(id) ON DELETE CASCADE,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  branch TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'waiting' CHECK (status IN ('waiting','assigned','closed')),
+  manager_id INTEGER NULL,
+  enqueued_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  checked_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  assigned_at TIMESTAMP NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_queue_claim ON order_queue (status, checked_at);
+CREATE INDEX IF NOT EXISTS idx_order_queue_manager ON order_queue (manager_id, status);
+CREATE INDEX IF NOT EXISTS idx_order_queue_assigned ON order_queue (tenant, assigned_at);
+
+CREATE TABLE IF NOT EXISTS funnel_events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  user_id INTEGER NOT NULL,
+  order_id INTEGER NULL,
+  branch TEXT NOT NULL DEFAULT '',
+  step TEXT NOT NULL,
+  action TEXT NOT NULL,
+  created_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_funnel_events_created ON funnel_events (created_at);
+
+CREATE TABLE IF NOT EXISTS funnel_daily (
+  day DATE NOT NULL,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  branch TEXT NOT NULL,
+  step TEXT NOT NULL,
+  action TEXT NOT NULL,
+  events INTEGER NOT NULL DEFAULT 0,
+  users INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, tenant, branch, step, action)
+);
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+  id INTEGER PRIMARY KEY,
+  tenant TEXT NOT NULL DEFAULT 'default',
+  user_id INTEGER NOT NULL,
+  username TEXT NULL,
+  full_name TEXT NULL,
+  branch TEXT NOT NULL,
+  status TEXT NOT NULL {_STATUS_CHECK},
+  summary TEXT NULL,
+  order_payload TEXT NULL,
+  technology TEXT NULL,
+  material TEXT NULL,
+  scan_type TEXT NULL,
+  idea_type TEXT NULL,
+  created_at TIMESTAMP NOT NULL,
+  updated_at TIMESTAMP NOT NULL,
+  archived_at TIMESTAMP NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_user ON orders_archive (user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_tenant ON orders_archive (tenant, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_status_created ON orders_archive (status, created_at);
+
+CREATE TABLE IF NOT EXISTS order_files_archive (
+  id INTEGER PRIMARY KEY,
+  order_id INTEGER NOT NULL,
+  telegram_file_id TEXT NOT NULL,
+  file_unique_id TEXT NULL,
+  telegram_message_id INTEGER NULL,
+  original_name TEXT NOT NULL,
+  mime_type TEXT NULL,
+  file_size INTEGER NULL,
+  local_path TEXT NULL,
+  mesh_stats TEXT NULL,
+  created_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_files_archive_order ON order_files_archive (order_id);
+
+CREATE TABLE IF NOT EXISTS order_messages_archive (
+  id INTEGER PRIMARY KEY,
+  order_id INTEGER NOT NULL,
+  direction TEXT NOT NULL CHECK (direction IN ('in','out')),
+  message_text TEXT NOT NULL,
+  telegram_message_id INTEGER NULL,
+  created_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_messages_archive_order_id ON order_messages_archive (order_id, id);
+
+CREATE TABLE IF NOT EXISTS orders_archive_stats (
+  tenant TEXT PRIMARY KEY,
+  archived_orders INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS bot_config (
+  tenant TEXT NOT NULL DEFAULT 'default',
+  config_key TEXT NOT NULL,
+  config_value TEXT NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT ({_NOW}),
+  PRIMARY KEY (tenant, config_key)
+);
+
+CREATE TABLE IF NOT EXISTS bot_config_version (
+  id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO bot_config (config_key, config_value)
+VALUES
+('welcome_menu_msg', 'Добро пожаловать в Chel3D 👋\nВыберите нужный пункт меню:'),
+('about_text', 'Chel3D — 3D-печать, 3D-сканирование и помощь в создании модели.')
+ON CONFLICT (tenant, config_key) DO NOTHING;
+'''
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 10_000
+
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(" ")
+
+
+def _convert_timestamp(raw: bytes) -> datetime:
+    return datetime.fromisoformat(raw.decode())
+
+
+def _convert_date(raw: bytes) -> date:
+    return date.fromisoformat(raw.decode()[:10])
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATE", _convert_date)
+
+
+def _dict_row(cur: sqlite3.Cursor, row: tuple) -> dict[str, Any]:
+    return {col[0]: value for col, value in zip(cur.description, row)}
+
+
+def _ago(amount: float, unit: str) -> str:
+    """datetime() modifier `amount` units in the past, e.g. '-72 hours'."""
+    return f"-{int(amount)} {unit}"
+
+
+def _ahead(amount: float, unit: str) -> str:
+    return f"+{int(amount)} {unit}"
+
+
+def _in(values) -> str:
+    return ", ".join(["?"] * len(values))
+
+
+def get_connection() -> sqlite3.Connection:
+    try:
+        conn = sqlite3.connect(
+            settings.sqlite_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Transactions are opened explicitly by db_cursor().
+            isolation_level=None,
+            # Pooled connections move between worker threads, one at a time.
+            check_same_thread=False,
+        )
+    except sqlite3.Error as exc:
+        raise DatabaseError(f"Cannot open DB: {exc}") from exc
+    conn.row_factory = _dict_row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+def _acquire_connection() -> sqlite3.Connection:
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return get_connection()
+
+
+def _release_connection(conn: sqlite3.Connection) -> None:
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+@contextmanager
+def db_cursor(readonly: bool = False):
+    conn = _acquire_connection()
+    try:
+        cur = conn.cursor()
+        # Readers get a snapshot; writers take the write lock before their first read.
+        cur.execute("BEGIN" if readonly else "BEGIN IMMEDIATE")
+        yield conn, cur
+        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+        raise
+    _release_connection(conn)
+
+
+def init_db_if_needed() -> int:
+    """Create missing tables and indexes; SCHEMA is idempotent, so nothing is counted."""
+    conn = get_connection()
+    try:
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+    return 0
+
+
+def warm_pool(role: str = "primary") -> int:
+    """Open POOL_SIZE connections up front (there is no replica here); returns the pool size."""
+    if role != "primary":
+        return 0
+    opened = [_acquire_connection() for _ in range(_pool.maxsize - _pool.qsize())]
+    for conn in opened:
+        _release_connection(conn)
+    return _pool.qsize()
+
+
+# -----------------------------
+# Bot config (table: bot_config)
+# -----------------------------
+def _read_bot_config(cur, tenant: str) -> dict[str, str]:
+    cur.execute("SELECT config_key, config_value FROM bot_config WHERE tenant=?", (tenant,))
+    return {str(r["config_key"]): "" if r["config_value"] is None else str(r["config_value"]) for r in cur.fetchall()}
+
+
+def _read_bot_config_version(cur) -> int:
+    cur.execute("SELECT version FROM bot_config_version WHERE id=1")
+    row = cur.fetchone()
+    return int(row["version"]) if row else 0
+
+
+def get_bot_config(tenant: str = DEFAULT_TENANT) -> dict[str, str]:
+    with db_cursor(readonly=True) as (_, cur):
+        return _read_bot_config(cur, tenant)
+
+
+def get_bot_config_version() -> int:
+    with db_cursor(readonly=True) as (_, cur):
+        return _read_bot_config_version(cur)
+
+
+def get_bot_config_snapshot(tenant: str = DEFAULT_TENANT) -> tuple[dict[str, str], int]:
+    with db_cursor(readonly=True) as (_, cur):
+        version = _read_bot_config_version(cur)
+        return _read_bot_config(cur, tenant), version
+
+
+def set_bot_config_many(items: dict[str, str], tenant: str = DEFAULT_TENANT) -> int:
+    clean = {str(k): "" if v is None else str(v) for k, v in (items or {}).items()}
+    with db_cursor() as (_, cur):
+        if not clean:
+            return _read_bot_config_version(cur)
+        keys = list(clean)
+        cur.execute(
+            f"SELECT config_key, config_value FROM bot_config WHERE tenant=? AND config_key IN ({_in(keys)})",
+            (tenant, *keys),
+        )
+        current = {str(r["config_key"]): "" if r["config_value"] is None else str(r["config_value"]) for r in cur.fetchall()}
+        changed = [(k, v) for k, v in clean.items() if current.get(k) != v]
+        if not changed:
+            return _read_bot_config_version(cur)
+
+        cur.execute(
+            f'''
+            INSERT INTO bot_config (tenant, config_key, config_value)
+            VALUES {", ".join(["(?, ?, ?)"] * len(changed))}
+            ON CONFLICT (tenant, config_key) DO UPDATE SET config_value=excluded.config_value, updated_at={_NOW}
+            ''',
+            [x for k, v in changed for x in (tenant, k, v)],
+        )
+        cur.execute(
+            "INSERT INTO bot_config_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO UPDATE SET version=version+1"
+        )
+        return _read_bot_config_version(cur)
+
+
+# -----------------------------
+# Orders + chat (tables: orders, order_messages, order_files)
+# -----------------------------
+def _insert_order(
+    cur,
+    tenant: str,
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    status: str,
+) -> int:
+    cur.execute(
+        f'''
+        INSERT INTO orders (tenant, user_id, username, full_name, branch, status, order_payload, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, {_NOW})
+        ''',
+        (tenant, user_id, username, full_name, branch, status, json.dumps({"branch": branch}, ensure_ascii=False)),
+    )
+    return int(cur.lastrowid)
+
+
+def create_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    with db_cursor() as (_, cur):
+        return _insert_order(cur, tenant, user_id, username, full_name, branch, "draft")
+
+
+def get_last_user_order(user_id: int, tenant: str = DEFAULT_TENANT) -> dict[str, Any] | None:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            "SELECT * FROM orders WHERE tenant=? AND user_id=? ORDER BY updated_at DESC, created_at DESC LIMIT 1",
+            (tenant, user_id),
+        )
+        return cur.fetchone()
+
+
+def _find_or_create_order(
+    cur,
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    statuses: tuple[str, ...],
+    new_status: str,
+    same_branch: bool,
+    without_files: bool = False,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    clauses = [f"tenant=? AND user_id=? AND status IN ({_in(statuses)})"]
+    params: list[Any] = [tenant, user_id, *statuses]
+    if same_branch:
+        clauses.append("branch=?")
+        params.append(branch)
+    if without_files:
+        clauses.append("NOT EXISTS (SELECT 1 FROM order_files f WHERE f.order_id=orders.id)")
+    cur.execute(
+        f'''
+        SELECT id FROM orders
+        WHERE {' AND '.join(clauses)}
+        ORDER BY updated_at DESC, created_at DESC
+        LIMIT 1
+        ''',
+        params,
+    )
+    row = cur.fetchone()
+    if row:
+        return int(row["id"])
+    order_id = _insert_order(cur, tenant, user_id, username, full_name, branch, new_status)
+    if new_status != "draft":
+        _enqueue_assignment(cur, order_id)
+    return order_id
+
+
+def find_or_create_active_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    with db_cursor() as (_, cur):
+        return _find_or_create_order(
+            cur,
+            user_id,
+            username,
+            full_name,
+            "dialog",
+            # Not drafts: purge_stale_drafts() would take the client's messages with them.
+            ("new", "submitted", "in_work"),
+            "new",
+            same_branch=False,
+            tenant=tenant,
+        )
+
+
+def find_or_create_draft_order(
+    user_id: int,
+    username: str | None,
+    full_name: str | None,
+    branch: str,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    with db_cursor() as (_, cur):
+        order_id = _find_or_create_order(
+            cur,
+            user_id,
+            username,
+            full_name,
+            branch,
+            ("draft",),
+            "draft",
+            same_branch=True,
+            without_files=True,
+            tenant=tenant,
+        )
+        cur.execute(
+            f'''
+            UPDATE orders
+            SET username=?, full_name=?, order_payload=?, summary=NULL, updated_at={_NOW}
+            WHERE id=?
+            ''',
+            (username, full_name, json.dumps({"branch": branch}, ensure_ascii=False), order_id),
+        )
+        return order_id
+
+
+def purge_stale_drafts(max_age_hours: int, limit: int = 500) -> list[int]:
+    cutoff = _ago(max_age_hours, "hours")
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            SELECT id FROM orders
+            WHERE status='draft'
+              AND created_at < datetime('now', 'localtime', ?)
+              AND updated_at < datetime('now', 'localtime', ?)
+            ORDER BY created_at
+            LIMIT ?
+            ''',
+            (cutoff, cutoff, limit),
+        )
+        ids = [int(r["id"]) for r in cur.fetchall()]
+        if ids:
+            cur.execute(f"DELETE FROM orders WHERE id IN ({_in(ids)})", ids)
+        return ids
+
+
+def update_order_contact(order_id: int, username: str | None, full_name: str | None) -> None:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f"UPDATE orders SET username=?, full_name=?, updated_at={_NOW} WHERE id=?",
+            (username, full_name, order_id),
+        )
+
+
+def update_order_payload(order_id: int, payload: dict[str, Any], summary: str | None = None) -> None:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f"UPDATE orders SET order_payload=?, summary=?, updated_at={_NOW} WHERE id=?",
+            (json.dumps(payload, ensure_ascii=False), summary, order_id),
+        )
+
+
+def finalize_order(order_id: int, summary: str | None = None) -> bool:
+    with db_cursor() as (_, cur):
+        cur.execute("SELECT status, user_id, username, full_name FROM orders WHERE id=?", (order_id,))
+        row = cur.fetchone()
+        if not row or (row["status"] or "draft") not in ("draft", ""):
+            return False
+        cur.execute(
+            f"UPDATE orders SET status='new', summary=?, updated_at={_NOW} WHERE id=?",
+            (summary, order_id),
+        )
+
+        events: list[tuple[str, dict[str, Any]]] = [
+            (
+                "order_submitted",
+                {
+                    "summary": summary or "",
+                    "user_id": int(row["user_id"] or 0),
+                    "username": row["username"],
+                    "full_name": row["full_name"],
+                },
+            )
+        ]
+        cur.execute(
+            "SELECT telegram_file_id, mime_type, original_name, mesh_stats FROM order_files WHERE order_id=? ORDER BY id",
+            (order_id,),
+        )
+        files = _decode_mesh_stats(cur.fetchall())
+        mesh = [{"file_name": f["original_name"], "stats": f["mesh_stats"]} for f in files if f["mesh_stats"]]
+        if mesh:
+            events[0][1]["mesh_stats"] = mesh
+        seen: set[str] = set()
+        for f in files:
+            file_id = f["telegram_file_id"]
+            if not file_id or file_id in seen:
+                continue
+            seen.add(file_id)
+            events.append(("order_file", {"file_id": file_id, "file_type": str(f["mime_type"] or "")}))
+        _enqueue_outbox(cur, order_id, events)
+        _enqueue_assignment(cur, order_id)
+        return True
+
+
+# -----------------------------
+# Outbox (table: order_outbox)
+# -----------------------------
+def _enqueue_outbox(cur, order_id: int, events: list[tuple[str, dict[str, Any]]]) -> None:
+    cur.executemany(
+        "INSERT INTO order_outbox (tenant, order_id, event_type, payload) SELECT tenant, id, ?, ? FROM orders WHERE id=?",
+        [(event_type, json.dumps(payload, ensure_ascii=False), order_id) for event_type, payload in events],
+    )
+
+
+def claim_outbox_events(limit: int = 50) -> list[dict[str, Any]]:
+    # BEGIN IMMEDIATE serializes claimers, so no two dispatchers lease the same row.
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            SELECT id, tenant, order_id, event_type, payload, attempts FROM order_outbox
+            WHERE status='pending' AND next_attempt_at<={_NOW}
+            ORDER BY id
+            LIMIT ?
+            ''',
+            (limit,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return []
+        ids = [r["id"] for r in rows]
+        cur.execute(
+            f'''
+            UPDATE order_outbox
+            SET attempts=attempts+1, next_attempt_at=datetime('now', 'localtime', ?)
+            WHERE id IN ({_in(ids)})
+            ''',
+            (_ahead(OUTBOX_LEASE_SECONDS, "seconds"), *ids),
+        )
+    for r in rows:
+        r["payload"] = json.loads(r["payload"] or "{}")
+        r["attempts"] = int(r["attempts"]) + 1
+    return rows
+
+
+def mark_outbox_sent(event_id: int) -> None:
+    with db_cursor() as (_, cur):
+        cur.execute(f"UPDATE order_outbox SET status='sent', sent_at={_NOW}, last_error=NULL WHERE id=?", (event_id,))
+
+
+def mark_outbox_failed(event_id: int, attempts: int, error: str, retry_in_seconds: float) -> None:
+    with db_cursor() as (_, cur):
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            cur.execute("UPDATE order_outbox SET status='failed', last_error=? WHERE id=?", (error[:512], event_id))
+            return
+        cur.execute(
+            "UPDATE order_outbox SET next_attempt_at=datetime('now', 'localtime', ?), last_error=? WHERE id=?",
+            (_ahead(retry_in_seconds, "seconds"), error[:512], event_id),
+        )
+
+
+def defer_outbox_events(event_ids: list[int], delay_seconds: float) -> None:
+    if not event_ids:
+        return
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            UPDATE order_outbox
+            SET attempts=max(attempts-1, 0), next_attempt_at=datetime('now', 'localtime', ?)
+            WHERE id IN ({_in(event_ids)})
+            ''',
+            (_ahead(delay_seconds, "seconds"), *event_ids),
+        )
+
+
+def purge_sent_outbox(older_than_days: int = 7, limit: int = 1000) -> int:
+    # DELETE ... LIMIT is a compile-time option in SQLite; bound the batch through the subquery.
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            DELETE FROM order_outbox WHERE id IN (
+                SELECT id FROM order_outbox
+                WHERE status='sent' AND sent_at < datetime('now', 'localtime', ?)
+                LIMIT ?
+            )
+            ''',
+            (_ago(older_than_days, "days"), limit),
+        )
+        return int(cur.rowcount)
+
+
+def _orders_where(
+    status: str | None,
+    filters: dict[str, str | None] | None,
+    exclude: str | None = None,
+    tenant: str | None = None,
+) -> tuple[str, list[Any]]:
+    clauses: list[str] = []
+    params: list[Any] = []
+    if tenant is not None:
+        clauses.append("tenant=?")
+        params.append(tenant)
+    if status:
+        clauses.append("status=?")
+        params.append(status)
+    for field in FACET_FIELDS:
+        value = (filters or {}).get(field)
+        if field == exclude or not value:
+            continue
+        clauses.append(f"{field}=?")
+        params.append(value)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def list_orders(
+    status: str | None = None,
+    limit: int = 200,
+    offset: int = 0,
+    filters: dict[str, str | None] | None = None,
+    include_archive: bool | None = None,
+    tenant: str | None = None,
+) -> list[dict[str, Any]]:
+    where, params = _orders_where(status, filters, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        if not _use_archive(status, include_archive):
+            cur.execute(
+                f"SELECT * FROM orders{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            )
+            return cur.fetchall()
+
+        # Compound members can't carry their own ORDER BY/LIMIT, so wrap them in subqueries.
+        cols = ", ".join(ORDER_COLUMNS)
+        window = limit + offset
+        cur.execute(
+            f'''
+            SELECT * FROM (SELECT {cols} FROM orders{where} ORDER BY created_at DESC LIMIT ?)
+            UNION ALL
+            SELECT * FROM (SELECT {cols} FROM orders_archive{where} ORDER BY created_at DESC LIMIT ?)
+            ORDER BY created_at DESC
+            LIMIT ? OFFSET ?
+            ''',
+            (*params, window, *params, window, limit, offset),
+        )
+        return cur.fetchall()
+
+
+def count_orders(
+    status: str | None = None,
+    filters: dict[str, str | None] | None = None,
+    include_archive: bool | None = None,
+    tenant: str | None = None,
+) -> int:
+    where, params = _orders_where(status, filters, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(f"SELECT COUNT(*) AS c FROM orders{where}", params)
+        total = int(cur.fetchone()["c"])
+        if _use_archive(status, include_archive):
+            cur.execute(f"SELECT COUNT(*) AS c FROM orders_archive{where}", params)
+            total += int(cur.fetchone()["c"])
+        return total
+
+
+def get_order_facets(
+    status: str | None = None,
+    filters: dict[str, str | None] | None = None,
+    tenant: str | None = None,
+) -> dict[str, list[dict[str, Any]]]:
+    parts: list[str] = []
+    params: list[Any] = []
+    for field in FACET_FIELDS:
+        where, where_params = _orders_where(status, filters, exclude=field, tenant=tenant)
+        where = f"{where} AND {field} IS NOT NULL" if where else f" WHERE {field} IS NOT NULL"
+        parts.append(f"SELECT '{field}' AS facet, {field} AS value, COUNT(*) AS c FROM orders{where} GROUP BY {field}")
+        params.extend(where_params)
+
+    facets: dict[str, list[dict[str, Any]]] = {field: [] for field in FACET_FIELDS}
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(" UNION ALL ".join(parts), params)
+        for r in cur.fetchall():
+            facets[str(r["facet"])].append({"value": r["value"], "count": int(r["c"])})
+    for items in facets.values():
+        items.sort(key=lambda item: item["count"], reverse=True)
+    return facets
+
+
+def get_order_statistics(tenant: str | None = None) -> dict[str, int]:
+    where, params = _orders_where(None, None, tenant=tenant)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT
+                COUNT(*) AS total,
+                COALESCE(SUM(status IN ('new','submitted')), 0) AS new_orders,
+                COALESCE(SUM(status IN ('new','submitted','in_work','draft')), 0) AS active_orders
+            FROM orders{where}
+            ''',
+            params,
+        )
+        row = cur.fetchone()
+        cur.execute(f"SELECT COALESCE(SUM(archived_orders), 0) AS archived_orders FROM orders_archive_stats{where}", params)
+        archived = cur.fetchone()
+    return {
+        "total_orders": int(row["total"]) + int(archived["archived_orders"]),
+        "new_orders": int(row["new_orders"]),
+        "active_orders": int(row["active_orders"]),
+    }
+
+
+def iter_orders_export(
+    statuses: list[str] | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    batch_size: int = 500,
+    include_archive: bool = True,
+    tenant: str | None = None,
+) -> Iterator[dict[str, Any]]:
+    """SQLite cursors step through the result lazily, so this streams like SSDictCursor."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if tenant is not None:
+        clauses.append("tenant=?")
+        params.append(tenant)
+    if statuses:
+        clauses.append(f"status IN ({_in(statuses)})")
+        params.extend(statuses)
+    if created_from:
+        clauses.append("created_at>=?")
+        params.append(created_from)
+    if created_to:
+        clauses.append("created_at<?")
+        params.append(created_to)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    # A dedicated connection: the generator may be resumed long after other queries ran.
+    conn = get_connection()
+    try:
+        cols = ", ".join(ORDER_COLUMNS)
+        if include_archive:
+            cur = conn.execute(
+                f"SELECT {cols} FROM orders{where} UNION ALL SELECT {cols} FROM orders_archive{where}",
+                params * 2,
+            )
+        else:
+            cur = conn.execute(f"SELECT {cols} FROM orders{where} ORDER BY id", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def get_order(order_id: int) -> dict[str, Any] | None:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute("SELECT * FROM orders WHERE id=?", (order_id,))
+        row = cur.fetchone()
+        if not row:
+            cur.execute("SELECT * FROM orders_archive WHERE id=?", (order_id,))
+            row = cur.fetchone()
+        return row
+
+
+def update_order_status(order_id: int, status: str) -> None:
+    if status not in ALLOWED_STATUSES:
+        raise ValueError("invalid status")
+    with db_cursor() as (_, cur):
+        cur.execute(f"UPDATE orders SET status=?, updated_at={_NOW} WHERE id=?", (status, order_id))
+
+
+def add_order_message(order_id: int, direction: str, text: str, telegram_message_id: int | None = None) -> bool:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            INSERT INTO order_messages (order_id, direction, message_text, telegram_message_id, created_at)
+            VALUES (?, ?, ?, ?, {_NOW})
+            ON CONFLICT DO NOTHING
+            ''',
+            (order_id, direction, text, telegram_message_id),
+        )
+        return cur.rowcount == 1
+
+
+def add_client_messages(
+    messages: list[tuple[int, str, int | None]],
+    notifications: list[tuple[int, dict[str, Any]]],
+) -> None:
+    if not messages:
+        return
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            INSERT INTO order_messages (order_id, direction, message_text, telegram_message_id, created_at)
+            VALUES {", ".join([f"(?, 'in', ?, ?, {_NOW})"] * len(messages))}
+            ON CONFLICT DO NOTHING
+            ''',
+            [x for row in messages for x in row],
+        )
+        order_ids = sorted({row[0] for row in messages})
+        cur.execute(f"UPDATE orders SET updated_at={_NOW} WHERE id IN ({_in(order_ids)})", order_ids)
+        cur.execute(f"SELECT id FROM orders WHERE id IN ({_in(order_ids)}) AND status<>'draft'", order_ids)
+        submitted = {int(r["id"]) for r in cur.fetchall()}
+        for order_id, payload in notifications:
+            if order_id in submitted:
+                _enqueue_outbox(cur, order_id, [("client_message", payload)])
+
+
+def find_order_by_outgoing_message(
+    user_id: int,
+    telegram_message_id: int,
+    tenant: str = DEFAULT_TENANT,
+) -> int | None:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            '''
+            SELECT m.order_id FROM order_messages m
+            JOIN orders o ON o.id=m.order_id
+            WHERE m.direction='out' AND m.telegram_message_id=? AND o.user_id=? AND o.tenant=?
+            ORDER BY m.id DESC
+            LIMIT 1
+            ''',
+            (telegram_message_id, user_id, tenant),
+        )
+        row = cur.fetchone()
+        return int(row["order_id"]) if row else None
+
+
+def _select_messages(
+    cur,
+    table: str,
+    order_id: int,
+    limit: int,
+    after_id: int | None,
+    before_id: int | None,
+) -> list[dict[str, Any]]:
+    if after_id is not None:
+        cur.execute(f"SELECT * FROM {table} WHERE order_id=? AND id>? ORDER BY id ASC LIMIT ?", (order_id, after_id, limit))
+        return cur.fetchall()
+    if before_id is not None:
+        cur.execute(
+            f"SELECT * FROM {table} WHERE order_id=? AND id<? ORDER BY id DESC LIMIT ?",
+            (order_id, before_id, limit),
+        )
+    else:
+        cur.execute(f"SELECT * FROM {table} WHERE order_id=? ORDER BY id DESC LIMIT ?", (order_id, limit))
+    return list(reversed(cur.fetchall()))
+
+
+def list_order_messages(
+    order_id: int,
+    limit: int = 30,
+    after_id: int | None = None,
+    before_id: int | None = None,
+) -> list[dict[str, Any]]:
+    with db_cursor(readonly=True) as (_, cur):
+        rows = _select_messages(cur, "order_messages", order_id, limit, after_id, before_id)
+        if rows or after_id is not None:
+            return rows
+        cur.execute("SELECT 1 FROM orders WHERE id=?", (order_id,))
+        if cur.fetchone():
+            return rows
+        return _select_messages(cur, "order_messages_archive", order_id, limit, after_id, before_id)
+
+
+def get_last_order_message_id(order_id: int) -> int:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute("SELECT MAX(id) AS last_id FROM order_messages WHERE order_id=?", (order_id,))
+        last_id = cur.fetchone()["last_id"]
+        if last_id is None:
+            cur.execute("SELECT MAX(id) AS last_id FROM order_messages_archive WHERE order_id=?", (order_id,))
+            last_id = cur.fetchone()["last_id"]
+        return int(last_id or 0)
+
+
+_INSERT_FILE = '''
+INSERT INTO order_files (order_id, telegram_file_id, file_unique_id, original_name, mime_type, created_at)
+VALUES {values}
+ON CONFLICT DO NOTHING
+'''
+_FILE_VALUES = f"(?, ?, ?, ?, ?, {_NOW})"
+
+
+def add_order_file(
+    order_id: int,
+    telegram_file_id: str,
+    file_unique_id: str | None,
+    file_name: str | None,
+    file_type: str | None,
+) -> bool:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            _INSERT_FILE.format(values=_FILE_VALUES),
+            (order_id, telegram_file_id, file_unique_id, file_name or telegram_file_id, file_type),
+        )
+        return cur.rowcount == 1
+
+
+def add_order_files(order_id: int, files: list[tuple[str, str, str | None, str | None]]) -> list[str]:
+    if not files:
+        return []
+    unique_ids = [f[1] for f in files]
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f"SELECT file_unique_id FROM order_files WHERE order_id=? AND file_unique_id IN ({_in(unique_ids)})",
+            (order_id, *unique_ids),
+        )
+        existing = {r["file_unique_id"] for r in cur.fetchall()}
+        fresh = [f for f in dict((f[1], f) for f in files).values() if f[1] not in existing]
+        if not fresh:
+            return []
+        cur.execute(
+            _INSERT_FILE.format(values=", ".join([_FILE_VALUES] * len(fresh))),
+            [v for tg_id, uid, name, ftype in fresh for v in (order_id, tg_id, uid, name or tg_id, ftype)],
+        )
+        return [f[1] for f in fresh]
+
+
+_FILE_SELECT = '''
+SELECT
+    id, order_id, telegram_file_id, file_unique_id,
+    original_name AS file_name, mime_type AS file_type, created_at,
+    original_name, mime_type, mesh_stats
+FROM {table}
+WHERE order_id=?
+ORDER BY created_at DESC
+'''
+
+
+def _select_files(cur, order_id: int) -> list[dict[str, Any]]:
+    cur.execute(_FILE_SELECT.format(table="order_files"), (order_id,))
+    rows = cur.fetchall()
+    if not rows:
+        cur.execute(_FILE_SELECT.format(table="order_files_archive"), (order_id,))
+        rows = cur.fetchall()
+    return _decode_mesh_stats(rows)
+
+
+def list_order_files(order_id: int) -> list[dict[str, Any]]:
+    with db_cursor(readonly=True) as (_, cur):
+        return _select_files(cur, order_id)
+
+
+def get_order_detail(order_id: int, messages_limit: int = 30) -> dict[str, Any] | None:
+    """Local queries cost microseconds, so the parts are read one by one in a single snapshot."""
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute("SELECT * FROM orders WHERE id=?", (order_id,))
+        order = cur.fetchone()
+        messages = "order_messages"
+        if not order:
+            cur.execute("SELECT * FROM orders_archive WHERE id=?", (order_id,))
+            order = cur.fetchone()
+            messages = "order_messages_archive"
+        if not order:
+            return None
+        return {
+            "order": order,
+            "files": _select_files(cur, order_id),
+            "messages": _select_messages(cur, messages, order_id, messages_limit, None, None),
+        }
+
+
+def set_order_file_mesh_stats(order_id: int, file_unique_id: str, stats: dict[str, Any]) -> bool:
+    with db_cursor() as (_, cur):
+        cur.execute("SELECT status FROM orders WHERE id=?", (order_id,))
+        order = cur.fetchone()
+        cur.execute(
+            "UPDATE order_files SET mesh_stats=? WHERE order_id=? AND file_unique_id=?",
+            (json.dumps(stats, ensure_ascii=False), order_id, file_unique_id),
+        )
+        if not order or order["status"] == "draft" or not cur.rowcount:
+            return False
+        cur.execute(
+            "SELECT original_name FROM order_files WHERE order_id=? AND file_unique_id=?",
+            (order_id, file_unique_id),
+        )
+        name = cur.fetchone()["original_name"]
+        _enqueue_outbox(cur, order_id, [("order_mesh_stats", {"file_name": name, "stats": stats})])
+        return True
+
+
+def set_order_file_location(order_id: int, file_unique_id: str, local_path: str | None, file_size: int | None) -> None:
+    """Record where the downloaded attachment lives (see storage.py) and its original size."""
+    with db_cursor() as (_, cur):
+        cur.execute(
+            "UPDATE order_files SET local_path=?, file_size=? WHERE order_id=? AND file_unique_id=?",
+            (local_path, file_size, order_id, file_unique_id),
+        )
+
+
+def list_local_order_files(after_id: int = 0, limit: int = 1000) -> list[dict[str, Any]]:
+    """One page of attachments still on local disk, hot and archived, by id (keyset: pass the last id)."""
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            '''
+            SELECT id, order_id, local_path, created_at FROM order_files
+            WHERE id > ? AND local_path IS NOT NULL AND local_path NOT LIKE 's3://%'
+            UNION ALL
+            SELECT id, order_id, local_path, created_at FROM order_files_archive
+            WHERE id > ? AND local_path IS NOT NULL AND local_path NOT LIKE 's3://%'
+            ORDER BY id
+            LIMIT ?
+            ''',
+            (after_id, after_id, limit),
+        )
+        return list(cur.fetchall())
+
+
+def update_order_file_location(file_id: int, local_path: str | None) -> None:
+    """Move a file row to a new storage location; the row may already be in the archive tier."""
+    with db_cursor() as (_, cur):
+        cur.execute("UPDATE order_files SET local_path=? WHERE id=?", (local_path, file_id))
+        cur.execute("UPDATE order_files_archive SET local_path=? WHERE id=?", (local_path, file_id))
+
+
+# -----------------------------
+# Manager queue (tables: managers, order_queue)
+# -----------------------------
+def _enqueue_assignment(cur, order_id: int) -> None:
+    cur.execute(
+        "INSERT INTO order_queue (order_id, tenant, branch) SELECT id, tenant, branch FROM orders WHERE id=?",
+        (order_id,),
+    )
+
+
+def assign_queued_orders(limit: int = 50) -> int:
+    # BEGIN IMMEDIATE serializes assigners, so the loads read here stay exact for the whole batch.
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            SELECT q.order_id, q.tenant, q.branch, o.status, o.summary, o.user_id, o.username, o.full_name
+            FROM order_queue q
+            LEFT JOIN orders o ON o.id=q.order_id
+            WHERE q.status='waiting'
+            ORDER BY q.checked_at
+            LIMIT ?
+            ''',
+            (limit,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return 0
+        tenants = sorted({str(r["tenant"]) for r in rows})
+        cur.execute(
+            f'''
+            SELECT m.id, m.tenant, m.telegram_user_id, m.name, m.branches, m.max_in_work,
+                   (SELECT COUNT(*) FROM order_queue q JOIN orders o ON o.id=q.order_id
+                    WHERE q.manager_id=m.id AND q.status='assigned'
+                      AND o.status IN ({_in(MANAGER_LOAD_STATUSES)})) AS in_work
+            FROM managers m
+            WHERE m.active=1 AND m.tenant IN ({_in(tenants)})
+            ORDER BY m.id
+            ''',
+            (*MANAGER_LOAD_STATUSES, *tenants),
+        )
+        managers = cur.fetchall()
+
+        assigned: list[tuple[int, int]] = []
+        skipped: list[int] = []
+        closed: list[int] = []
+        for r in rows:
+            order_id = int(r["order_id"])
+            if r["status"] not in MANAGER_LOAD_STATUSES:
+                closed.append(order_id)
+                continue
+            manager = _pick_manager(managers, str(r["tenant"]), str(r["branch"]))
+            if manager is None:
+                skipped.append(order_id)
+                continue
+            manager["in_work"] += 1
+            assigned.append((int(manager["id"]), order_id))
+            _enqueue_outbox(
+                cur,
+                order_id,
+                [
+                    (
+                        "order_assigned",
+                        {
+                            "manager_id": int(manager["id"]),
+                            "manager_chat_id": int(manager["telegram_user_id"]),
+                            "manager_name": manager["name"],
+                            "summary": r["summary"] or "",
+                            "user_id": int(r["user_id"] or 0),
+                            "username": r["username"],
+                            "full_name": r["full_name"],
+                        },
+                    )
+                ],
+            )
+        if assigned:
+            cur.executemany(
+                f"UPDATE order_queue SET status='assigned', manager_id=?, assigned_at={_NOW} WHERE order_id=?",
+                assigned,
+            )
+        if skipped:
+            cur.execute(f"UPDATE order_queue SET checked_at={_NOW} WHERE order_id IN ({_in(skipped)})", skipped)
+        if closed:
+            cur.execute(f"UPDATE order_queue SET status='closed' WHERE order_id IN ({_in(closed)})", closed)
+        return len(assigned)
+
+
+def list_managers(tenant: str = DEFAULT_TENANT) -> list[dict[str, Any]]:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT m.id, m.telegram_user_id, m.name, m.branches, m.max_in_work, m.active, m.created_at,
+                   (SELECT COUNT(*) FROM order_queue q JOIN orders o ON o.id=q.order_id
+                    WHERE q.manager_id=m.id AND q.status='assigned'
+                      AND o.status IN ({_in(MANAGER_LOAD_STATUSES)})) AS in_work
+            FROM managers m
+            WHERE m.tenant=?
+            ORDER BY m.active DESC, m.name
+            ''',
+            (*MANAGER_LOAD_STATUSES, tenant),
+        )
+        rows = cur.fetchall()
+    for r in rows:
+        r["branches"] = _manager_branches(r["branches"])
+        r["active"] = bool(r["active"])
+    return rows
+
+
+def save_manager(
+    telegram_user_id: int,
+    name: str,
+    branches: list[str],
+    max_in_work: int,
+    active: bool = True,
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            INSERT INTO managers (tenant, telegram_user_id, name, branches, max_in_work, active)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (tenant, telegram_user_id) DO UPDATE SET
+                name=excluded.name, branches=excluded.branches,
+                max_in_work=excluded.max_in_work, active=excluded.active
+            RETURNING id
+            ''',
+            (tenant, telegram_user_id, name, ",".join(branches), max_in_work, int(active)),
+        )
+        return int(cur.fetchone()["id"])
+
+
+def get_queue_metrics(tenant: str = DEFAULT_TENANT, days: int = 7) -> dict[str, Any]:
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f'''
+            SELECT branch, COUNT(*) AS waiting,
+                   CAST((julianday({_NOW}) - julianday(MIN(enqueued_at))) * 86400 AS INTEGER) AS oldest_wait
+            FROM order_queue
+            WHERE status='waiting' AND tenant=?
+            GROUP BY branch
+            ''',
+            (tenant,),
+        )
+        branches = cur.fetchall()
+        cur.execute(
+            '''
+            SELECT CAST((julianday(assigned_at) - julianday(enqueued_at)) * 86400 AS INTEGER) AS wait
+            FROM order_queue
+            WHERE tenant=? AND assigned_at >= datetime('now', 'localtime', ?)
+            ''',
+            (tenant, _ago(days, "days")),
+        )
+        waits = [float(r["wait"]) for r in cur.fetchall()]
+    for b in branches:
+        b["oldest_wait"] = float(b["oldest_wait"] or 0)
+    return {
+        "waiting": sum(b["waiting"] for b in branches),
+        "oldest_wait": max((b["oldest_wait"] for b in branches), default=None),
+        "branches": sorted(branches, key=lambda b: b["branch"]),
+        "assigned": len(waits),
+        "wait": _wait_summary(waits),
+    }
+
+
+# -----------------------------
+# Archive tier (tables: orders_archive, order_files_archive, order_messages_archive)
+# -----------------------------
+def ensure_archive_partitions(months_ahead: int = 2) -> int:
+    """SQLite has no partitioning; the archive tables are plain tables."""
+    return 0
+
+
+def archive_orders_batch(older_than_days: int, limit: int = 200) -> int:
+    statuses = _in(ARCHIVE_STATUSES)
+    cutoff = _ago(older_than_days, "days")
+    with db_cursor() as (_, cur):
+        cur.execute(
+            f'''
+            SELECT id, tenant FROM orders
+            WHERE status IN ({statuses})
+              AND created_at < datetime('now', 'localtime', ?)
+              AND updated_at < datetime('now', 'localtime', ?)
+            ORDER BY created_at
+            LIMIT ?
+            ''',
+            (*ARCHIVE_STATUSES, cutoff, cutoff, limit),
+        )
+        rows = cur.fetchall()
+        ids = [int(r["id"]) for r in rows]
+        if not ids:
+            return 0
+        in_ids = _in(ids)
+
+        for table, archive, cols, key in (
+            ("order_messages", "order_messages_archive", ORDER_MESSAGE_COLUMNS, "order_id"),
+            ("order_files", "order_files_archive", ORDER_FILE_COLUMNS, "order_id"),
+            ("orders", "orders_archive", ORDER_COLUMNS, "id"),
+        ):
+            col_list = ", ".join(cols)
+            cur.execute(
+                f"INSERT INTO {archive} ({col_list}) SELECT {col_list} FROM {table} WHERE {key} IN ({in_ids})",
+                ids,
+            )
+        cur.execute(f"DELETE FROM orders WHERE id IN ({in_ids})", ids)
+        cur.executemany(
+            '''
+            INSERT INTO orders_archive_stats (tenant, archived_orders) VALUES (?, ?)
+            ON CONFLICT (tenant) DO UPDATE SET archived_orders=archived_orders+excluded.archived_orders
+            ''',
+            Counter(str(r["tenant"]) for r in rows).items(),
+        )
+        return len(ids)
+
+
+# -----------------------------
+# Funnel analytics (tables: funnel_events, funnel_daily)
+# -----------------------------
+def add_funnel_events(events: list[tuple[str, int, int | None, str, str, str, datetime]]) -> None:
+    if not events:
+        return
+    with db_cursor() as (_, cur):
+        cur.executemany(
+            '''
+            INSERT INTO funnel_events (tenant, user_id, order_id, branch, step, action, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''',
+            events,
+        )
+
+
+def rollup_funnel(since: date) -> None:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            INSERT INTO funnel_daily (day, tenant, branch, step, action, events, users)
+            SELECT date(created_at), tenant, branch, step, action, COUNT(*), COUNT(DISTINCT user_id)
+            FROM funnel_events
+            WHERE created_at >= ?
+            GROUP BY date(created_at), tenant, branch, step, action
+            ON CONFLICT (day, tenant, branch, step, action) DO UPDATE SET events=excluded.events, users=excluded.users
+            ''',
+            (since,),
+        )
+
+
+def get_funnel_daily(days: int = 30, branch: str | None = None, tenant: str | None = None) -> list[dict[str, Any]]:
+    clauses = ["day >= date('now', 'localtime', ?)"]
+    params: list[Any] = [_ago(days, "days")]
+    if tenant is not None:
+        clauses.append("tenant=?")
+        params.append(tenant)
+    if branch:
+        clauses.append("branch=?")
+        params.append(branch)
+    with db_cursor(readonly=True) as (_, cur):
+        cur.execute(
+            f"SELECT day, tenant, branch, step, action, events, users FROM funnel_daily WHERE {' AND '.join(clauses)} ORDER BY day",
+            params,
+        )
+        return cur.fetchall()
+
+
+def purge_funnel_events(older_than_days: int = 90, limit: int = 5000) -> int:
+    with db_cursor() as (_, cur):
+        cur.execute(
+            '''
+            DELETE FROM funnel_events WHERE id IN (
+                SELECT id FROM funnel_events
+                WHERE created_at < datetime('now', 'localtime', ?)
+                ORDER BY created_at
+                LIMIT ?
+            )
+            ''',
+            (_ago(older_than_days, "days"), limit),
+        )
+        return int(cur.rowcount)
@@ -1,6 +1,11 @@
 #!/usr/bin/env sh
 set -eu
 
+if [ "${DB_BACKEND:-mysql}" = "sqlite" ]; then
+  echo "[bot] Using SQLite at ${SQLITE_PATH:-chel3d.db}"
+  exec python bot.py
+fi
+
 echo "[bot] Waiting for MySQL at ${MYSQL_HOST}:${MYSQL_PORT}..."
 for i in $(seq 1 60); do
   if nc -z "$MYSQL_HOST" "$MYSQL_PORT"; then
@@ -9,6 +9,7 @@ import Login from './components/Login';
 import Dashboard from './components/Dashboard';
 import Orders from './components/Orders';
 import BotConfig from './components/BotConfig';
+import Managers from './components/Managers';
 import MainLayout from './components/MainLayout';
 
 // Контекст аутентификации
@@ -25,6 +26,7 @@ function App() {
               <Route element={<MainLayout />}>
                 <Route path="/dashboard" element={<Dashboard />} />
                 <Route path="/orders" element={<Orders />} />
+                <Route path="/managers" element={<Managers />} />
                 <Route path="/bot-config" element={<BotConfig />} />
                 <Route path="/" element={<Navigate to="/dashboard" replace />} />
               </Route>
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { Button, Statistic, Row, Col, Card, Space } from 'antd';
+import { Button, Statistic, Row, Col, Card, Space, Progress, Select, Empty } from 'antd';
 import {
   ShoppingCartOutlined,
   SettingOutlined,
@@ -14,12 +14,33 @@ const Dashboard = () => {
     new_orders: 0,
     active_orders: 0
   });
+  const [funnel, setFunnel] = useState({ steps: [], series: [] });
+  const [funnelBranch, setFunnelBranch] = useState(null);
+  const [funnelDays, setFunnelDays] = useState(30);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchStats();
   }, []);
 
+  useEffect(() => {
+    fetchFunnel();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [funnelBranch, funnelDays]);
+
+  const fetchFunnel = async () => {
+    try {
+      const params = { days: funnelDays };
+      if (funnelBranch) params.branch = funnelBranch;
+      const response = await axios.get('/api/analytics/funnel', { params });
+      setFunnel(response.data);
+    } catch (error) {
+      console.error('Error fetching funnel:', error);
+    }
+  };
+
+  const funnelTop = funnel.steps.length ? funnel.steps[0].users || 1 : 1;
+
   const fetchStats = async () => {
     try {
       const response = await axios.get('/api/orders/stats');
@@ -65,6 +86,53 @@ const Dashboard = () => {
         </Col>
       </Row>
 
+      <Card
+        title="Воронка по шагам"
+        extra={
+          <Space>
+            <Select
+              value={funnelBranch}
+              onChange={setFunnelBranch}
+              allowClear
+              placeholder="Все направления"
+              style={{ width: 180 }}
+              options={[
+                { value: 'print', label: 'Печать' },
+                { value: 'scan', label: 'Сканирование' },
+                { value: 'idea', label: 'Идея' },
+                { value: 'dialog', label: 'Диалог' },
+              ]}
+            />
+            <Select
+              value={funnelDays}
+              onChange={setFunnelDays}
+              style={{ width: 120 }}
+              options={[7, 30, 90].map((d) => ({ value: d, label: `${d} дней` }))}
+            />
+          </Space>
+        }
+      >
+        {funnel.steps.length === 0 ? (
+          <Empty description="Нет данных" />
+        ) : (
+          funnel.steps.map((s) => (
+            <Row key={s.step} gutter={16} align="middle" style={{ marginBottom: 8 }}>
+              <Col xs={8} md={6}>{s.step}</Col>
+              <Col xs={12} md={15}>
+                <Progress
+                  percent={Math.round(((s.users || 0) * 100) / funnelTop)}
+                  format={() => s.users || 0}
+                />
+              </Col>
+              <Col xs={4} md={3} style={{ color: '#888' }}>
+                {s.back ? `↩ ${s.back}` : ''}
+                {s.submit ? ` ✅ ${s.submit}` : ''}
+              </Col>
+            </Row>
+          ))
+        )}
+      </Card>
+
       <Card title="Быстрые действия" style={{ marginTop: 24 }}>
         <Space wrap>
           <Button
@@ -1,27 +1,43 @@
-import React, { useState, useContext } from 'react';
-import { Layout, Menu, Dropdown, Avatar, message, Spin, Button, Grid } from 'antd';
+import React, { useState, useContext, useEffect } from 'react';
+import { Layout, Menu, Dropdown, Avatar, message, Spin, Button, Grid, Select } from 'antd';
 import {
   DashboardOutlined,
   ShoppingCartOutlined,
   SettingOutlined,
+  TeamOutlined,
   LogoutOutlined,
   UserOutlined,
   MenuFoldOutlined,
   MenuUnfoldOutlined,
 } from '@ant-design/icons';
 import { useNavigate, useLocation, Outlet, Navigate } from 'react-router-dom';
+import axios from 'axios';
 import AuthContext from '../contexts/AuthContext';
 
 const { Header, Content, Sider } = Layout;
 const { useBreakpoint } = Grid;
 
 const MainLayout = () => {
-  const { logout, isAuthenticated, loading } = useContext(AuthContext);
+  const { logout, isAuthenticated, loading, tenant, setTenant } = useContext(AuthContext);
   const navigate = useNavigate();
   const location = useLocation();
   const screens = useBreakpoint();
   const isMobile = !screens.lg;
   const [collapsed, setCollapsed] = useState(isMobile);
+  const [tenants, setTenants] = useState([]);
+
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    axios
+      .get('/api/tenants/')
+      .then(({ data }) => {
+        const list = data.tenants || [];
+        setTenants(list);
+        // Бот мог пропасть из BOT_TOKENS после перезапуска — возвращаемся к основному.
+        if (list.length && !list.includes(tenant)) setTenant(data.default || list[0]);
+      })
+      .catch(() => setTenants([]));
+  }, [isAuthenticated]); // eslint-disable-line react-hooks/exhaustive-deps
 
   if (loading) {
     return (
@@ -44,6 +60,7 @@ const MainLayout = () => {
   const menuItems = [
     { key: '/dashboard', icon: <DashboardOutlined />, label: 'Сводка' },
     { key: '/orders', icon: <ShoppingCartOutlined />, label: 'Заказы' },
+    { key: '/managers', icon: <TeamOutlined />, label: 'Менеджеры' },
     { key: '/bot-config', icon: <SettingOutlined />, label: 'Настройки бота' },
   ];
 
@@ -114,9 +131,19 @@ const MainLayout = () => {
               Панель управления
             </h2>
           </div>
-          <Dropdown menu={{ items: userMenuItems }} placement='bottomRight'>
-            <Avatar style={{ cursor: 'pointer' }} icon={<UserOutlined />} />
-          </Dropdown>
+          <div style={{ display: 'flex', alignItems: 'center', gap: 12 }}>
+            {tenants.length > 1 && (
+              <Select
+                value={tenant}
+                onChange={setTenant}
+                options={tenants.map((t) => ({ value: t, label: t }))}
+                style={{ minWidth: isMobile ? 100 : 160 }}
+              />
+            )}
+            <Dropdown menu={{ items: userMenuItems }} placement='bottomRight'>
+              <Avatar style={{ cursor: 'pointer' }} icon={<UserOutlined />} />
+            </Dropdown>
+          </div>
         </Header>
         <Content
           style={{
@@ -128,7 +155,8 @@ const MainLayout = () => {
             overflowX: 'auto',
           }}
         >
-          <Outlet />
+          {/* Страницы перемонтируются при смене бота и заново загружают его данные. */}
+          <Outlet key={tenant} />
         </Content>
       </Layout>
     </Layout>
@@ -0,0 +1,214 @@
+// frontend/src/components/Managers.js
+import React, { useEffect, useState } from 'react';
+import {
+  Button,
+  Card,
+  Col,
+  Form,
+  Input,
+  InputNumber,
+  message,
+  Modal,
+  Row,
+  Select,
+  Space,
+  Statistic,
+  Switch,
+  Table,
+  Tag,
+} from 'antd';
+import { ClockCircleOutlined, PlusOutlined, SyncOutlined, TeamOutlined } from '@ant-design/icons';
+import axios from 'axios';
+
+const branchOptions = [
+  { value: 'print', label: '3D-печать' },
+  { value: 'scan', label: '3D-сканирование' },
+  { value: 'idea', label: 'Идея' },
+  { value: 'dialog', label: 'Диалог' },
+];
+
+const branchLabel = (value) => (branchOptions.find((o) => o.value === value) || {}).label || value;
+
+// Секунды ожидания -> «5 мин», «2 ч 10 мин».
+const formatWait = (seconds) => {
+  if (seconds === null || seconds === undefined) return '—';
+  const minutes = Math.round(seconds / 60);
+  if (minutes < 60) return `${minutes} мин`;
+  return `${Math.floor(minutes / 60)} ч ${minutes % 60} мин`;
+};
+
+const Managers = () => {
+  const [managers, setManagers] = useState([]);
+  const [queue, setQueue] = useState(null);
+  const [days, setDays] = useState(7);
+  const [loading, setLoading] = useState(false);
+  const [editing, setEditing] = useState(null);
+  const [form] = Form.useForm();
+
+  const fetchData = async () => {
+    setLoading(true);
+    try {
+      const [managersResponse, queueResponse] = await Promise.all([
+        axios.get('/api/managers/'),
+        axios.get('/api/managers/queue', { params: { days } }),
+      ]);
+      setManagers(managersResponse.data.managers || []);
+      setQueue(queueResponse.data);
+    } catch (error) {
+      message.error('Не удалось загрузить менеджеров');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    fetchData();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [days]);
+
+  const openEditor = (manager) => {
+    setEditing(manager || {});
+    form.setFieldsValue(manager || { branches: [], max_in_work: 10, active: true });
+  };
+
+  const saveManager = async (values, successText = 'Менеджер сохранён') => {
+    try {
+      await axios.post('/api/managers/', values);
+      message.success(successText);
+      setEditing(null);
+      fetchData();
+    } catch (error) {
+      message.error(error.response?.data?.detail || 'Не удалось сохранить менеджера');
+    }
+  };
+
+  const columns = [
+    { title: 'Имя', dataIndex: 'name', key: 'name' },
+    { title: 'Telegram ID', dataIndex: 'telegram_user_id', key: 'telegram_user_id' },
+    {
+      title: 'Направления',
+      dataIndex: 'branches',
+      key: 'branches',
+      render: (branches) =>
+        branches.length ? branches.map((b) => <Tag key={b}>{branchLabel(b)}</Tag>) : <Tag color='blue'>Все</Tag>,
+    },
+    {
+      title: 'В работе',
+      key: 'in_work',
+      render: (_, m) => `${m.in_work} / ${m.max_in_work || '∞'}`,
+    },
+    {
+      title: 'Активен',
+      dataIndex: 'active',
+      key: 'active',
+      render: (active, m) => (
+        <Switch
+          checked={active}
+          onChange={(checked) =>
+            saveManager({ ...m, active: checked }, checked ? 'Менеджер включён' : 'Менеджер отключён')
+          }
+        />
+      ),
+    },
+    {
+      title: '',
+      key: 'actions',
+      render: (_, m) => <Button onClick={() => openEditor(m)}>Изменить</Button>,
+    },
+  ];
+
+  return (
+    <div>
+      <h1>👥 Менеджеры</h1>
+
+      <Row gutter={[16, 16]} style={{ marginBottom: 24 }}>
+        <Col xs={24} md={6}>
+          <Card>
+            <Statistic title='Ждут назначения' value={queue?.waiting ?? 0} prefix={<TeamOutlined />} />
+          </Card>
+        </Col>
+        <Col xs={24} md={6}>
+          <Card>
+            <Statistic
+              title='Дольше всех ждёт'
+              value={formatWait(queue?.oldest_wait)}
+              prefix={<ClockCircleOutlined />}
+            />
+          </Card>
+        </Col>
+        <Col xs={24} md={6}>
+          <Card>
+            <Statistic title='Ожидание, медиана' value={formatWait(queue?.wait?.p50)} />
+          </Card>
+        </Col>
+        <Col xs={24} md={6}>
+          <Card>
+            <Statistic title='Ожидание, 90%' value={formatWait(queue?.wait?.p90)} />
+          </Card>
+        </Col>
+      </Row>
+
+      <Card
+        title={`Назначено за ${days} дн.: ${queue?.assigned ?? 0}`}
+        extra={
+          <Space>
+            <Select
+              value={days}
+              onChange={setDays}
+              style={{ width: 120 }}
+              options={[1, 7, 30].map((d) => ({ value: d, label: `${d} дней` }))}
+            />
+            <Button icon={<SyncOutlined />} onClick={fetchData} />
+            <Button type='primary' icon={<PlusOutlined />} onClick={() => openEditor(null)}>
+              Добавить
+            </Button>
+          </Space>
+        }
+      >
+        {queue?.branches?.length > 0 && (
+          <Space wrap style={{ marginBottom: 16 }}>
+            {queue.branches.map((b) => (
+              <Tag key={b.branch} color='orange'>
+                {branchLabel(b.branch)}: {b.waiting} в очереди, до {formatWait(b.oldest_wait)}
+              </Tag>
+            ))}
+          </Space>
+        )}
+        <Table rowKey='id' columns={columns} dataSource={managers} loading={loading} pagination={false} />
+      </Card>
+
+      <Modal
+        title={editing?.id ? 'Менеджер' : 'Новый менеджер'}
+        open={editing !== null}
+        onCancel={() => setEditing(null)}
+        onOk={() => form.submit()}
+        okText='Сохранить'
+        destroyOnClose
+      >
+        <Form form={form} layout='vertical' onFinish={(values) => saveManager(values)}>
+          <Form.Item label='Имя' name='name' rules={[{ required: true, message: 'Укажите имя' }]}>
+            <Input />
+          </Form.Item>
+          <Form.Item
+            label='Telegram ID (менеджер должен нажать «Старт» в боте)'
+            name='telegram_user_id'
+            rules={[{ required: true, message: 'Укажите Telegram ID' }]}
+          >
+            <InputNumber style={{ width: '100%' }} disabled={Boolean(editing?.id)} />
+          </Form.Item>
+          <Form.Item label='Направления (пусто — все)' name='branches'>
+            <Select mode='multiple' options={branchOptions} allowClear />
+          </Form.Item>
+          <Form.Item label='Лимит заявок в работе (0 — без лимита)' name='max_in_work'>
+            <InputNumber min={0} style={{ width: '100%' }} />
+          </Form.Item>
+          <Form.Item label='Активен' name='active' valuePropName='checked'>
+            <Switch />
+          </Form.Item>
+        </Form>
+      </Modal>
+    </div>
+  );
+};
+
+export default Managers;
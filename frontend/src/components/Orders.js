@@ -1,5 +1,5 @@
 // frontend/src/components/Orders.js
-import React, { useCallback, useEffect, useMemo, useState } from 'react';
+import React, { useCallback, useEffect, useMemo, useRef, useState } from 'react';
 import {
   Badge,
   Button,
@@ -52,6 +52,8 @@ const keyLabels = {
   description: 'Описание',
 };
 
+const facetFields = ['technology', 'material', 'scan_type', 'idea_type'];
+
 const valueLabels = {
   branch: {
     print: '3D-печать',
@@ -82,26 +84,43 @@ const Orders = () => {
   const [stats, setStats] = useState({ total_orders: 0, new_orders: 0, active_orders: 0 });
   const [loading, setLoading] = useState(false);
   const [statusFilter, setStatusFilter] = useState();
+  const [facetFilters, setFacetFilters] = useState({});
+  const [facets, setFacets] = useState({});
   const [selectedOrder, setSelectedOrder] = useState(null);
   const [modalVisible, setModalVisible] = useState(false);
   const [files, setFiles] = useState([]);
   const [chatMessages, setChatMessages] = useState([]);
   const [sending, setSending] = useState(false);
   const [chatLoading, setChatLoading] = useState(false);
+  const [chatHasMore, setChatHasMore] = useState(false);
+  const chatEtag = useRef(null);
   const screens = useBreakpoint();
   const isMobile = !screens.md;
 
   const fetchOrders = useCallback(async () => {
     setLoading(true);
     try {
-      const { data } = await axios.get('/api/orders/', { params: { status_filter: statusFilter } });
+      const { data } = await axios.get('/api/orders/', { params: { status_filter: statusFilter, ...facetFilters } });
       setOrders(Array.isArray(data) ? data : []);
     } catch {
       message.error('Не удалось загрузить заявки');
     } finally {
       setLoading(false);
     }
-  }, [statusFilter]);
+  }, [statusFilter, facetFilters]);
+
+  const fetchFacets = useCallback(async () => {
+    try {
+      const { data } = await axios.get('/api/orders/facets', { params: { status_filter: statusFilter, ...facetFilters } });
+      setFacets(data || {});
+    } catch {
+      setFacets({});
+    }
+  }, [statusFilter, facetFilters]);
+
+  const setFacetFilter = (field, value) => {
+    setFacetFilters((prev) => ({ ...prev, [field]: value }));
+  };
 
   const fetchStats = useCallback(async () => {
     try {
@@ -117,26 +136,78 @@ const Orders = () => {
     if (!orderId) return;
     setChatLoading(true);
     try {
-      const [filesResp, msgResp] = await Promise.all([
-        axios.get(`/api/orders/${orderId}/files`),
-        axios.get(`/api/orders/${orderId}/messages`),
-      ]);
-      setFiles(filesResp?.data?.files || []);
-      setChatMessages(msgResp?.data?.messages || []);
+      const { data } = await axios.get(`/api/orders/${orderId}/detail`);
+      setFiles(data?.files || []);
+      setChatMessages(data?.messages || []);
+      setChatHasMore(Boolean(data?.has_more));
+      chatEtag.current = data?.messages_etag || null;
     } catch {
       setFiles([]);
       setChatMessages([]);
+      setChatHasMore(false);
+      chatEtag.current = null;
       message.warning('Не удалось загрузить файлы или чат по заявке');
     } finally {
       setChatLoading(false);
     }
   }, []);
 
+  const refreshChat = useCallback(
+    async (orderId, silent = false) => {
+      if (!orderId) return;
+      if (!silent) setChatLoading(true);
+      try {
+        const lastId = chatMessages.length ? chatMessages[chatMessages.length - 1].id : undefined;
+        const resp = await axios.get(`/api/orders/${orderId}/messages`, {
+          params: { after_id: lastId },
+          headers: chatEtag.current ? { 'If-None-Match': chatEtag.current } : {},
+          validateStatus: (s) => (s >= 200 && s < 300) || s === 304,
+        });
+        if (resp.status === 304) return;
+        chatEtag.current = resp.headers?.etag || null;
+        const fresh = resp.data?.messages || [];
+        if (fresh.length) setChatMessages((prev) => [...prev, ...fresh]);
+      } catch {
+        if (!silent) message.warning('Не удалось обновить чат по заявке');
+      } finally {
+        if (!silent) setChatLoading(false);
+      }
+    },
+    [chatMessages],
+  );
+
+  const loadOlderMessages = async () => {
+    if (!selectedOrder || !chatMessages.length) return;
+    setChatLoading(true);
+    try {
+      const { data } = await axios.get(`/api/orders/${selectedOrder.id}/messages`, {
+        params: { before_id: chatMessages[0].id },
+      });
+      setChatMessages((prev) => [...(data?.messages || []), ...prev]);
+      setChatHasMore(Boolean(data?.has_more));
+    } catch {
+      message.warning('Не удалось загрузить историю чата');
+    } finally {
+      setChatLoading(false);
+    }
+  };
+
   useEffect(() => {
     fetchOrders();
     fetchStats();
   }, [fetchOrders, fetchStats]);
 
+  useEffect(() => {
+    fetchFacets();
+  }, [fetchFacets]);
+
+  useEffect(() => {
+    if (!modalVisible || !selectedOrder) return undefined;
+    // Unchanged chats answer 304, so polling stays cheap.
+    const timer = setInterval(() => refreshChat(selectedOrder.id, true), 10000);
+    return () => clearInterval(timer);
+  }, [modalVisible, selectedOrder, refreshChat]);
+
   const openOrder = async (order) => {
     setSelectedOrder(order);
     setModalVisible(true);
@@ -152,7 +223,7 @@ const Orders = () => {
     try {
       await axios.post(`/api/orders/${selectedOrder.id}/messages`, { text });
       message.success('Сообщение отправлено в Telegram');
-      await fetchOrderDetails(selectedOrder.id);
+      await refreshChat(selectedOrder.id);
     } catch (err) {
       message.error(err?.response?.data?.detail || 'Не удалось отправить сообщение в Telegram');
     } finally {
@@ -196,7 +267,8 @@ const Orders = () => {
   const parsedPayload = useMemo(() => {
     if (!selectedOrder) return {};
     try {
-      const payload = JSON.parse(selectedOrder.order_payload || '{}');
+      const raw = selectedOrder.order_payload;
+      const payload = typeof raw === 'string' ? JSON.parse(raw || '{}') : raw || {};
       return payload && typeof payload === 'object' ? payload : {};
     } catch {
       return {};
@@ -234,10 +306,27 @@ const Orders = () => {
             </Option>
           ))}
         </Select>
+        {facetFields.map((field) => (
+          <Select
+            key={field}
+            allowClear
+            placeholder={keyLabels[field]}
+            value={facetFilters[field]}
+            style={{ width: isMobile ? '100%' : 200 }}
+            onChange={(v) => setFacetFilter(field, v)}
+          >
+            {(facets[field] || []).map((f) => (
+              <Option key={f.value} value={f.value}>
+                {f.value} ({f.count})
+              </Option>
+            ))}
+          </Select>
+        ))}
         <Button
           onClick={() => {
             fetchOrders();
             fetchStats();
+            fetchFacets();
           }}
         >
           Обновить
@@ -286,7 +375,24 @@ const Orders = () => {
                 return (
                   <div key={f.id} style={{ marginBottom: 10 }}>
                     <div style={{ marginBottom: 6 }}>{fileName}</div>
-                    {canLoad && isImage && <Image src={f.file_url} alt={fileName} style={{ maxWidth: '100%' }} />}
+                    {f.mesh_stats && (
+                      <div style={{ marginBottom: 6, color: '#888' }}>
+                        📐 {(f.mesh_stats.bbox_mm || []).join(' × ')} мм · {f.mesh_stats.triangles} треуг. ·{' '}
+                        {f.mesh_stats.volume_cm3} см³ ≈ {f.mesh_stats.grams} г
+                      </div>
+                    )}
+                    {canLoad && isImage && (
+                      <Image
+                        src={f.preview_url || f.file_url}
+                        preview={{ src: f.file_url }}
+                        alt={fileName}
+                        loading='lazy'
+                        style={{ maxWidth: '100%' }}
+                      />
+                    )}
+                    {!isImage && f.preview_url && (
+                      <Image src={f.preview_url} alt={fileName} loading='lazy' width={240} style={{ display: 'block' }} />
+                    )}
                     {canLoad && !isImage && (
                       <Button type='link' href={f.file_url} target='_blank' rel='noopener noreferrer' download={fileName}>
                         Скачать файл
@@ -299,12 +405,17 @@ const Orders = () => {
 
               <Space align='center' style={{ marginTop: 16, marginBottom: 8 }}>
                 <h3 style={{ margin: 0 }}>Чат с клиентом</h3>
-                <Button size='small' onClick={() => fetchOrderDetails(selectedOrder.id)} loading={chatLoading}>
+                <Button size='small' onClick={() => refreshChat(selectedOrder.id)} loading={chatLoading}>
                   Обновить
                 </Button>
               </Space>
 
               <div style={{ maxHeight: 250, overflow: 'auto', border: '1px solid #eee', padding: 8, marginBottom: 8 }}>
+                {chatHasMore && (
+                  <Button type='link' size='small' onClick={loadOlderMessages} loading={chatLoading}>
+                    Показать более ранние
+                  </Button>
+                )}
                 {chatMessages.map((m) => (
                   <p key={m.id}>
                     <b>{m.direction === 'out' ? 'Менеджер' : 'Клиент'}:</b> {m.message_text || m.text || ''}
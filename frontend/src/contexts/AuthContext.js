@@ -6,9 +6,14 @@ import axios from 'axios';
 
 const AuthContext = createContext();
 
+// Бот (тенант), данные которого показывает панель; уходит в каждый запрос заголовком X-Tenant.
+const TENANT_KEY = 'admin_tenant';
+const DEFAULT_TENANT = 'default';
+
 export const AuthProvider = ({ children }) => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [loading, setLoading] = useState(true);
+  const [tenant, setTenantState] = useState(() => localStorage.getItem(TENANT_KEY) || DEFAULT_TENANT);
 
   useEffect(() => {
     // Проверка токена при загрузке
@@ -20,6 +25,16 @@ export const AuthProvider = ({ children }) => {
     setLoading(false);
   }, []);
 
+  useEffect(() => {
+    axios.defaults.headers.common['X-Tenant'] = tenant;
+  }, [tenant]);
+
+  const setTenant = (value) => {
+    localStorage.setItem(TENANT_KEY, value);
+    axios.defaults.headers.common['X-Tenant'] = value;
+    setTenantState(value);
+  };
+
   const login = async (password) => {
     try {
       const response = await axios.post('/api/auth/login', { password });
@@ -40,7 +55,7 @@ export const AuthProvider = ({ children }) => {
   };
 
   return (
-    <AuthContext.Provider value={{ isAuthenticated, login, logout, loading }}>
+    <AuthContext.Provider value={{ isAuthenticated, login, logout, loading, tenant, setTenant }}>
       {children}
     </AuthContext.Provider>
   );
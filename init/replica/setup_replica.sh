@@ -0,0 +1,32 @@
+#!/bin/sh
+# One-shot: seed mysql-replica from a dump of the primary and start GTID replication.
+# Used by docker-compose.replica.yml; safe to re-run (exits if already configured).
+set -eu
+
+PRIMARY_HOST="${PRIMARY_HOST:-mysql}"
+REPLICA_HOST="${REPLICA_HOST:-mysql-replica}"
+export MYSQL_PWD="$MYSQL_ROOT_PASSWORD"
+
+if mysql -h"$REPLICA_HOST" -uroot -N -e "SHOW REPLICA STATUS" | grep -q .; then
+  echo "Replica already configured"
+  exit 0
+fi
+
+# The app user runs SHOW REPLICA STATUS to measure lag.
+mysql -h"$REPLICA_HOST" -uroot -e "GRANT REPLICATION CLIENT ON *.* TO '${MYSQL_USER}'@'%'"
+
+mysql -h"$REPLICA_HOST" -uroot -e "RESET MASTER"
+mysqldump -h"$PRIMARY_HOST" -uroot --single-transaction --set-gtid-purged=ON --triggers --routines \
+  --databases "$MYSQL_DB" | mysql -h"$REPLICA_HOST" -uroot
+
+mysql -h"$REPLICA_HOST" -uroot -e "
+  CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST='${PRIMARY_HOST}',
+    SOURCE_USER='root',
+    SOURCE_PASSWORD='${MYSQL_ROOT_PASSWORD}',
+    SOURCE_AUTO_POSITION=1,
+    GET_SOURCE_PUBLIC_KEY=1;
+  START REPLICA;
+  SET GLOBAL super_read_only=ON;
+"
+echo "Replica started"
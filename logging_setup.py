@@ -0,0 +1,185 @@
+"""Non-blocking logging shared by the bot and the backend.
+
+Log calls only put the record on an in-memory queue; a QueueListener thread
+formats it (tracebacks included) and writes it to stderr, as JSON lines by
+default. Repeated identical exceptions are rate-limited and sampled before
+they reach the queue, and every record carries the correlation id bound for
+the current update or HTTP request (see bind_correlation_id()).
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from config import settings
+
+QUEUE_SIZE = 10_000
+# Per call site and exception type: the first EXCEPTION_BURST records of a
+# window go through in full, after that one in EXCEPTION_SAMPLE_EVERY.
+EXCEPTION_BURST = 5
+EXCEPTION_WINDOW_SECONDS = 60.0
+EXCEPTION_SAMPLE_EVERY = 100
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"
+
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+
+def bind_correlation_id(value: str) -> None:
+    """Tag every record logged from the current task (and tasks it starts) with `value`."""
+    correlation_id.set(value)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the correlation id onto the record; runs in the caller's thread, before the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class ExceptionSampler(logging.Filter):
+    """Rate-limit records with a traceback that repeat from the same place.
+
+    Identity is the call site plus the exception type, so an outage that
+    fails every update costs a dict lookup per call instead of a rendered
+    traceback. Passed records carry `suppressed`: how many were dropped
+    since the previous one.
+    """
+
+    def __init__(
+        self,
+        burst: int = EXCEPTION_BURST,
+        window: float = EXCEPTION_WINDOW_SECONDS,
+        sample_every: int = EXCEPTION_SAMPLE_EVERY,
+    ) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample_every = sample_every
+        # key -> [window start, seen in window, dropped since last passed]
+        self._state: dict[tuple, list] = {}
+        # Worker threads (asyncio.to_thread) log too.
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.exc_info or record.exc_info[0] is None:
+            return True
+        key = (record.name, record.pathname, record.lineno, record.exc_info[0])
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                state = self._state[key] = [now, 0, state[2] if state else 0]
+            state[1] += 1
+            if state[1] <= self.burst or state[1] % self.sample_every == 0:
+                record.suppressed = state[2]
+                state[2] = 0
+                return True
+            state[2] += 1
+            return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and leaves the traceback to the writer thread.
+
+    The stock prepare() renders exc_info in the calling thread to make the
+    record picklable; an in-process queue does not need that. When the queue
+    is full records are dropped and counted instead of waiting.
+    """
+
+    def __init__(self, q: queue.Queue) -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now: they may be mutated after the call returns.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Called under the handler lock, so the counter needs no extra locking.
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self._dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _dropped_record(self) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Очередь логов переполнена, пропущено записей: {self.dropped}",
+                "correlation_id": "-",
+            }
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str) -> None:
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        cid = getattr(record, "correlation_id", "-")
+        if cid != "-":
+            entry["correlation_id"] = cid
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(service: str, capture: tuple[str, ...] = ()) -> QueueListener:
+    """Route the root logger through the queue; `capture` re-parents loggers with their own handlers."""
+    writer = logging.StreamHandler(sys.stderr)
+    if settings.log_format == "json":
+        writer.setFormatter(JsonFormatter(service))
+    else:
+        writer.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records: queue.Queue = queue.Queue(QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(ExceptionSampler())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level)
+    for name in capture:
+        captured = logging.getLogger(name)
+        captured.handlers.clear()
+        captured.propagate = True
+
+    listener = QueueListener(records, writer)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: QueueListener) -> None:
+    # Flush what is still queued on interpreter exit; stop() is not idempotent before 3.12.
+    if listener._thread is not None:
+        listener.stop()
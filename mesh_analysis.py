@@ -0,0 +1,187 @@
+"""Geometry stats for uploaded STL/OBJ/3MF models.
+
+Everything here is CPU-bound and runs inside a ProcessPoolExecutor worker
+(see bot.analyze_mesh_file), so it must stay importable without aiogram/DB.
+STL and OBJ carry no units and are assumed to be in millimetres.
+"""
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+MESH_EXTENSIONS: tuple[str, ...] = (".stl", ".obj", ".3mf")
+
+# Triangles processed per vectorized pass; bounds peak memory on huge meshes.
+CHUNK_TRIANGLES = 1_000_000
+
+# g/cm³ for the materials offered in the bot (step_keyboard_for_print).
+MATERIAL_DENSITY: dict[str, float] = {
+    "PLA": 1.24,
+    "PET-G": 1.27,
+    "PET-G Carbon": 1.30,
+    "TPU": 1.21,
+    "Нейлон": 1.14,
+    "Стандартная": 1.15,
+    "ABS-Like": 1.12,
+    "TPU-Like": 1.10,
+    "Нейлон-Like": 1.15,
+}
+DEFAULT_DENSITY = 1.20
+
+_STL_RECORD = np.dtype([("normal", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+
+
+class MeshError(ValueError):
+    pass
+
+
+def _binary_stl_count(path: Path) -> int | None:
+    """Triangle count if the file is a well-formed binary STL, else None."""
+    size = path.stat().st_size
+    if size < 84:
+        return None
+    with path.open("rb") as f:
+        f.seek(80)
+        count = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+    return count if size == 84 + count * _STL_RECORD.itemsize else None
+
+
+def load_stl(path: Path) -> np.ndarray:
+    """(N, 3, 3) float32 triangles; binary files are memory-mapped, not read."""
+    count = _binary_stl_count(path)
+    if count is not None:
+        if count == 0:
+            return np.empty((0, 3, 3), dtype=np.float32)
+        return np.memmap(path, dtype=_STL_RECORD, mode="r", offset=84, shape=(count,))["v"]
+
+    coords: list[bytes] = []
+    with path.open("rb") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b"vertex"):
+                coords.append(line[6:])
+    if not coords:
+        raise MeshError("STL не содержит треугольников")
+    flat = np.array(b" ".join(coords).split(), dtype=np.float64)
+    if flat.size % 9:
+        raise MeshError("Повреждённый ASCII STL")
+    return flat.reshape(-1, 3, 3)
+
+
+def _faces_to_triangles(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    if faces.size and (faces.min() < 0 or faces.max() >= len(vertices)):
+        raise MeshError("Индекс вершины вне диапазона")
+    return vertices[faces]
+
+
+def load_obj(path: Path) -> np.ndarray:
+    vertices: list[bytes] = []
+    faces: list[tuple[int, int, int]] = []
+    with path.open("rb") as f:
+        for line in f:
+            if line.startswith(b"v "):
+                vertices.append(line[2:])
+            elif line.startswith(b"f "):
+                nv = len(vertices)
+                idx = []
+                for token in line[2:].split():
+                    i = int(token.split(b"/", 1)[0])
+                    # OBJ indices are 1-based; negative ones count from the end.
+                    idx.append(i - 1 if i > 0 else nv + i)
+                # Fan-triangulate quads and n-gons.
+                for k in range(1, len(idx) - 1):
+                    faces.append((idx[0], idx[k], idx[k + 1]))
+    if not vertices or not faces:
+        raise MeshError("OBJ не содержит граней")
+    verts = np.array(b" ".join(b" ".join(v.split()[:3]) for v in vertices).split(), dtype=np.float64)
+    verts = verts.reshape(-1, 3)
+    return _faces_to_triangles(verts, np.asarray(faces, dtype=np.int64))
+
+
+_3MF_UNITS = {"micron": 0.001, "millimeter": 1.0, "centimeter": 10.0, "inch": 25.4, "foot": 304.8, "meter": 1000.0}
+
+
+def load_3mf(path: Path) -> np.ndarray:
+    """Triangles of every <mesh> in the package; build-item transforms are ignored."""
+    parts: list[np.ndarray] = []
+    with zipfile.ZipFile(path) as zf:
+        models = [n for n in zf.namelist() if n.lower().endswith(".model")]
+        if not models:
+            raise MeshError("3MF без 3D-модели")
+        for name in models:
+            first = len(parts)
+            scale = 1.0
+            verts: list[tuple[str, str, str]] = []
+            tris: list[tuple[str, str, str]] = []
+            with zf.open(name) as f:
+                for _, elem in ET.iterparse(f, events=("end",)):
+                    tag = elem.tag.rsplit("}", 1)[-1]
+                    if tag == "vertex":
+                        verts.append((elem.get("x", "0"), elem.get("y", "0"), elem.get("z", "0")))
+                    elif tag == "triangle":
+                        tris.append((elem.get("v1", "0"), elem.get("v2", "0"), elem.get("v3", "0")))
+                    elif tag == "mesh":
+                        if verts and tris:
+                            parts.append(
+                                _faces_to_triangles(np.array(verts, dtype=np.float64), np.array(tris, dtype=np.int64))
+                            )
+                        verts, tris = [], []
+                    elif tag == "model":
+                        scale = _3MF_UNITS.get(elem.get("unit", "millimeter"), 1.0)
+                    elem.clear()
+            if scale != 1.0:
+                for i in range(first, len(parts)):
+                    parts[i] = parts[i] * scale
+    if not parts:
+        raise MeshError("3MF не содержит треугольников")
+    return np.concatenate(parts)
+
+
+LOADERS = {".stl": load_stl, ".obj": load_obj, ".3mf": load_3mf}
+
+
+def mesh_stats(triangles: np.ndarray) -> dict[str, Any]:
+    """Vectorized triangle count, bounding box, surface area and enclosed volume."""
+    count = int(len(triangles))
+    if not count:
+        raise MeshError("Пустая модель")
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    area = 0.0
+    volume = 0.0
+    for start in range(0, count, CHUNK_TRIANGLES):
+        chunk = np.asarray(triangles[start : start + CHUNK_TRIANGLES], dtype=np.float64)
+        pts = chunk.reshape(-1, 3)
+        lo = np.minimum(lo, pts.min(axis=0))
+        hi = np.maximum(hi, pts.max(axis=0))
+        v0, v1, v2 = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        cross = np.cross(v1 - v0, v2 - v0)
+        area += 0.5 * float(np.linalg.norm(cross, axis=1).sum())
+        # Signed tetrahedron volumes against the origin (divergence theorem).
+        volume += float(np.einsum("ij,ij->i", v0, np.cross(v1, v2)).sum()) / 6.0
+    size = hi - lo
+    return {
+        "triangles": count,
+        "bbox_mm": [round(float(x), 2) for x in size],
+        "area_mm2": round(area, 2),
+        # Inverted normals give a negative volume; the magnitude is still right.
+        "volume_cm3": round(abs(volume) / 1000.0, 3),
+    }
+
+
+def analyze_mesh(path: str, material: str | None = None) -> dict[str, Any]:
+    """Entry point for the process pool: load a model file and return JSON-ready stats."""
+    p = Path(path)
+    loader = LOADERS.get(p.suffix.lower())
+    if loader is None:
+        raise MeshError(f"Неподдерживаемый формат: {p.suffix}")
+    stats = mesh_stats(loader(p))
+    density = MATERIAL_DENSITY.get(material or "", DEFAULT_DENSITY)
+    stats["format"] = p.suffix.lower().lstrip(".")
+    stats["material"] = material or None
+    stats["density_g_cm3"] = density
+    # Solid (100% infill) estimate; the manager adjusts for infill/supports.
+    stats["grams"] = round(stats["volume_cm3"] * density, 1)
+    return stats
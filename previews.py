@@ -0,0 +1,143 @@
+"""Small WebP previews for order attachments.
+
+Photos are downscaled; STL/OBJ/3MF models get a headless orthographic depth
+render. Like mesh_analysis, this runs inside the bot's process pool and must
+not import aiogram or the DB layer.
+"""
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+import mesh_analysis
+
+PREVIEW_SIZE = 480
+WEBP_QUALITY = 75
+IMAGE_EXTENSIONS: tuple[str, ...] = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+# Upper bound on surface samples for one render; large meshes are already
+# denser than the pixel grid, so only small triangles get subdivided.
+MAX_SAMPLES = 4_000_000
+MAX_SUBDIVISIONS = 32
+
+# Camera 35° above the horizon and 45° around Z (model Z is "up"), similar
+# to slicer default views. Screen axes are x/y; larger z is closer.
+_PITCH = np.radians(-55.0)
+_YAW = np.radians(45.0)
+_ROTATION = np.array(
+    [[1, 0, 0], [0, np.cos(_PITCH), -np.sin(_PITCH)], [0, np.sin(_PITCH), np.cos(_PITCH)]]
+) @ np.array([[np.cos(_YAW), -np.sin(_YAW), 0], [np.sin(_YAW), np.cos(_YAW), 0], [0, 0, 1]])
+_LIGHT = np.array([0.3, 0.5, 0.8]) / np.linalg.norm([0.3, 0.5, 0.8])
+
+
+def preview_name(order_id: int, file_unique_id: str) -> str:
+    return f"{order_id}_{file_unique_id}.webp"
+
+
+def preview_kind(path: Path) -> str | None:
+    suffix = path.suffix.lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return "image"
+    if suffix in mesh_analysis.MESH_EXTENSIONS:
+        return "mesh"
+    return None
+
+
+def image_thumbnail(src: str, dst: str, size: int = PREVIEW_SIZE) -> None:
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size))
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        _save_webp(im, dst)
+
+
+def _sample_surface(tri: np.ndarray, px_scale: float) -> tuple[np.ndarray, np.ndarray]:
+    """Barycentric samples per triangle, denser for triangles larger than a pixel."""
+    edge = np.maximum(
+        np.linalg.norm(tri[:, 1, :2] - tri[:, 0, :2], axis=1),
+        np.linalg.norm(tri[:, 2, :2] - tri[:, 0, :2], axis=1),
+    )
+    steps = np.clip(np.ceil(edge * px_scale), 1, MAX_SUBDIVISIONS).astype(np.int64)
+    points: list[np.ndarray] = []
+    owners: list[np.ndarray] = []
+    budget = MAX_SAMPLES
+    for k in np.unique(steps):
+        idx = np.nonzero(steps == k)[0]
+        i, j = np.meshgrid(np.arange(k + 1), np.arange(k + 1), indexing="ij")
+        keep = i + j <= k
+        bary = np.stack([k - i[keep] - j[keep], i[keep], j[keep]], axis=1) / k
+        per_tri = len(bary)
+        if len(idx) * per_tri > budget:
+            idx = idx[: max(1, budget // per_tri)]
+        budget -= len(idx) * per_tri
+        pts = np.einsum("sk,tkd->tsd", bary, tri[idx]).reshape(-1, 3)
+        points.append(pts)
+        owners.append(np.repeat(idx, per_tri))
+        if budget <= 0:
+            break
+    return np.concatenate(points), np.concatenate(owners)
+
+
+def mesh_render(src: str, dst: str, size: int = PREVIEW_SIZE) -> None:
+    """Orthographic z-buffered render of the model, shaded by face normal and depth."""
+    path = Path(src)
+    # Binary STL comes back as a float32 memmap: stride it before converting, so only
+    # the sampled faces are read into memory and widened to float64.
+    faces = mesh_analysis.LOADERS[path.suffix.lower()](path)
+    if not len(faces):
+        raise mesh_analysis.MeshError("Пустая модель")
+    # Keep the render bounded on huge meshes: a few million faces is plenty for 480px.
+    if len(faces) > MAX_SAMPLES:
+        faces = faces[:: int(np.ceil(len(faces) / MAX_SAMPLES))]
+    tri = np.asarray(faces, dtype=np.float64) @ _ROTATION.T
+
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+    # Two-sided lighting: STL normals/winding are often inconsistent.
+    shade = 0.25 + 0.75 * np.abs(normals @ _LIGHT)
+
+    flat = tri.reshape(-1, 3)
+    lo, hi = flat.min(axis=0), flat.max(axis=0)
+    extent = float(max(hi[0] - lo[0], hi[1] - lo[1])) or 1.0
+    margin = 0.05 * size
+    px_scale = (size - 2 * margin) / extent
+
+    points, owner = _sample_surface(tri, px_scale)
+    x = ((points[:, 0] - lo[0]) * px_scale + margin).astype(np.int64)
+    y = (size - 1 - ((points[:, 1] - lo[1]) * px_scale + margin)).astype(np.int64)
+    np.clip(x, 0, size - 1, out=x)
+    np.clip(y, 0, size - 1, out=y)
+
+    # Z-buffer: per pixel keep the nearest sample (largest z).
+    pixel = y * size + x
+    order = np.lexsort((points[:, 2], pixel))
+    pixel = pixel[order]
+    nearest = order[np.r_[pixel[1:] != pixel[:-1], True]]
+    depth_span = float(hi[2] - lo[2]) or 1.0
+    depth = 0.6 + 0.4 * (points[nearest, 2] - lo[2]) / depth_span
+    image = np.full(size * size, 255, dtype=np.uint8)
+    image[y[nearest] * size + x[nearest]] = np.clip(255 * shade[owner[nearest]] * depth, 0, 255).astype(np.uint8)
+    image = image.reshape(size, size)
+
+    _save_webp(Image.fromarray(image), dst)
+
+
+def _save_webp(im: Image.Image, dst: str) -> None:
+    # Write-then-rename so the API never serves a half-written file.
+    tmp = Path(dst).with_suffix(".tmp")
+    im.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+    tmp.replace(dst)
+
+
+def build_preview(src: str, dst: str) -> bool:
+    """Entry point for the process pool; returns False for unsupported files."""
+    kind = preview_kind(Path(src))
+    if kind == "image":
+        image_thumbnail(src, dst)
+    elif kind == "mesh":
+        mesh_render(src, dst)
+    else:
+        return False
+    return True
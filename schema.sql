@@ -1,5 +1,6 @@
 CREATE TABLE IF NOT EXISTS orders (
   id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
   user_id BIGINT NOT NULL,
   username VARCHAR(255) NULL,
   full_name VARCHAR(255) NULL,
@@ -7,25 +8,38 @@ CREATE TABLE IF NOT EXISTS orders (
   status ENUM('draft','new','in_work','done','canceled') NOT NULL DEFAULT 'draft',
   summary TEXT NULL,
   order_payload JSON NULL,
+  technology VARCHAR(128) GENERATED ALWAYS AS (LEFT(order_payload->>'$.technology', 128)) STORED,
+  material VARCHAR(128) GENERATED ALWAYS AS (LEFT(order_payload->>'$.material', 128)) STORED,
+  scan_type VARCHAR(128) GENERATED ALWAYS AS (LEFT(order_payload->>'$.scan_type', 128)) STORED,
+  idea_type VARCHAR(128) GENERATED ALWAYS AS (LEFT(order_payload->>'$.idea_type', 128)) STORED,
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
   KEY idx_orders_user_status (user_id, status),
-  KEY idx_orders_status_created (status, created_at)
+  KEY idx_orders_tenant_user (tenant, user_id, status),
+  KEY idx_orders_tenant_created (tenant, created_at),
+  KEY idx_orders_status_created (status, created_at),
+  KEY idx_orders_technology (technology, created_at),
+  KEY idx_orders_material (material, created_at),
+  KEY idx_orders_scan_type (scan_type, created_at),
+  KEY idx_orders_idea_type (idea_type, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 CREATE TABLE IF NOT EXISTS order_files (
   id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
   order_id BIGINT UNSIGNED NOT NULL,
   telegram_file_id VARCHAR(255) NOT NULL,
+  file_unique_id VARCHAR(255) NULL,
   telegram_message_id BIGINT NULL,
   original_name VARCHAR(255) NOT NULL,
   mime_type VARCHAR(255) NULL,
   file_size BIGINT NULL,
   local_path VARCHAR(512) NULL,
+  mesh_stats JSON NULL,
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
   KEY idx_order_files_order (order_id),
+  UNIQUE KEY uq_order_files_unique (order_id, file_unique_id),
   CONSTRAINT fk_order_files_order FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -38,14 +52,162 @@ CREATE TABLE IF NOT EXISTS order_messages (
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
   KEY idx_order_messages_order (order_id, created_at),
+  KEY idx_order_messages_order_id (order_id, id),
+  UNIQUE KEY uq_order_messages_tg (order_id, direction, telegram_message_id),
+  KEY idx_order_messages_tg (telegram_message_id),
   CONSTRAINT fk_order_messages_order FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+CREATE TABLE IF NOT EXISTS order_outbox (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  order_id BIGINT UNSIGNED NOT NULL,
+  event_type VARCHAR(64) NOT NULL,
+  payload JSON NULL,
+  status ENUM('pending','sent','failed') NOT NULL DEFAULT 'pending',
+  attempts INT UNSIGNED NOT NULL DEFAULT 0,
+  next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  last_error VARCHAR(512) NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  sent_at DATETIME NULL,
+  PRIMARY KEY (id),
+  KEY idx_order_outbox_due (status, next_attempt_at),
+  KEY idx_order_outbox_order (order_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS managers (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  telegram_user_id BIGINT NOT NULL,
+  name VARCHAR(255) NOT NULL,
+  branches VARCHAR(255) NOT NULL DEFAULT '',
+  max_in_work INT UNSIGNED NOT NULL DEFAULT 10,
+  active TINYINT(1) NOT NULL DEFAULT 1,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id),
+  UNIQUE KEY uq_managers_tenant_user (tenant, telegram_user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS order_queue (
+  order_id BIGINT UNSIGNED NOT NULL,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  branch VARCHAR(64) NOT NULL,
+  status ENUM('waiting','assigned','closed') NOT NULL DEFAULT 'waiting',
+  manager_id BIGINT UNSIGNED NULL,
+  enqueued_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  checked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  assigned_at DATETIME NULL,
+  PRIMARY KEY (order_id),
+  KEY idx_order_queue_claim (status, checked_at),
+  KEY idx_order_queue_manager (manager_id, status),
+  KEY idx_order_queue_assigned (tenant, assigned_at),
+  CONSTRAINT fk_order_queue_order FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS funnel_events (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  user_id BIGINT NOT NULL,
+  order_id BIGINT UNSIGNED NULL,
+  branch VARCHAR(64) NOT NULL DEFAULT '',
+  step VARCHAR(64) NOT NULL,
+  action VARCHAR(16) NOT NULL,
+  created_at DATETIME(3) NOT NULL,
+  PRIMARY KEY (id),
+  KEY idx_funnel_events_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS funnel_daily (
+  day DATE NOT NULL,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  branch VARCHAR(64) NOT NULL,
+  step VARCHAR(64) NOT NULL,
+  action VARCHAR(16) NOT NULL,
+  events INT UNSIGNED NOT NULL DEFAULT 0,
+  users INT UNSIGNED NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, tenant, branch, step, action)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+  id BIGINT UNSIGNED NOT NULL,
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
+  user_id BIGINT NOT NULL,
+  username VARCHAR(255) NULL,
+  full_name VARCHAR(255) NULL,
+  branch VARCHAR(64) NOT NULL,
+  status ENUM('draft','new','in_work','done','canceled') NOT NULL,
+  summary TEXT NULL,
+  order_payload JSON NULL,
+  technology VARCHAR(128) NULL,
+  material VARCHAR(128) NULL,
+  scan_type VARCHAR(128) NULL,
+  idea_type VARCHAR(128) NULL,
+  created_at DATETIME NOT NULL,
+  updated_at DATETIME NOT NULL,
+  archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id, created_at),
+  KEY idx_orders_archive_user (user_id),
+  KEY idx_orders_archive_tenant (tenant, created_at),
+  KEY idx_orders_archive_status_created (status, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (TO_DAYS(created_at)) (
+  PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+  PARTITION p_max VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE IF NOT EXISTS order_files_archive (
+  id BIGINT UNSIGNED NOT NULL,
+  order_id BIGINT UNSIGNED NOT NULL,
+  telegram_file_id VARCHAR(255) NOT NULL,
+  file_unique_id VARCHAR(255) NULL,
+  telegram_message_id BIGINT NULL,
+  original_name VARCHAR(255) NOT NULL,
+  mime_type VARCHAR(255) NULL,
+  file_size BIGINT NULL,
+  local_path VARCHAR(512) NULL,
+  mesh_stats JSON NULL,
+  created_at DATETIME NOT NULL,
+  PRIMARY KEY (id, created_at),
+  KEY idx_order_files_archive_order (order_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (TO_DAYS(created_at)) (
+  PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+  PARTITION p_max VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE IF NOT EXISTS order_messages_archive (
+  id BIGINT UNSIGNED NOT NULL,
+  order_id BIGINT UNSIGNED NOT NULL,
+  direction ENUM('in','out') NOT NULL,
+  message_text TEXT NOT NULL,
+  telegram_message_id BIGINT NULL,
+  created_at DATETIME NOT NULL,
+  PRIMARY KEY (id, created_at),
+  KEY idx_order_messages_archive_order_id (order_id, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (TO_DAYS(created_at)) (
+  PARTITION p_start VALUES LESS THAN (TO_DAYS('2025-01-01')),
+  PARTITION p_max VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE IF NOT EXISTS orders_archive_stats (
+  tenant VARCHAR(64) NOT NULL,
+  archived_orders BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  PRIMARY KEY (tenant)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 CREATE TABLE IF NOT EXISTS bot_config (
+  tenant VARCHAR(64) NOT NULL DEFAULT 'default',
   config_key VARCHAR(191) NOT NULL,
   config_value TEXT NOT NULL,
   updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  PRIMARY KEY (config_key)
+  PRIMARY KEY (tenant, config_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS bot_config_version (
+  id TINYINT UNSIGNED NOT NULL,
+  version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  PRIMARY KEY (id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 INSERT INTO bot_config (config_key, config_value)
@@ -53,3 +215,7 @@ VALUES
 ('welcome_menu_msg', 'Добро пожаловать в Chel3D 👋\nВыберите нужный пункт меню:'),
 ('about_text', 'Chel3D — 3D-печать, 3D-сканирование и помощь в создании модели.')
 ON DUPLICATE KEY UPDATE config_value = VALUES(config_value);
+
+INSERT INTO bot_config_version (id, version)
+VALUES (1, 1)
+ON DUPLICATE KEY UPDATE version = version + 1;
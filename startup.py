@@ -0,0 +1,51 @@
+"""Warm-up bookkeeping shared by bot.main() and the backend lifespan.
+
+Each warm-up step runs inside StartupReport.phase(); the report logs one line
+with per-phase timings when finish() is called and backs the readiness
+endpoints (GET /internal/ready on the bot, GET /ready on the backend).
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    def __init__(self, service: str) -> None:
+        self.service = service
+        self.ready = False
+        self.phases: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.total_ms: float | None = None
+        self._started = time.perf_counter()
+
+    @asynccontextmanager
+    async def phase(self, name: str, required: bool = True):
+        """Time one warm-up step. A failed optional step is logged and recorded; a required one aborts start-up."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as exc:
+            if required:
+                raise
+            self.errors[name] = str(exc) or type(exc).__name__
+            logger.warning("Прогрев %s: фаза %s не удалась: %s", self.service, name, exc)
+        finally:
+            self.phases[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def finish(self) -> None:
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        self.ready = True
+        timings = ", ".join(f"{name}={ms:.0f} мс" for name, ms in self.phases.items())
+        logger.info("Прогрев %s завершён за %.0f мс: %s", self.service, self.total_ms, timings)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "service": self.service,
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "phases": self.phases,
+            "errors": self.errors,
+        }
@@ -0,0 +1,182 @@
+"""Tiered storage for order attachments.
+
+    hot   uploads/files/<order_id>/<file_unique_id>_<name>, as downloaded
+    zstd  STL/OBJ older than STORAGE_COMPRESS_AFTER_HOURS, compressed in place (<name>.zst)
+    cold  files older than STORAGE_OFFLOAD_AFTER_DAYS, or evicted by STORAGE_LOCAL_QUOTA_MB,
+          in an S3-compatible bucket (MinIO locally, see docker-compose.minio.yml)
+
+order_files.local_path is the current location: a path relative to
+UPLOADS_DIR or an s3:// URL, NULL once no copy is kept (Telegram still has
+the file by file_id). file_size stays the original size in bytes. All of
+this is blocking I/O; the bot calls it through asyncio.to_thread().
+"""
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import database
+from config import settings
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # offloading is optional
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = Path(settings.uploads_dir)
+FILES_DIR = UPLOADS_DIR / "files"
+# 3MF is a zip already; photos are JPEG.
+COMPRESSIBLE_EXTENSIONS: tuple[str, ...] = (".stl", ".obj")
+ZSTD_LEVEL = 9
+# Parts are read from disk one at a time, so memory stays at a few chunks per upload.
+MULTIPART_CHUNK_BYTES = 8 * 1024 * 1024
+LIST_PAGE_SIZE = 1000
+
+_s3_client: Any = None
+
+
+def hot_path(order_id: int, file_unique_id: str, file_name: str) -> Path:
+    # file_unique_id keeps two attachments with the same name apart.
+    return FILES_DIR / str(order_id) / f"{file_unique_id}_{Path(file_name).name}"
+
+
+def to_location(path: Path) -> str:
+    return path.relative_to(UPLOADS_DIR).as_posix()
+
+
+def local_file(location: str) -> Path:
+    return UPLOADS_DIR / location
+
+
+def s3_enabled() -> bool:
+    return boto3 is not None and bool(settings.s3_bucket)
+
+
+def _s3() -> Any:
+    global _s3_client
+    if _s3_client is None:
+        client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url or None,
+            aws_access_key_id=settings.s3_access_key or None,
+            aws_secret_access_key=settings.s3_secret_key or None,
+            region_name=settings.s3_region,
+        )
+        try:
+            client.head_bucket(Bucket=settings.s3_bucket)
+        except ClientError:
+            client.create_bucket(Bucket=settings.s3_bucket)
+        _s3_client = client
+    return _s3_client
+
+
+def compress(path: Path) -> Path:
+    """Write <path>.zst next to the file; the caller removes the original once the DB points at the copy."""
+    dst = path.with_name(path.name + ".zst")
+    tmp = dst.with_name(dst.name + ".tmp")
+    # Timestamps drive the offload age and the LRU order; take them before our own read bumps atime.
+    st = path.stat()
+    with open(path, "rb") as src, open(tmp, "wb") as out:
+        zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(src, out)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    tmp.replace(dst)
+    return dst
+
+
+def offload(path: Path, order_id: int) -> str:
+    """Upload to the bucket (multipart above MULTIPART_CHUNK_BYTES); returns the s3:// location."""
+    key = f"orders/{order_id}/{path.name}"
+    config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNK_BYTES,
+        multipart_chunksize=MULTIPART_CHUNK_BYTES,
+        max_concurrency=2,
+    )
+    _s3().upload_file(str(path), settings.s3_bucket, key, Config=config)
+    return f"s3://{settings.s3_bucket}/{key}"
+
+
+def _move(row: dict[str, Any], src: Path, location: str | None) -> None:
+    database.update_order_file_location(int(row["id"]), location)
+    src.unlink(missing_ok=True)
+
+
+def remove_order(order_id: int) -> None:
+    """Drop every stored copy of an order's attachments, local and in the bucket."""
+    shutil.rmtree(FILES_DIR / str(order_id), ignore_errors=True)
+    if not s3_enabled():
+        return
+    client = _s3()
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=settings.s3_bucket, Prefix=f"orders/{order_id}/"):
+        keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if keys:
+            client.delete_objects(Bucket=settings.s3_bucket, Delete={"Objects": keys})
+
+
+def _local_rows() -> Iterator[dict[str, Any]]:
+    """Every row with a local copy, a page at a time, so usage is never undercounted."""
+    after_id = 0
+    while True:
+        rows = database.list_local_order_files(after_id, LIST_PAGE_SIZE)
+        yield from rows
+        if len(rows) < LIST_PAGE_SIZE:
+            return
+        after_id = int(rows[-1]["id"])
+
+
+def run_tiering() -> dict[str, int]:
+    """One maintenance pass: compress and offload by age, then evict least recently used files over the quota."""
+    done = {"compressed": 0, "offloaded": 0, "evicted": 0, "missing": 0}
+    now = time.time()
+    compress_before = now - settings.storage_compress_after_hours * 3600
+    offload_before = now - settings.storage_offload_after_days * 86400
+    # (last used, bytes on disk, row, path) of files that stay local after the age rules.
+    local: list[tuple[float, int, dict[str, Any], Path]] = []
+    for row in _local_rows():
+        path = local_file(row["local_path"])
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            # Deleted by hand or lost with the volume: stop pointing at it.
+            database.update_order_file_location(int(row["id"]), None)
+            done["missing"] += 1
+            continue
+        try:
+            if s3_enabled() and st.st_mtime < offload_before:
+                _move(row, path, offload(path, int(row["order_id"])))
+                done["offloaded"] += 1
+                continue
+            if zstandard is not None and st.st_mtime < compress_before and path.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                packed = compress(path)
+                _move(row, path, to_location(packed))
+                path, st = packed, packed.stat()
+                done["compressed"] += 1
+        except Exception:
+            logger.exception("Не удалось перенести файл %s", path)
+        local.append((max(st.st_atime, st.st_mtime), st.st_size, row, path))
+
+    quota = settings.storage_local_quota_mb * 1024 * 1024
+    used = sum(size for _, size, _, _ in local)
+    if not quota or used <= quota:
+        return done
+    for _, size, row, path in sorted(local, key=lambda item: item[0]):
+        if used <= quota:
+            break
+        try:
+            _move(row, path, offload(path, int(row["order_id"])) if s3_enabled() else None)
+        except Exception:
+            logger.exception("Не удалось вытеснить файл %s", path)
+            continue
+        used -= size
+        done["evicted"] += 1
+    return done
@@ -0,0 +1,51 @@
+"""Handler tests that need no Telegram connection: the DAL is monkeypatched."""
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import bot  # noqa: E402
+
+
+class _FakeState:
+    def __init__(self, data: dict) -> None:
+        self._data = data
+
+    async def get_data(self) -> dict:
+        return dict(self._data)
+
+
+def _client_text(text: str, reply_to: int | None = None) -> SimpleNamespace:
+    return SimpleNamespace(
+        text=text,
+        message_id=500,
+        chat=SimpleNamespace(type="private"),
+        from_user=SimpleNamespace(id=7, username="ivan", first_name="Иван", last_name=""),
+        reply_to_message=SimpleNamespace(message_id=reply_to) if reply_to else None,
+    )
+
+
+def test_free_text_mid_form_skips_the_draft(monkeypatch):
+    added: list[int] = []
+    monkeypatch.setattr(bot, "_active_order_cache", OrderedDict())
+    monkeypatch.setattr(bot.database, "find_order_by_outgoing_message", lambda *a, **kw: None)
+    monkeypatch.setattr(bot.database, "find_or_create_active_order", lambda *a, **kw: 42)
+    monkeypatch.setattr(bot.client_messages, "add", lambda order_id, *a: added.append(order_id))
+
+    # The user is halfway through a form: the state still holds the draft.
+    asyncio.run(bot.on_text(_client_text("Когда будет готово?"), _FakeState({"order_id": 13})))
+    assert added == [42]
+
+
+def test_reply_to_manager_goes_to_that_order(monkeypatch):
+    added: list[int] = []
+    monkeypatch.setattr(bot, "_active_order_cache", OrderedDict())
+    monkeypatch.setattr(bot.database, "find_order_by_outgoing_message", lambda *a, **kw: 9)
+    monkeypatch.setattr(bot.database, "find_or_create_active_order", lambda *a, **kw: 42)
+    monkeypatch.setattr(bot.client_messages, "add", lambda order_id, *a: added.append(order_id))
+
+    asyncio.run(bot.on_text(_client_text("Да, подходит", reply_to=300), _FakeState({"order_id": 13})))
+    assert added == [9]